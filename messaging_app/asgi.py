@@ -0,0 +1,17 @@
+"""
+ASGI config for messaging_app project.
+
+Serves the REST API, the async endpoints (chats.async_views) and the
+real-time Server-Sent Events streams (chats.streams), which need an
+async server such as uvicorn or daphne:
+
+    uvicorn messaging_app.asgi:application
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'messaging_app.settings')
+
+application = get_asgi_application()
@@ -0,0 +1,37 @@
+"""
+Shared setup for the benchmark scripts.
+
+Puts the project and the chats app on sys.path, points the default
+database at a scratch SQLite file and configures Django.
+"""
+
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+APP_DIR = Path(__file__).resolve().parent.parent
+sys.path[:0] = [str(APP_DIR.parent), str(APP_DIR)]
+
+
+def setup(db_path=None, migrate=True):
+    """
+    Configure Django against a scratch database and return its path.
+    """
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "messaging_app.settings")
+
+    import django
+    from django.conf import settings
+
+    if db_path is None:
+        handle, db_path = tempfile.mkstemp(prefix="chats-bench-", suffix=".sqlite3")
+        os.close(handle)
+    settings.DATABASES["default"]["NAME"] = str(db_path)
+    settings.DEBUG = False
+    django.setup()
+
+    if migrate:
+        from django.core.management import call_command
+
+        call_command("migrate", verbosity=0)
+    return db_path
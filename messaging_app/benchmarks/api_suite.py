@@ -0,0 +1,455 @@
+#!/usr/bin/env python3
+"""
+Load test of the conversation and message API, with a regression gate.
+
+`run` seeds a dataset with bulk inserts: users, conversations whose
+participant counts and message volumes follow a power law (a few huge
+group chats, many small ones), and any number of messages. It then drives
+the ConversationViewSet and MessageViewSet endpoints (list, retrieve,
+create, add_participant) with concurrent clients through Django's
+request handler, and writes a JSON report. The report gives throughput,
+latency percentiles, errors and queries per request for each scenario.
+
+`compare` checks a report against a stored baseline. It exits non-zero
+on a regression: throughput down or p99 up by more than the tolerance,
+more queries per request, or more errors.
+
+Usage:
+    python messaging_app/benchmarks/api_suite.py run [--users N] [--conversations N]
+        [--messages N] [--alpha A] [--concurrency N] [--requests N] [--db PATH]
+        [--output report.json] [--baseline baseline.json]
+    python messaging_app/benchmarks/api_suite.py compare baseline.json report.json
+        [--tolerance 0.15]
+"""
+
+import argparse
+import json
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import _bootstrap
+
+SCENARIOS = (
+    "conversations.list",
+    "conversations.retrieve",
+    "conversations.create",
+    "conversations.add_participant",
+    "messages.list",
+    "messages.retrieve",
+    "messages.create",
+)
+
+
+# ------------------------------------
+# Dataset
+# ------------------------------------
+def power_law(rng, alpha, low, high):
+    """
+    Pareto-distributed integer in [low, high].
+    """
+    return min(high, low - 1 + int(rng.paretovariate(alpha)))
+
+
+def seed(rng, users, conversations, messages, alpha, batch_size):
+    from django.db import transaction
+
+    from chats.models import Conversation, InboxEntry, Message, User, participant_fingerprint
+
+    began = time.perf_counter()
+    user_objs = User.objects.bulk_create(
+        [User(username=f"bench{i}", email=f"bench{i}@example.com") for i in range(users)],
+        batch_size=batch_size,
+    )
+    convs = Conversation.objects.bulk_create(
+        [Conversation() for _ in range(conversations)], batch_size=batch_size
+    )
+
+    members = {
+        conv.pk: rng.sample(user_objs, power_law(rng, alpha, 2, min(users, 500)))
+        for conv in convs
+    }
+    Through = Conversation.participants.through
+    Through.objects.bulk_create(
+        [
+            Through(conversation_id=conversation_id, user_id=user.pk)
+            for conversation_id, participants in members.items()
+            for user in participants
+        ],
+        batch_size=batch_size,
+    )
+
+    # Message volume per conversation follows the same kind of power law.
+    weights = [rng.paretovariate(alpha) for _ in convs]
+    scale = messages / sum(weights)
+    counts = [int(weight * scale) for weight in weights]
+    counts[0] += messages - sum(counts)
+
+    def rows():
+        for conv, count in zip(convs, counts):
+            participants = members[conv.pk]
+            for seq in range(1, count + 1):
+                yield Message(
+                    sender=rng.choice(participants),
+                    conversation=conv,
+                    seq=seq,
+                    message_body=f"benchmark message {seq}",
+                )
+
+    last = {}
+    batch = []
+    for message in rows():
+        batch.append(message)
+        if len(batch) == batch_size:
+            with transaction.atomic():
+                Message.objects.bulk_create(batch)
+            last.update((m.conversation_id, m) for m in batch)
+            batch = []
+    if batch:
+        with transaction.atomic():
+            Message.objects.bulk_create(batch)
+        last.update((m.conversation_id, m) for m in batch)
+
+    for conv, count in zip(convs, counts):
+        message = last.get(conv.pk)
+        conv.last_seq = conv.message_count = count
+        conv.participant_fingerprint = participant_fingerprint(user.pk for user in members[conv.pk])
+        if message is not None:
+            conv.last_message_at = message.sent_at
+            conv.last_message_id = message.message_id
+    Conversation.objects.bulk_update(
+        convs,
+        [
+            "last_seq",
+            "message_count",
+            "last_message_at",
+            "last_message_id",
+            "participant_fingerprint",
+        ],
+        batch_size=batch_size,
+    )
+    InboxEntry.objects.bulk_create(
+        [
+            InboxEntry(
+                user_id=user.pk,
+                conversation_id=conv.pk,
+                last_read_seq=conv.last_seq,
+                last_activity_at=conv.last_message_at or conv.created_at,
+            )
+            for conv in convs
+            for user in members[conv.pk]
+        ],
+        batch_size=batch_size,
+    )
+    sizes = sorted(len(participants) for participants in members.values())
+    return {
+        "users": users,
+        "conversations": conversations,
+        "messages": messages,
+        "alpha": alpha,
+        "participants_median": sizes[len(sizes) // 2],
+        "participants_max": sizes[-1],
+        "messages_per_conversation_max": max(counts),
+        "seed_seconds": round(time.perf_counter() - began, 2),
+    }
+
+
+def load_targets(rng, sample_size):
+    """
+    Ids the clients pick from: a sample of conversations with their
+    participants, users and messages.
+    """
+    from chats.models import Conversation, Message, User
+
+    conversation_ids = list(
+        Conversation.objects.order_by("?").values_list("pk", flat=True)[:sample_size]
+    )
+    Through = Conversation.participants.through
+    members = {}
+    for conversation_id, user_id in Through.objects.filter(
+        conversation_id__in=conversation_ids
+    ).values_list("conversation_id", "user_id"):
+        members.setdefault(conversation_id, []).append(user_id)
+    return {
+        "conversations": [(pk, members[pk]) for pk in conversation_ids if pk in members],
+        "users": list(User.objects.order_by("?").values_list("pk", flat=True)[:sample_size]),
+        "messages": list(
+            Message.objects.order_by("?").values_list("pk", flat=True)[:sample_size]
+        ),
+    }
+
+
+# ------------------------------------
+# Scenarios
+# ------------------------------------
+def build_request(scenario, rng, targets):
+    """
+    Return (method, path, JSON body or None) for one request.
+    """
+    conversation_id, participants = rng.choice(targets["conversations"])
+    if scenario == "conversations.list":
+        return "get", "/api/chats/conversations/?page_size=20", None
+    if scenario == "conversations.retrieve":
+        return "get", f"/api/chats/conversations/{conversation_id}/", None
+    if scenario == "conversations.create":
+        users = rng.sample(targets["users"], min(3, len(targets["users"])))
+        return "post", "/api/chats/conversations/", {"participants": [str(u) for u in users]}
+    if scenario == "conversations.add_participant":
+        return (
+            "post",
+            f"/api/chats/conversations/{conversation_id}/add_participant/",
+            {"user_id": str(rng.choice(targets["users"]))},
+        )
+    if scenario == "messages.list":
+        return "get", f"/api/chats/messages/?conversation={conversation_id}&page_size=50", None
+    if scenario == "messages.retrieve":
+        return "get", f"/api/chats/messages/{rng.choice(targets['messages'])}/", None
+    if scenario == "messages.create":
+        return (
+            "post",
+            "/api/chats/messages/",
+            {
+                "sender_id": str(rng.choice(participants)),
+                "conversation_id": str(conversation_id),
+                "message_body": "load test message",
+            },
+        )
+    raise ValueError(scenario)
+
+
+def percentile(ordered, q):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+def run_scenario(scenario, targets, total, concurrency, warmup, seed_value):
+    """
+    concurrency client threads share `total` requests; latency and query
+    count are recorded per request.
+    """
+    from django.db import connection
+    from django.test import Client
+
+    remaining = iter(range(warmup + total))
+    lock = threading.Lock()
+    latencies = []
+    queries = []
+    errors = []
+
+    def client(index):
+        rng = random.Random(f"{seed_value}-{scenario}-{index}")
+        http = Client()
+        executed = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal executed
+            executed += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            while True:
+                with lock:
+                    number = next(remaining, None)
+                if number is None:
+                    break
+                method, path, body = build_request(scenario, rng, targets)
+                executed = 0
+                began = time.perf_counter()
+                if body is None:
+                    response = getattr(http, method)(path)
+                else:
+                    response = getattr(http, method)(path, body, content_type="application/json")
+                latency = time.perf_counter() - began
+                if number < warmup:
+                    continue
+                with lock:
+                    latencies.append(latency)
+                    queries.append(executed)
+                    if response.status_code >= 400:
+                        errors.append(response.status_code)
+        connection.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    began = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - began
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "queries_mean": round(statistics.mean(queries), 2),
+        "queries_max": max(queries),
+    }
+
+
+def run(args):
+    db_path = _bootstrap.setup(args.db)
+
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ["*"]
+    settings.CHATS = dict(settings.CHATS, PROFILING_SAMPLE_RATE=0.0)
+    # Measure the endpoints, not the rate limits (see throttle_overhead.py).
+    settings.REST_FRAMEWORK = dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES={})
+    # DRF has cached its settings by now; make it read them again.
+    from rest_framework.settings import api_settings
+
+    api_settings.reload()
+
+    from chats.models import User
+
+    rng = random.Random(args.seed)
+    if User.objects.exists():
+        dataset = {"reused": str(db_path)}
+    else:
+        dataset = seed(
+            rng, args.users, args.conversations, args.messages, args.alpha, args.batch
+        )
+    targets = load_targets(rng, args.sample)
+
+    scenarios = {}
+    for scenario in args.scenarios:
+        scenarios[scenario] = run_scenario(
+            scenario, targets, args.requests, args.concurrency, args.warmup, args.seed
+        )
+        result = scenarios[scenario]
+        print(
+            f"{scenario:<31} {result['rps']:>8} {result['p50_ms']:>8} "
+            f"{result['p99_ms']:>8} {result['queries_max']:>6} {result['errors']:>6}",
+            file=sys.stderr,
+        )
+
+    import django
+
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "seed": args.seed,
+        },
+        "dataset": dataset,
+        "scenarios": scenarios,
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as handle:
+            handle.write(output + "\n")
+    else:
+        print(output)
+
+    if args.baseline:
+        with open(args.baseline) as handle:
+            return report_regressions(json.load(handle), report, args.tolerance, args.min_ms)
+    return 0
+
+
+# ------------------------------------
+# Regression gate
+# ------------------------------------
+def find_regressions(baseline, current, tolerance, min_ms):
+    """
+    List the metrics of `current` that regressed against `baseline`.
+    Latency changes below min_ms are ignored as noise.
+    """
+    regressions = []
+    for scenario, before in baseline["scenarios"].items():
+        after = current["scenarios"].get(scenario)
+        if after is None:
+            regressions.append(f"{scenario}: missing from the current run")
+            continue
+        if after["rps"] < before["rps"] * (1 - tolerance):
+            regressions.append(f"{scenario}: throughput {before['rps']} -> {after['rps']} req/s")
+        if (
+            after["p99_ms"] > before["p99_ms"] * (1 + tolerance)
+            and after["p99_ms"] - before["p99_ms"] > min_ms
+        ):
+            regressions.append(f"{scenario}: p99 {before['p99_ms']} -> {after['p99_ms']} ms")
+        if after["queries_max"] > before["queries_max"]:
+            regressions.append(
+                f"{scenario}: queries/request {before['queries_max']} -> {after['queries_max']}"
+            )
+        if after["errors"] > before["errors"]:
+            regressions.append(f"{scenario}: errors {before['errors']} -> {after['errors']}")
+    return regressions
+
+
+def report_regressions(baseline, current, tolerance, min_ms):
+    regressions = find_regressions(baseline, current, tolerance, min_ms)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if not regressions:
+        print(f"No regressions (tolerance {tolerance:.0%}).", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+def compare(args):
+    with open(args.baseline) as handle:
+        baseline = json.load(handle)
+    with open(args.current) as handle:
+        current = json.load(handle)
+    return report_regressions(baseline, current, args.tolerance, args.min_ms)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="seed, load test and write a report")
+    run_parser.add_argument("--users", type=int, default=2000)
+    run_parser.add_argument("--conversations", type=int, default=5000)
+    run_parser.add_argument("--messages", type=int, default=200000)
+    run_parser.add_argument("--alpha", type=float, default=1.5, help="power-law exponent")
+    run_parser.add_argument("--batch", type=int, default=5000, help="rows per INSERT")
+    run_parser.add_argument("--db", help="database file; an already seeded one is reused")
+    run_parser.add_argument("--concurrency", type=int, default=8)
+    run_parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    run_parser.add_argument("--warmup", type=int, default=50, help="per scenario")
+    run_parser.add_argument("--sample", type=int, default=1000, help="ids to pick targets from")
+    run_parser.add_argument(
+        "--scenarios",
+        type=lambda value: value.split(","),
+        default=list(SCENARIOS),
+        help="comma-separated subset of " + ", ".join(SCENARIOS),
+    )
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="report file (default: stdout)")
+    run_parser.add_argument("--baseline", help="compare the report against this one")
+
+    compare_parser = commands.add_parser("compare", help="compare a report to a baseline")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+
+    for command in (run_parser, compare_parser):
+        command.add_argument("--tolerance", type=float, default=0.15)
+        command.add_argument("--min-ms", type=float, default=1.0)
+
+    args = parser.parse_args()
+    if args.command == "compare":
+        sys.exit(compare(args))
+    for scenario in args.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario!r}")
+    print(f"{'scenario':<31} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'qmax':>6} {'errors':>6}",
+          file=sys.stderr)
+    sys.exit(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+Throughput and latency of the sync (WSGI) vs async (ASGI) endpoints.
+
+Both stacks are driven in-process, without a network server: the sync
+endpoints through Django's WSGI handler from a pool of worker threads
+(like a threaded WSGI server), the async endpoints through the ASGI
+handler from concurrent tasks on one event loop. Every query can be
+delayed with --db-latency-ms to stand in for a database across the
+network, which is where async views free up workers.
+
+Usage:
+    python messaging_app/benchmarks/async_load.py [--concurrency N] [--requests N]
+        [--workers N] [--db-latency-ms N]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+import _bootstrap
+
+# name: (sync path, async path, query string)
+ENDPOINTS = {
+    "conversations": (
+        "/api/chats/conversations/",
+        "/api/chats/async/conversations/",
+        "page_size=20&message_window=5",
+    ),
+    "messages": ("/api/chats/messages/", "/api/chats/async/messages/", "page_size=50"),
+}
+
+
+def seed(conversations, messages_each):
+    from django.db import transaction
+
+    from chats.models import Conversation, Message, User
+
+    users = User.objects.bulk_create(
+        [User(username=f"bench{i}", email=f"bench{i}@example.com") for i in range(20)]
+    )
+    convs = Conversation.objects.bulk_create([Conversation() for _ in range(conversations)])
+    Through = Conversation.participants.through
+    Through.objects.bulk_create(
+        [
+            Through(conversation_id=conv.pk, user_id=users[(i + k) % len(users)].pk)
+            for i, conv in enumerate(convs)
+            for k in range(3)
+        ]
+    )
+    with transaction.atomic():
+        Message.objects.bulk_create(
+            [
+                Message(
+                    sender=users[i % len(users)],
+                    conversation=conv,
+                    seq=i + 1,
+                    message_body=f"benchmark message {i}",
+                )
+                for conv in convs
+                for i in range(messages_each)
+            ],
+            batch_size=1000,
+        )
+
+
+def add_db_latency(seconds):
+    """
+    Sleep before every query on every connection.
+    """
+    from django.db.backends.signals import connection_created
+
+    def delay(execute, sql, params, many, context):
+        time.sleep(seconds)
+        return execute(sql, params, many, context)
+
+    def install(sender, connection, **kwargs):
+        connection.execute_wrappers.append(delay)
+
+    connection_created.connect(install, weak=False)
+
+
+def summarize(name, latencies, elapsed, errors):
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    return {
+        "stack": name,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(p99 * 1000, 1),
+    }
+
+
+def run_sync(path, query, total, concurrency, workers):
+    """
+    concurrency client threads share a pool of `workers` request slots;
+    latency includes waiting for a free slot, as behind a threaded server.
+    """
+    import threading
+
+    from django.core.handlers.wsgi import WSGIHandler
+
+    handler = WSGIHandler()
+    slots = threading.Semaphore(workers)
+    remaining = iter(range(total))
+    lock = threading.Lock()
+    latencies = []
+    errors = []
+
+    def client():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            environ = {}
+            setup_testing_defaults(environ)
+            environ["PATH_INFO"] = path
+            environ["QUERY_STRING"] = query
+            statuses = []
+            began = time.perf_counter()
+            with slots:
+                body = b"".join(handler(environ, lambda status, headers: statuses.append(status)))
+            latency = time.perf_counter() - began
+            with lock:
+                latencies.append(latency)
+                if not (statuses[0].startswith("200") and body):
+                    errors.append(statuses[0])
+
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(client) for _ in range(concurrency)]:
+            future.result()
+    return summarize("sync", latencies, time.perf_counter() - began, len(errors))
+
+
+def run_async(path, query, total, concurrency):
+    """
+    concurrency client tasks on one event loop calling the ASGI handler.
+    """
+    from django.core.handlers.asgi import ASGIHandler
+
+    handler = ASGIHandler()
+
+    async def request():
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0"},
+            "http_version": "1.1",
+            "method": "GET",
+            "scheme": "http",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": query.encode(),
+            "root_path": "",
+            "headers": [(b"host", b"localhost")],
+            "client": ("127.0.0.1", 0),
+            "server": ("localhost", 80),
+        }
+        messages = []
+        received = False
+
+        async def receive():
+            nonlocal received
+            if not received:
+                received = True
+                return {"type": "http.request", "body": b"", "more_body": False}
+            # The client never disconnects; the handler cancels this wait.
+            await asyncio.Future()
+
+        async def send(message):
+            messages.append(message)
+
+        await handler(scope, receive, send)
+        return messages[0]["status"] == 200 and any(
+            message.get("body") for message in messages[1:]
+        )
+
+    async def drive():
+        remaining = iter(range(total))
+        latencies = []
+        errors = 0
+
+        async def client():
+            nonlocal errors
+            while next(remaining, None) is not None:
+                began = time.perf_counter()
+                ok = await request()
+                latencies.append(time.perf_counter() - began)
+                errors += not ok
+
+        began = time.perf_counter()
+        await asyncio.gather(*(client() for _ in range(concurrency)))
+        return summarize("async", latencies, time.perf_counter() - began, errors)
+
+    return asyncio.run(drive())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--requests", type=int, default=640)
+    parser.add_argument("--workers", type=int, default=8, help="sync worker threads")
+    parser.add_argument("--db-latency-ms", type=float, default=5.0)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--messages", type=int, default=50)
+    args = parser.parse_args()
+
+    _bootstrap.setup()
+
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ["*"]
+    # Both stacks serialize the same way, and neither hits the response cache.
+    settings.CHATS = dict(settings.CHATS, FAST_SERIALIZERS=True, RESPONSE_CACHE=None)
+
+    seed(args.conversations, args.messages)
+    if args.db_latency_ms:
+        add_db_latency(args.db_latency_ms / 1000)
+
+    print(
+        f"concurrency={args.concurrency} requests={args.requests} "
+        f"sync workers={args.workers} db latency={args.db_latency_ms}ms"
+    )
+    print(f"{'endpoint':<14} {'stack':<6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, (sync_path, async_path, query) in ENDPOINTS.items():
+        results = [
+            run_sync(sync_path, query, args.requests, args.concurrency, args.workers),
+            run_async(async_path, query, args.requests, args.concurrency),
+        ]
+        for result in results:
+            print(
+                f"{name:<14} {result['stack']:<6} {result['rps']:>8} "
+                f"{result['p50_ms']:>8} {result['p99_ms']:>8} {result['errors']:>7}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Insert throughput of random (uuid4) vs time-ordered (uuid7) message ids.
+
+Each scheme runs in its own process against a fresh SQLite database:
+messages are inserted in batches and the rows/second and final
+database size (pages) are reported.
+
+Usage:
+    python messaging_app/benchmarks/id_insert_throughput.py [--messages N] [--batch N]
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import time
+
+import _bootstrap
+
+
+def run_scheme(scheme, total, batch_size):
+    _bootstrap.setup()
+
+    from django.conf import settings
+    from django.db import connection, transaction
+
+    settings.CHATS = dict(settings.CHATS, ID_SCHEME=scheme)
+
+    from chats.models import Conversation, Message, User
+
+    user = User.objects.create(username="bench", email="bench@example.com")
+    conversations = [Conversation.objects.create() for _ in range(100)]
+
+    began = time.perf_counter()
+    for start in range(0, total, batch_size):
+        with transaction.atomic():
+            Message.objects.bulk_create(
+                [
+                    Message(
+                        sender=user,
+                        conversation=conversations[i % len(conversations)],
+                        message_body="benchmark message",
+                    )
+                    for i in range(start, min(start + batch_size, total))
+                ]
+            )
+    elapsed = time.perf_counter() - began
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA page_count")
+        pages = cursor.fetchone()[0]
+    return {
+        "scheme": scheme,
+        "messages": total,
+        "seconds": round(elapsed, 3),
+        "rows_per_second": round(total / elapsed),
+        "db_pages": pages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--messages", type=int, default=200000)
+    parser.add_argument("--batch", type=int, default=1000)
+    parser.add_argument("--scheme", choices=["uuid4", "uuid7"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.scheme:
+        print(json.dumps(run_scheme(args.scheme, args.messages, args.batch)))
+        return
+
+    results = []
+    for scheme in ("uuid4", "uuid7"):
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--scheme", scheme,
+                "--messages", str(args.messages),
+                "--batch", str(args.batch),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'scheme':<8} {'rows/s':>10} {'seconds':>9} {'db pages':>10}")
+    for result in results:
+        print(
+            f"{result['scheme']:<8} {result['rows_per_second']:>10} "
+            f"{result['seconds']:>9} {result['db_pages']:>10}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Compare SQLite query plans and timings before and after the
+conversation activity columns and composite indexes (chats 0002).
+
+Usage:
+    python messaging_app/benchmarks/query_plans.py [--conversations N] [--messages N]
+"""
+
+import argparse
+import random
+import time
+import uuid
+from datetime import timedelta
+
+import _bootstrap
+
+
+def seed(apps, conversations, messages):
+    User = apps.get_model("chats", "User")
+    Conversation = apps.get_model("chats", "Conversation")
+    Message = apps.get_model("chats", "Message")
+
+    users = User.objects.bulk_create(
+        [User(username=f"user{i}", email=f"user{i}@example.com") for i in range(50)]
+    )
+    convs = Conversation.objects.bulk_create(
+        [Conversation() for _ in range(conversations)]
+    )
+    Through = Conversation.participants.through
+    Through.objects.bulk_create(
+        [
+            Through(conversation_id=conv.pk, user_id=user.pk)
+            for conv in convs
+            for user in random.sample(users, 3)
+        ]
+    )
+
+    from django.utils import timezone
+
+    start = timezone.now() - timedelta(days=365)
+    for offset in range(0, messages, 5000):
+        batch = Message.objects.bulk_create(
+            [
+                Message(
+                    message_id=uuid.uuid4(),
+                    sender=random.choice(users),
+                    conversation=random.choice(convs),
+                    message_body="lorem ipsum",
+                )
+                for _ in range(min(5000, messages - offset))
+            ]
+        )
+        # auto_now_add stamps every row with "now"; spread them over a year.
+        for message in batch:
+            message.sent_at = start + timedelta(seconds=random.randint(0, 365 * 86400))
+        Message.objects.bulk_update(batch, ["sent_at"], batch_size=500)
+    return convs[0].pk
+
+
+def measure(label, queryset, repeat=20):
+    plan = queryset.explain()
+    began = time.perf_counter()
+    for _ in range(repeat):
+        list(queryset.all())
+    elapsed = (time.perf_counter() - began) / repeat * 1000
+    print(f"\n{label}: {elapsed:.2f} ms")
+    for line in plan.splitlines():
+        print(f"    {line}")
+
+
+def run_queries(apps, conversation_id, after):
+    from django.db.models import Max
+
+    Conversation = apps.get_model("chats", "Conversation")
+    Message = apps.get_model("chats", "Message")
+
+    measure(
+        "messages in a conversation by time",
+        Message.objects.filter(conversation_id=conversation_id)
+        .order_by("-sent_at", "-message_id")
+        .values_list("message_id", flat=True)[:50],
+    )
+    if after:
+        recent = Conversation.objects.order_by("-last_message_at", "-conversation_id")
+    else:
+        recent = Conversation.objects.annotate(
+            last_message_at=Max("messages__sent_at")
+        ).order_by("-last_message_at", "-conversation_id")
+    measure(
+        "conversations by recent activity",
+        recent.values_list("conversation_id", flat=True)[:50],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--conversations", type=int, default=2000)
+    parser.add_argument("--messages", type=int, default=50000)
+    args = parser.parse_args()
+
+    _bootstrap.setup(migrate=False)
+
+    from django.db import connection
+    from django.db.migrations.executor import MigrationExecutor
+
+    before = [("chats", "0001_initial")]
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+    executor = MigrationExecutor(connection)
+    executor.migrate(before)
+    executor.loader.build_graph()
+    apps = executor.loader.project_state(before).apps
+
+    print(f"Seeding {args.conversations} conversations, {args.messages} messages...")
+    conversation_id = seed(apps, args.conversations, args.messages)
+
+    print("\n=== Before (chats 0001) ===")
+    run_queries(apps, conversation_id, after=False)
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE")
+
+    from django.apps import apps as current_apps
+
+    print("\n=== After (latest migration) ===")
+    run_queries(current_apps, conversation_id, after=True)
+
+
+if __name__ == "__main__":
+    main()
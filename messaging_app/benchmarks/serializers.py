@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Objects/second of the DRF serializers vs the fast-path serializers.
+
+For each page size, a page of messages (sender joined) is serialized
+with MessageSerializer from model instances and with
+FastMessageSerializer from .values() rows. Both timings include the
+query; the rendered JSON of both paths is checked to be identical.
+
+Usage:
+    python messaging_app/benchmarks/serializers.py [--sizes 100,1000,10000] [--repeat N]
+"""
+
+import argparse
+import time
+
+import _bootstrap
+
+
+def seed(total):
+    from django.db import transaction
+
+    from chats.models import Conversation, Message, User
+
+    users = User.objects.bulk_create(
+        [User(username=f"bench{i}", email=f"bench{i}@example.com") for i in range(50)]
+    )
+    conversation = Conversation.objects.create()
+    with transaction.atomic():
+        Message.objects.bulk_create(
+            [
+                Message(
+                    sender=users[i % len(users)],
+                    conversation=conversation,
+                    seq=i + 1,
+                    message_body=f"benchmark message {i}",
+                )
+                for i in range(total)
+            ],
+            batch_size=1000,
+        )
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        began = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - began
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default="100,1000,10000")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    _bootstrap.setup()
+
+    from rest_framework.renderers import JSONRenderer
+
+    from chats.fast_serializers import FastMessageSerializer
+    from chats.models import Message
+    from chats.serializers import MessageSerializer
+
+    seed(max(sizes))
+    queryset = Message.objects.order_by("-seq")
+    renderer = JSONRenderer()
+
+    def drf(size):
+        return MessageSerializer(
+            list(queryset.select_related("sender")[:size]), many=True
+        ).data
+
+    def fast(size):
+        return FastMessageSerializer.serialize(
+            queryset.values(*FastMessageSerializer.columns)[:size]
+        )
+
+    print(f"{'page size':>9} {'drf obj/s':>12} {'fast obj/s':>12} {'speedup':>8}")
+    for size in sizes:
+        drf_seconds, drf_data = best_of(args.repeat, lambda: drf(size))
+        fast_seconds, fast_data = best_of(args.repeat, lambda: fast(size))
+        if renderer.render(drf_data) != renderer.render(fast_data):
+            raise SystemExit(f"Output differs at page size {size}")
+        print(
+            f"{size:>9} {round(size / drf_seconds):>12} "
+            f"{round(size / fast_seconds):>12} {drf_seconds / fast_seconds:>7.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Concurrent message sends on SQLite: default vs tuned vs group commit.
+
+Each mode runs in its own process against a fresh database file.
+Writer threads send messages as a request would: one transaction that
+first checks the sender's membership, then inserts through
+services.send_message (group-commit mode checks, then hands the insert
+to the writer). Reader threads list conversations meanwhile.
+Messages/second, p99 send latency, "database is locked" failures and
+p99 read latency are reported.
+
+Modes:
+    default        stock SQLite settings (DB_SQLITE_TUNED=0): rollback
+                   journal, 5 s timeout, DEFERRED transactions
+    tuned          WAL, synchronous=NORMAL, mmap, busy timeout,
+                   IMMEDIATE transactions
+    group-commit   tuned, plus concurrent sends coalesced per transaction
+
+In default mode a transaction that has read holds a SHARED lock and must
+upgrade it to write. When another connection is already writing, SQLite
+fails the upgrade at once with "database is locked" rather than waiting
+(it would deadlock), whatever the timeout. IMMEDIATE transactions take
+the write lock at BEGIN, where the busy timeout applies, so tuned sends
+queue instead of failing; WAL also lets the readers run during writes.
+
+Usage:
+    python messaging_app/benchmarks/sqlite_write_throughput.py \\
+        [--threads N] [--messages N] [--readers N]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import _bootstrap
+
+MODES = ("default", "tuned", "group-commit")
+READ_INTERVAL = 0.01
+
+
+def run_mode(mode, threads, per_thread, readers):
+    os.environ["DB_SQLITE_TUNED"] = "0" if mode == "default" else "1"
+    _bootstrap.setup()
+
+    from django.db import OperationalError, connection, transaction
+
+    from chats.groupcommit import GroupCommitWriter
+    from chats.models import Conversation, User
+    from chats.services import send_message
+
+    users = [
+        User.objects.create(username=f"bench{i}", email=f"bench{i}@example.com")
+        for i in range(threads)
+    ]
+    conversations = [Conversation.objects.create() for _ in range(10)]
+    for conversation in conversations:
+        conversation.participants.set(users)
+    connection.close()
+
+    Membership = Conversation.participants.through
+    writer = GroupCommitWriter() if mode == "group-commit" else None
+    latencies = []
+    failures = []
+    reads = []
+    read_failures = []
+    lock = threading.Lock()
+    writing = threading.Event()
+
+    def is_member(sender, conversation_id):
+        return Membership.objects.filter(
+            conversation_id=conversation_id, user_id=sender.pk
+        ).exists()
+
+    def send(sender, conversation_id):
+        if writer is not None:
+            if is_member(sender, conversation_id):
+                writer.submit(sender, conversation_id, "benchmark message")
+            return
+        with transaction.atomic():
+            if is_member(sender, conversation_id):
+                send_message(sender, conversation_id, "benchmark message")
+
+    def worker(index):
+        from django.db import connection
+
+        sender = users[index]
+        for i in range(per_thread):
+            conversation_id = conversations[(index + i) % len(conversations)].pk
+            began = time.perf_counter()
+            try:
+                send(sender, conversation_id)
+            except OperationalError as exc:
+                with lock:
+                    failures.append(str(exc))
+                continue
+            with lock:
+                latencies.append(time.perf_counter() - began)
+        connection.close()
+
+    def reader():
+        from django.db import connection
+
+        # Paced like request traffic; a tight loop would mostly measure
+        # contention for the GIL.
+        while writing.is_set():
+            time.sleep(READ_INTERVAL)
+            began = time.perf_counter()
+            try:
+                list(
+                    Conversation.objects.order_by("-last_message_at").values(
+                        "conversation_id", "last_message_at", "message_count"
+                    )
+                )
+            except OperationalError as exc:
+                with lock:
+                    read_failures.append(str(exc))
+                continue
+            with lock:
+                reads.append(time.perf_counter() - began)
+        connection.close()
+
+    writing.set()
+    pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    reader_pool = [threading.Thread(target=reader) for _ in range(readers)]
+    began = time.perf_counter()
+    for thread in reader_pool + pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - began
+    writing.clear()
+    for thread in reader_pool:
+        thread.join()
+    if writer is not None:
+        writer.stop()
+
+    latencies.sort()
+    reads.sort()
+    return {
+        "mode": mode,
+        "sent": len(latencies),
+        "failed": len(failures),
+        "seconds": round(elapsed, 3),
+        "messages_per_second": round(len(latencies) / elapsed),
+        "p99_ms": p99_ms(latencies),
+        "read_p99_ms": p99_ms(reads),
+        "read_failures": len(read_failures),
+        "journal_mode": journal_mode(),
+    }
+
+
+def p99_ms(latencies):
+    if not latencies:
+        return 0
+    return round(latencies[int(len(latencies) * 0.99)] * 1000, 1)
+
+
+def journal_mode():
+    from django.db import connection
+
+    with connection.cursor() as cursor:
+        cursor.execute("PRAGMA journal_mode")
+        return cursor.fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=200, help="messages per thread")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--mode", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.threads, args.messages, args.readers)))
+        return
+
+    results = []
+    for mode in MODES:
+        output = subprocess.run(
+            [
+                sys.executable,
+                __file__,
+                "--mode", mode,
+                "--threads", str(args.threads),
+                "--messages", str(args.messages),
+                "--readers", str(args.readers),
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        results.append(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"threads={args.threads} messages/thread={args.messages} readers={args.readers}")
+    print(
+        f"{'mode':<13} {'msg/s':>8} {'p99 ms':>9} {'sent':>7} {'failed':>7} "
+        f"{'read p99':>9} {'rfailed':>8} {'journal':>8}"
+    )
+    for result in results:
+        print(
+            f"{result['mode']:<13} {result['messages_per_second']:>8} "
+            f"{result['p99_ms']:>9} {result['sent']:>7} {result['failed']:>7} "
+            f"{result['read_p99_ms']:>9} {result['read_failures']:>8} "
+            f"{result['journal_mode']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Cost of the send-path rate limit checks (chats.throttling).
+
+Times LocalStore and CacheStore (over the local-memory cache backend)
+token bucket updates on their own, and the full per-request check of
+POST /messages/: SenderRateThrottle plus ConversationRateThrottle on a
+parsed request. Keys rotate over --keys senders so buckets never run
+dry.
+
+Usage:
+    python messaging_app/benchmarks/throttle_overhead.py [--iterations N] [--keys N]
+"""
+
+import argparse
+import time
+import uuid
+
+import _bootstrap
+
+
+def per_call(func, iterations):
+    began = time.perf_counter()
+    for i in range(iterations):
+        func(i)
+    return (time.perf_counter() - began) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200000)
+    parser.add_argument("--keys", type=int, default=1000)
+    args = parser.parse_args()
+
+    _bootstrap.setup(migrate=False)
+
+    from django.conf import settings
+
+    settings.CACHES = {
+        "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+    }
+    settings.REST_FRAMEWORK = dict(
+        settings.REST_FRAMEWORK,
+        DEFAULT_THROTTLE_RATES={
+            "chats.sender": "1000000/s",
+            "chats.conversation": "1000000/s",
+        },
+    )
+
+    from rest_framework.parsers import JSONParser
+    from rest_framework.request import Request
+    from rest_framework.test import APIRequestFactory
+
+    from chats.throttling import (
+        CacheStore,
+        ConversationRateThrottle,
+        LocalStore,
+        SenderRateThrottle,
+        parse_rate,
+    )
+
+    keys = [str(uuid.uuid4()) for _ in range(args.keys)]
+    interval, capacity = parse_rate("1000000/s")
+
+    local = LocalStore()
+    shared = CacheStore("default")
+
+    factory = APIRequestFactory()
+    requests = []
+    for key in keys:
+        request = Request(
+            factory.post(
+                "/api/chats/messages/",
+                {"sender_id": key, "conversation_id": keys[0], "message_body": "x"},
+                format="json",
+            ),
+            parsers=[JSONParser()],
+        )
+        request.data  # parsed once, as by the view before the throttles run
+        requests.append(request)
+
+    def check(i):
+        request = requests[i % len(requests)]
+        for throttle in (SenderRateThrottle(), ConversationRateThrottle()):
+            throttle.allow_request(request, None)
+
+    def consume(store):
+        return lambda i: store.consume(keys[i % args.keys], interval, capacity)
+
+    results = [
+        ("LocalStore.consume", per_call(consume(local), args.iterations)),
+        ("CacheStore.consume (locmem)", per_call(consume(shared), args.iterations)),
+        ("POST /messages/ check (local)", per_call(check, args.iterations)),
+    ]
+
+    print(f"iterations={args.iterations} keys={args.keys}")
+    print(f"{'check':<32} {'us/call':>8}")
+    for name, micros in results:
+        print(f"{name:<32} {micros:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
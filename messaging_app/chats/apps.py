@@ -0,0 +1,26 @@
+from django.apps import AppConfig
+from django.core import checks
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate
+
+
+class ChatsConfig(AppConfig):
+    name = "chats"
+
+    def ready(self):
+        from . import services  # noqa: F401 (registers the outbox handlers)
+        from .caching import check_shared_caches
+        from .profiling import install_query_recorder
+        from .search import install_fts_triggers
+        from .sqlite import configure_connection
+
+        connection_created.connect(
+            configure_connection, dispatch_uid="chats.sqlite.configure_connection"
+        )
+        connection_created.connect(
+            install_query_recorder, dispatch_uid="chats.profiling.install_query_recorder"
+        )
+        post_migrate.connect(
+            install_fts_triggers, sender=self, dispatch_uid="chats.search.install_fts_triggers"
+        )
+        checks.register(check_shared_caches, checks.Tags.caches)
@@ -0,0 +1,102 @@
+import datetime
+from collections import namedtuple
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .caching import invalidate_conversation
+from .conf import chats_setting
+from .models import ArchivedMessage, Conversation, Message
+
+ArchiveResult = namedtuple("ArchiveResult", ["conversations", "messages"])
+
+
+# ------------------------------------
+# Message archival
+# ------------------------------------
+# Old messages are moved from chats_message to chats_archivedmessage with
+# INSERT ... SELECT / DELETE in the database, one seq range of one
+# conversation per transaction, so nothing is loaded into Python and
+# writers are never blocked for long. Each conversation is archived up
+# to the newest message older than the cutoff, which keeps its archive
+# a prefix of its history (see ArchivedMessage). Archived messages leave
+# the search index along with chats_message.
+def _copy_sql(connection):
+    quote = connection.ops.quote_name
+    columns = [
+        field.column
+        for field in ArchivedMessage._meta.concrete_fields
+        if field.name != "archived_at"
+    ]
+    column_list = ", ".join(quote(column) for column in columns)
+    source = quote(Message._meta.db_table)
+    conversation = quote(Message._meta.get_field("conversation").column)
+    seq = quote(Message._meta.get_field("seq").column)
+    where = f"WHERE {conversation} = %s AND {seq} BETWEEN %s AND %s"
+    insert = (
+        f"INSERT INTO {quote(ArchivedMessage._meta.db_table)} "
+        f"({column_list}, {quote('archived_at')}) "
+        f"SELECT {column_list}, %s FROM {source} {where}"
+    )
+    delete = f"DELETE FROM {source} {where}"
+    return insert, delete
+
+
+def archive_conversation(conversation_id, through_seq, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """
+    Move the messages of one conversation with seq <= through_seq to the
+    archive. Returns the number of messages moved.
+    """
+    batch_size = batch_size or chats_setting("ARCHIVE_BATCH_SIZE")
+    connection = connections[using]
+    insert, delete = _copy_sql(connection)
+    conversation_param = Conversation._meta.pk.get_db_prep_value(conversation_id, connection)
+
+    start = (
+        Message.objects.using(using)
+        .filter(conversation_id=conversation_id)
+        .aggregate(first=Min("seq"))["first"]
+    )
+    if start is None:
+        return 0
+
+    moved = 0
+    while start <= through_seq:
+        end = min(start + batch_size - 1, through_seq)
+        params = [conversation_param, start, end]
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            archived_at = connection.ops.adapt_datetimefield_value(timezone.now())
+            cursor.execute(insert, [archived_at] + params)
+            cursor.execute(delete, params)
+            moved += cursor.rowcount
+        start = end + 1
+
+    if moved:
+        invalidate_conversation(conversation_id)
+    return moved
+
+
+def archive_messages(older_than=None, batch_size=None, using=DEFAULT_DB_ALIAS):
+    """
+    Archive every message older than older_than (a timedelta, by default
+    CHATS["ARCHIVE_AFTER_DAYS"]) and return an ArchiveResult.
+    """
+    if older_than is None:
+        older_than = datetime.timedelta(days=chats_setting("ARCHIVE_AFTER_DAYS"))
+    cutoff = timezone.now() - older_than
+
+    boundaries = (
+        Message.objects.using(using)
+        .filter(sent_at__lt=cutoff)
+        .values("conversation_id")
+        .annotate(through_seq=Max("seq"))
+        .values_list("conversation_id", "through_seq")
+    )
+    conversations = messages = 0
+    for conversation_id, through_seq in list(boundaries):
+        moved = archive_conversation(conversation_id, through_seq, batch_size, using)
+        if moved:
+            conversations += 1
+            messages += moved
+    return ArchiveResult(conversations, messages)
@@ -0,0 +1,209 @@
+import functools
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound, ParseError, Throttled
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .fast_serializers import FastConversationSerializer, FastMessageSerializer
+from .membership import is_participant
+from .models import ArchivedMessage, Conversation, Message, User
+from .pagination import (
+    ConversationCursorPagination,
+    ConversationMessageCursorPagination,
+    MessageCursorPagination,
+)
+from .serializers import MessageSerializer
+from .services import send_message
+from .throttling import ConversationRateThrottle, SenderRateThrottle
+from .views import get_message_window
+
+
+# ------------------------------------
+# Async API views
+# ------------------------------------
+# Async counterparts of the conversation list/detail and message list/send
+# endpoints, for ASGI servers (messaging_app.asgi). Reads use the async ORM
+# and the fast serializers, so a request waiting on the database holds no
+# worker thread. Responses are not served from the response cache.
+def _render(data, status_code=status.HTTP_200_OK):
+    return HttpResponse(
+        JSONRenderer().render(data),
+        status=status_code,
+        content_type="application/json",
+    )
+
+
+def async_api_view(methods):
+    """
+    Wrap an async view: pass it a DRF Request (query_params, data) and
+    turn DRF exceptions into JSON error responses.
+    """
+
+    def decorator(view):
+        @csrf_exempt
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return _render(
+                    {"error": f'Method "{request.method}" not allowed.'},
+                    status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+            try:
+                return await view(Request(request, parsers=[JSONParser()]), *args, **kwargs)
+            except Http404 as exc:
+                # As DRF's exception handler does
+                exc = NotFound(*exc.args)
+                return _render({"detail": exc.detail}, exc.status_code)
+            except APIException as exc:
+                detail = exc.detail
+                if not isinstance(detail, (list, dict)):
+                    detail = {"detail": detail}
+                response = _render(detail, exc.status_code)
+                if getattr(exc, "wait", None):
+                    response["Retry-After"] = "%d" % exc.wait
+                return response
+
+        return wrapper
+
+    return decorator
+
+
+async def _paginated(paginator, queryset, request, serialize, archive=None):
+    page = await paginator.apaginate_queryset(queryset, request, archive=archive)
+    return _render(
+        {
+            "next": paginator.get_next_link(),
+            "previous": paginator.get_previous_link(),
+            "results": await serialize(page),
+        }
+    )
+
+
+def _conversation_serializer(request):
+    return FastConversationSerializer(
+        message_window=get_message_window(request.query_params),
+        request=request,
+        message_list="async-message-list",
+    )
+
+
+async def _serialize_messages(page):
+    return FastMessageSerializer.serialize(page)
+
+
+@async_api_view(["GET"])
+async def conversation_list(request):
+    """
+    GET /async/conversations/ - same payload as /conversations/.
+    """
+    serializer = _conversation_serializer(request)
+    queryset = Conversation.objects.values(*FastConversationSerializer.columns)
+    return await _paginated(
+        ConversationCursorPagination(), queryset, request, serializer.aserialize
+    )
+
+
+@async_api_view(["GET"])
+async def conversation_detail(request, conversation_id):
+    """
+    GET /async/conversations/<id>/ - same payload as /conversations/<id>/.
+    """
+    serializer = _conversation_serializer(request)
+    rows = Conversation.objects.filter(conversation_id=conversation_id).values(
+        *FastConversationSerializer.columns
+    )
+    data = await serializer.aserialize(rows)
+    if not data:
+        raise Http404("No Conversation matches the given query.")
+    return _render(data[0])
+
+
+@async_api_view(["GET", "POST"])
+async def message_list(request):
+    """
+    GET /async/messages/[?conversation=<uuid>] - same payload as /messages/.
+    POST /async/messages/ - send a message, same payload as POST /messages/.
+    """
+    if request.method == "POST":
+        return await _send(request)
+
+    queryset = Message.objects.all()
+    archive = ArchivedMessage.objects.all()
+    paginator = MessageCursorPagination()
+    conversation_id = request.query_params.get("conversation")
+    if conversation_id:
+        try:
+            conversation_id = uuid.UUID(conversation_id)
+        except ValueError:
+            return _render(
+                {"conversation": ["Must be a valid UUID."]}, status.HTTP_400_BAD_REQUEST
+            )
+        queryset = queryset.filter(conversation_id=conversation_id)
+        archive = archive.filter(conversation_id=conversation_id)
+        paginator = ConversationMessageCursorPagination()
+
+    columns = FastMessageSerializer.columns
+    return await _paginated(
+        paginator,
+        queryset.values(*columns),
+        request,
+        _serialize_messages,
+        archive=archive.values(*columns),
+    )
+
+
+async def _send(request):
+    try:
+        data = request.data
+    except ParseError as exc:
+        return _render({"error": str(exc.detail)}, status.HTTP_400_BAD_REQUEST)
+    sender_id = data.get("sender_id")
+    conversation_id = data.get("conversation_id")
+    message_body = data.get("message_body")
+
+    if not sender_id or not conversation_id or not message_body:
+        return _render(
+            {"error": "sender_id, conversation_id, and message_body are required."},
+            status.HTTP_400_BAD_REQUEST,
+        )
+    try:
+        sender_id = uuid.UUID(str(sender_id))
+        conversation_id = uuid.UUID(str(conversation_id))
+    except ValueError:
+        return _render(
+            {"error": "sender_id and conversation_id must be valid UUIDs."},
+            status.HTTP_400_BAD_REQUEST,
+        )
+
+    # Same limits as POST /messages/
+    waits = [
+        throttle.wait()
+        for throttle in (SenderRateThrottle(), ConversationRateThrottle())
+        if not throttle.allow_request(request, None)
+    ]
+    if waits:
+        raise Throttled(max(waits))
+
+    try:
+        sender = await User.objects.aget(user_id=sender_id)
+    except User.DoesNotExist:
+        raise Http404("No User matches the given query.")
+
+    if not await sync_to_async(is_participant)(conversation_id, sender_id):
+        if not await Conversation.objects.filter(conversation_id=conversation_id).aexists():
+            raise Http404("No Conversation matches the given query.")
+        return _render(
+            {"error": "Sender is not a participant in this conversation."},
+            status.HTTP_403_FORBIDDEN,
+        )
+
+    # The insert, seq reservation and inbox/cache updates share one
+    # transaction, which the async ORM cannot span; run it in a thread.
+    message = await sync_to_async(send_message)(sender, conversation_id, message_body)
+    return _render(MessageSerializer(message).data, status.HTTP_201_CREATED)
@@ -0,0 +1,253 @@
+import hashlib
+import random
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import transaction
+from django.utils.cache import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .conf import chats_setting
+from .routers import replica_reads
+
+
+# ------------------------------------
+# In-process LRU tier
+# ------------------------------------
+class LRUCache:
+    """
+    Small thread-safe LRU map for the in-process tier. Entries older than
+    ttl seconds (if set) are dropped on lookup.
+    """
+
+    def __init__(self, maxsize, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return None
+            expires, value = self._data[key]
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+# ------------------------------------
+# Two-tier response cache
+# ------------------------------------
+class ResponseCache:
+    """
+    Serialized payloads in an in-process LRU, backed by an optional shared
+    Django cache (CHATS["RESPONSE_CACHE"], e.g. Redis or Memcached).
+
+    Keys embed the conversation's version counter, so a write makes every
+    cached payload of that conversation unreachable at once; stale
+    entries are evicted by the LRU or expire. Writes that do not bump a
+    version (e.g. a participant's user details) show after the timeout.
+    """
+
+    def __init__(self, alias, local_size, timeout):
+        self.shared = caches[alias] if alias else None
+        self.local = LRUCache(local_size, timeout)
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self.counters = {"local_hits": 0, "shared_hits": 0, "misses": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.counters[name] += 1
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            self._count("local_hits")
+            return value
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._count("shared_hits")
+                self.local.set(key, value)
+                return value
+        self._count("misses")
+        return None
+
+    def set(self, key, value):
+        self.local.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value, self.timeout)
+
+    def stats(self):
+        with self._lock:
+            counters = dict(self.counters)
+        lookups = sum(counters.values())
+        hits = counters["local_hits"] + counters["shared_hits"]
+        counters.update(
+            {
+                "hit_ratio": round(hits / lookups, 4) if lookups else None,
+                "local_entries": len(self.local),
+                "local_evictions": self.local.evictions,
+            }
+        )
+        return counters
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResponseCache(
+                    chats_setting("RESPONSE_CACHE"),
+                    chats_setting("RESPONSE_CACHE_LOCAL_SIZE"),
+                    chats_setting("RESPONSE_CACHE_TIMEOUT"),
+                )
+    return _cache
+
+
+def reset_response_cache():
+    global _cache
+    with _cache_lock:
+        _cache = None
+
+
+# ------------------------------------
+# Conversation versions
+# ------------------------------------
+# Versions live in the shared cache so every process agrees on them; it
+# must really be shared (see check_shared_caches), or a write handled by
+# one process is never seen by the others.
+# A missing version restarts from a random value rather than 0, so an
+# evicted counter never reuses a version whose payloads may still be cached.
+def _version_cache():
+    return caches[chats_setting("RESPONSE_CACHE") or "default"]
+
+
+def _version_key(conversation_id):
+    return f"chats:version:{conversation_id}"
+
+
+def _new_version():
+    return random.getrandbits(48)
+
+
+def conversation_version(conversation_id):
+    cache = _version_cache()
+    key = _version_key(conversation_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_conversation(conversation_id):
+    """
+    Bump a conversation's version now and again on commit, so a read
+    racing the open transaction cannot cache a stale payload for long.
+    """
+    def bump():
+        cache = _version_cache()
+        key = _version_key(conversation_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, _new_version(), None)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def cached_response(request, conversation_id, build):
+    """
+    Serve the payload of build() (a view returning a DRF Response) from the
+    cache, keyed by conversation, version and full request URL.
+    Answers If-None-Match with 304 when the ETag is still current.
+    """
+    version = conversation_version(conversation_id)
+    variant = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()[:16]
+    etag = f'W/"{conversation_id}.{version}.{variant}"'
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match and (etag in parse_etags(if_none_match) or if_none_match.strip() == "*"):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+    cache = get_response_cache()
+    key = f"chats:response:{conversation_id}:{version}:{variant}"
+    payload = cache.get(key)
+    if payload is None:
+        # Fill from the primary: a lagging replica would store a stale
+        # payload under the current version.
+        with replica_reads(False):
+            response = build()
+        if response.status_code != status.HTTP_200_OK:
+            return response
+        payload = response.data
+        cache.set(key, payload)
+        hit = "MISS"
+    else:
+        hit = "HIT"
+    return Response(payload, headers={"ETag": etag, "X-Cache": hit})
+
+
+# ------------------------------------
+# System check
+# ------------------------------------
+PROCESS_LOCAL_BACKENDS = (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+)
+
+
+def check_shared_caches(app_configs, **kwargs):
+    """
+    Warn when the conversation versions or the membership answers are
+    kept in a cache of this process only.
+    """
+    warnings = []
+    for name in ("RESPONSE_CACHE", "MEMBERSHIP_CACHE"):
+        alias = chats_setting(name) or "default"
+        backend = settings.CACHES.get(alias, {}).get("BACKEND")
+        if backend in PROCESS_LOCAL_BACKENDS:
+            warnings.append(
+                checks.Warning(
+                    f"CHATS['{name}'] uses the cache {alias!r} ({backend}), which "
+                    "is not shared between processes: with several worker "
+                    "processes, writes handled by one are not seen by the others.",
+                    hint="Set REDIS_URL, or point CACHES at Redis or Memcached.",
+                    id="chats.W001",
+                )
+            )
+    return warnings
@@ -0,0 +1,92 @@
+from django.conf import settings
+
+
+# ------------------------------------
+# Chats app settings
+# ------------------------------------
+# Override any of these through the CHATS dict in settings.py.
+DEFAULTS = {
+    # Latest N messages embedded per conversation (None embeds all of them).
+    "MESSAGE_WINDOW": None,
+    # Upper bound for ?message_window=
+    "MAX_MESSAGE_WINDOW": 100,
+    # Bulk message ingestion: max items per request, rows per INSERT
+    "BULK_MAX_ITEMS": 10000,
+    "BULK_CHUNK_SIZE": 500,
+    # Bulk participant changes: max user ids per request, rows per INSERT
+    "PARTICIPANTS_MAX_BATCH": 10000,
+    "PARTICIPANTS_CHUNK_SIZE": 1000,
+    # Cache alias and timeout (seconds) for participant membership answers
+    "MEMBERSHIP_CACHE": "default",
+    "MEMBERSHIP_CACHE_TIMEOUT": 300,
+    # Real-time fan-out: broker class, per-subscriber queue bound and
+    # seconds between SSE keepalive comments
+    "PUBSUB_BROKER": "chats.pubsub.LocalBroker",
+    "PUBSUB_QUEUE_SIZE": 100,
+    "PUBSUB_KEEPALIVE": 15,
+    # Delta sync: conversations per response, new messages per conversation
+    "SYNC_MAX_CONVERSATIONS": 200,
+    "SYNC_MESSAGE_WINDOW": 50,
+    # "uuid4" (random) or "uuid7" (time-ordered) for new primary keys
+    "ID_SCHEME": "uuid4",
+    # Dotted path to a search backend (None picks one for the database vendor)
+    "SEARCH_BACKEND": None,
+    "SEARCH_PAGE_SIZE": 20,
+    "MAX_SEARCH_PAGE_SIZE": 100,
+    # Response cache: shared Django cache alias (None for in-process only),
+    # in-process LRU capacity (entries) and timeout of both tiers (seconds)
+    "RESPONSE_CACHE": "default",
+    "RESPONSE_CACHE_LOCAL_SIZE": 1024,
+    "RESPONSE_CACHE_TIMEOUT": 300,
+    # Serve list/retrieve from .values() rows (chats.fast_serializers)
+    "FAST_SERIALIZERS": False,
+    # Rows fetched per database round trip by the streaming exports
+    "EXPORT_CHUNK_SIZE": 2000,
+    # Messages older than this many days are moved to the archive table
+    # by the archive_messages command; rows moved per transaction
+    "ARCHIVE_AFTER_DAYS": 365,
+    "ARCHIVE_BATCH_SIZE": 1000,
+    # Database aliases of read replicas (chats.routers), and how long a
+    # client's reads stick to the primary after it writes
+    "READ_REPLICAS": [],
+    "REPLICA_PIN_SECONDS": 5,
+    "REPLICA_PIN_COOKIE": "chats_pin",
+    # PRAGMAs run on every new SQLite connection (chats.sqlite)
+    "SQLITE_PRAGMAS": {},
+    # Coalesce concurrent message sends into shared transactions
+    # (chats.groupcommit): on/off, max sends per transaction, and seconds
+    # to wait for more sends before committing
+    "GROUP_COMMIT": False,
+    "GROUP_COMMIT_MAX_BATCH": 256,
+    "GROUP_COMMIT_MAX_DELAY": 0.0,
+    # Request profiling (chats.profiling): fraction of requests profiled,
+    # queries slower than this many ms are flagged, and a statement
+    # repeated this many times in one request is flagged as a likely N+1
+    "PROFILING_SAMPLE_RATE": 0.0,
+    "PROFILING_SLOW_QUERY_MS": 100,
+    "PROFILING_N_PLUS_ONE_THRESHOLD": 5,
+    # Token bucket store for chats.throttling (rates are in REST_FRAMEWORK),
+    # the cache alias CacheStore uses, and the LocalStore size bound
+    "THROTTLE_STORE": "chats.throttling.LocalStore",
+    "THROTTLE_CACHE": "default",
+    "THROTTLE_MAX_KEYS": 100000,
+    # Transactional outbox for message side effects (chats.outbox): on/off,
+    # worker threads per process (0: only the drain_outbox command drains),
+    # events per batch, seconds between polls, seconds a claimed batch is
+    # reserved, attempts before an event is marked failed, and the first
+    # retry delay in seconds (doubled per attempt)
+    "OUTBOX": False,
+    "OUTBOX_WORKERS": 2,
+    "OUTBOX_BATCH_SIZE": 100,
+    "OUTBOX_POLL_INTERVAL": 1.0,
+    "OUTBOX_LEASE_SECONDS": 60,
+    "OUTBOX_MAX_ATTEMPTS": 8,
+    "OUTBOX_RETRY_DELAY": 1.0,
+}
+
+
+def chats_setting(name):
+    """
+    Return a chats setting, falling back to DEFAULTS.
+    """
+    return getattr(settings, "CHATS", {}).get(name, DEFAULTS[name])
@@ -0,0 +1,130 @@
+import csv
+import json
+
+from django.http import StreamingHttpResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+from .conf import chats_setting
+from .models import ArchivedMessage, Conversation, Message
+
+
+# ------------------------------------
+# Streaming exports
+# ------------------------------------
+# Messages are read with .values().iterator(chunk_size), so rows are
+# fetched from the database cursor a chunk at a time and written out as
+# they arrive; memory stays flat however long the history is.
+COLUMNS = (
+    "message_id",
+    "conversation_id",
+    "seq",
+    "sender_id",
+    "sender__username",
+    "sent_at",
+    "message_body",
+)
+HEADER = (
+    "message_id",
+    "conversation_id",
+    "seq",
+    "sender_id",
+    "sender_username",
+    "sent_at",
+    "message_body",
+)
+
+FORMATS = {
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "csv": ("text/csv; charset=utf-8", "csv"),
+}
+
+
+def conversation_messages(conversation_id):
+    """
+    Querysets for a conversation's archived, then live, messages;
+    together they are its full history in sequence order.
+    """
+    return [
+        model.objects.filter(conversation_id=conversation_id).order_by("seq")
+        for model in (ArchivedMessage, Message)
+    ]
+
+
+def user_messages(user_id):
+    """
+    Every message of every conversation the user participates in:
+    archived history first, then live messages, each grouped by
+    conversation in sequence order.
+    """
+    conversations = Conversation.participants.through.objects.filter(
+        user_id=user_id
+    ).values("conversation_id")
+    return [
+        model.objects.filter(conversation_id__in=conversations).order_by(
+            "conversation_id", "seq"
+        )
+        for model in (ArchivedMessage, Message)
+    ]
+
+
+def iter_rows(querysets, chunk_size=None):
+    """
+    Export rows as tuples in HEADER order, one queryset after the other.
+    """
+    chunk_size = chunk_size or chats_setting("EXPORT_CHUNK_SIZE")
+    for queryset in querysets:
+        yield from queryset.values_list(*COLUMNS).iterator(chunk_size=chunk_size)
+
+
+def _csv_value(encoder, value):
+    # DRF's encoder formats UUIDs and datetimes as in the JSON responses.
+    if value is None or isinstance(value, (str, int)):
+        return value
+    return encoder.default(value)
+
+
+class _Echo:
+    """
+    File-like object for csv.writer that hands back what is written.
+    """
+
+    def write(self, value):
+        return value
+
+
+def _batched(lines, size):
+    # Hand the server a few KB at a time rather than one row per write.
+    batch = []
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= size:
+            yield "".join(batch)
+            batch = []
+    if batch:
+        yield "".join(batch)
+
+
+def ndjson_lines(rows):
+    encode = JSONEncoder(ensure_ascii=False).encode
+    for row in rows:
+        yield encode(dict(zip(HEADER, row))) + "\n"
+
+
+def csv_lines(rows):
+    encoder = JSONEncoder()
+    writer = csv.writer(_Echo())
+    yield writer.writerow(HEADER)
+    for row in rows:
+        yield writer.writerow([_csv_value(encoder, value) for value in row])
+
+
+def streaming_export(querysets, export_format, filename):
+    """
+    StreamingHttpResponse with the querysets' messages as NDJSON or CSV.
+    """
+    content_type, extension = FORMATS[export_format]
+    rows = iter_rows(querysets)
+    lines = ndjson_lines(rows) if export_format == "ndjson" else csv_lines(rows)
+    response = StreamingHttpResponse(_batched(lines, 100), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return response
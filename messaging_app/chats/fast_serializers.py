@@ -0,0 +1,241 @@
+from urllib.parse import urlencode
+
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from rest_framework.reverse import reverse
+
+from .models import ArchivedMessage, Conversation, Message
+from .pagination import encode_cursor
+
+
+# ------------------------------------
+# Fast-path read-only serializers
+# ------------------------------------
+# Drop-in replacements for the output of UserSerializer, MessageSerializer
+# and ConversationSerializer on the read paths. They work on .values()
+# rows, so no model instances are built and no fields are introspected;
+# the output (after JSON rendering) is identical to the DRF serializers.
+class _Formatter:
+    """
+    Per-call formatting helpers matching DRF's field output.
+    """
+
+    def __init__(self):
+        self.tz = timezone.get_current_timezone()
+
+    def datetime(self, value):
+        # Same as rest_framework.fields.DateTimeField.to_representation
+        if value is None:
+            return None
+        value = value.astimezone(self.tz).isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    @staticmethod
+    def uuid(value):
+        return None if value is None else str(value)
+
+
+class FastUserSerializer:
+    """
+    Output of UserSerializer from a row of `columns` (optionally prefixed).
+    """
+
+    fields = (
+        "user_id",
+        "username",
+        "email",
+        "first_name",
+        "last_name",
+        "phone_number",
+        "role",
+        "created_at",
+    )
+
+    @classmethod
+    def columns(cls, prefix=""):
+        return tuple(prefix + name for name in cls.fields)
+
+    @staticmethod
+    def to_representation(row, fmt, prefix=""):
+        return {
+            "user_id": str(row[prefix + "user_id"]),
+            "username": row[prefix + "username"],
+            "email": row[prefix + "email"],
+            "first_name": row[prefix + "first_name"],
+            "last_name": row[prefix + "last_name"],
+            "phone_number": row[prefix + "phone_number"],
+            "role": row[prefix + "role"],
+            "created_at": fmt.datetime(row[prefix + "created_at"]),
+        }
+
+
+class FastMessageSerializer:
+    """
+    Output of MessageSerializer from Message.objects.values(*columns).
+    The sender is read from the joined sender__* columns.
+    """
+
+    columns = (
+        "message_id",
+        "conversation_id",
+        "seq",
+        "message_body",
+        "sent_at",
+    ) + FastUserSerializer.columns("sender__")
+
+    @staticmethod
+    def to_representation(row, fmt):
+        return {
+            "message_id": str(row["message_id"]),
+            "sender": FastUserSerializer.to_representation(row, fmt, "sender__"),
+            "conversation": str(row["conversation_id"]),
+            "seq": row["seq"],
+            "message_body": row["message_body"],
+            "sent_at": fmt.datetime(row["sent_at"]),
+        }
+
+    @classmethod
+    def serialize(cls, rows):
+        fmt = _Formatter()
+        return [cls.to_representation(row, fmt) for row in rows]
+
+
+class FastConversationSerializer:
+    """
+    Output of ConversationSerializer (or ConversationWindowSerializer when
+    message_window is set) from Conversation.objects.values(*columns).
+    Participants and messages of the whole page are fetched with one
+    query each; the window uses ROW_NUMBER() per conversation.
+    """
+
+    columns = (
+        "conversation_id",
+        "created_at",
+        "updated_at",
+        "last_message_at",
+        "last_message_id",
+        "message_count",
+    )
+
+    def __init__(self, message_window=None, request=None, message_list="message-list"):
+        self.message_window = message_window
+        self.request = request
+        # URL name the messages_cursor links point at
+        self.message_list = message_list
+
+    def participant_rows(self, conversation_ids):
+        through = Conversation.participants.through
+        return (
+            through.objects.filter(conversation_id__in=conversation_ids)
+            .values("conversation_id", *FastUserSerializer.columns("user__"))
+            .order_by("conversation_id", "user_id")
+        )
+
+    def message_rows(self, model, conversation_ids, size=None):
+        queryset = model.objects.filter(conversation_id__in=conversation_ids)
+        if size is None:
+            queryset = queryset.order_by("conversation_id", "seq")
+        else:
+            queryset = queryset.annotate(
+                window_row=Window(
+                    RowNumber(),
+                    partition_by=[F("conversation_id")],
+                    order_by=F("seq").desc(),
+                )
+            ).filter(window_row__lte=size)
+            queryset = queryset.order_by("conversation_id", "-seq")
+        return queryset.values(*FastMessageSerializer.columns)
+
+    def window_size(self):
+        return None if self.message_window is None else self.message_window + 1
+
+    def message_querysets(self, conversation_ids):
+        """
+        Message rows from both tables (see chats.archive), in the order
+        they are read: the full history in seq order, or the window newest
+        first, topped up from the archive when the live messages fall short.
+        """
+        size = self.window_size()
+        models = (ArchivedMessage, Message) if size is None else (Message, ArchivedMessage)
+        return [self.message_rows(model, conversation_ids, size) for model in models]
+
+    def messages_cursor(self, conversation_id, oldest):
+        url = reverse(self.message_list, request=self.request)
+        query = urlencode(
+            {
+                "conversation": str(conversation_id),
+                "cursor": encode_cursor([oldest["seq"]]),
+            }
+        )
+        return {"has_more": True, "next": f"{url}?{query}"}
+
+    def serialize(self, rows):
+        rows = list(rows)
+        if not rows:
+            return []
+        ids = [row["conversation_id"] for row in rows]
+        participants = list(self.participant_rows(ids))
+        messages = [row for queryset in self.message_querysets(ids) for row in queryset]
+        return self.assemble(rows, participants, messages)
+
+    async def aserialize(self, rows):
+        """
+        serialize() for async views, using async iteration. rows is a
+        queryset or an already fetched page.
+        """
+        rows = [row async for row in rows] if hasattr(rows, "__aiter__") else list(rows)
+        if not rows:
+            return []
+        ids = [row["conversation_id"] for row in rows]
+        participants = [row async for row in self.participant_rows(ids)]
+        messages = []
+        for queryset in self.message_querysets(ids):
+            messages += [row async for row in queryset]
+        return self.assemble(rows, participants, messages)
+
+    def assemble(self, rows, participant_rows, message_rows):
+        fmt = _Formatter()
+        participants = {row["conversation_id"]: [] for row in rows}
+        for row in participant_rows:
+            participants[row["conversation_id"]].append(
+                FastUserSerializer.to_representation(row, fmt, "user__")
+            )
+        messages = {row["conversation_id"]: [] for row in rows}
+        for row in message_rows:
+            messages[row["conversation_id"]].append(row)
+
+        size = self.window_size()
+        data = []
+        for row in rows:
+            conversation_id = row["conversation_id"]
+            item = {
+                "conversation_id": str(conversation_id),
+                "participants": participants[conversation_id],
+                "messages": None,
+                "created_at": fmt.datetime(row["created_at"]),
+                "updated_at": fmt.datetime(row["updated_at"]),
+                "last_message_at": fmt.datetime(row["last_message_at"]),
+                "last_message_id": fmt.uuid(row["last_message_id"]),
+                "message_count": row["message_count"],
+            }
+            if size is None:
+                item["messages"] = [
+                    FastMessageSerializer.to_representation(message, fmt)
+                    for message in messages[conversation_id]
+                ]
+            else:
+                recent = messages[conversation_id][:size]
+                window = recent[: self.message_window]
+                item["messages"] = [
+                    FastMessageSerializer.to_representation(message, fmt)
+                    for message in window
+                ]
+                if len(recent) > self.message_window:
+                    item["messages_cursor"] = self.messages_cursor(conversation_id, window[-1])
+                else:
+                    item["messages_cursor"] = {"has_more": False, "next": None}
+            data.append(item)
+        return data
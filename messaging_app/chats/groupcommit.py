@@ -0,0 +1,141 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.db import close_old_connections, connection
+
+from .conf import chats_setting
+from .services import send_messages_bulk
+
+
+# ------------------------------------
+# Group commit
+# ------------------------------------
+class SendRejected(Exception):
+    """
+    A queued send was refused (e.g. the sender left the conversation).
+    """
+
+
+class GroupCommitWriter:
+    """
+    Coalesces concurrent message sends into shared transactions.
+
+    Callers block in submit() while a single writer thread drains the
+    queue and inserts everything waiting (up to max_batch sends, after
+    up to max_delay seconds) with services.send_messages_bulk(), one
+    transaction and one commit for the whole group. With one writer, a
+    single-writer database such as SQLite never sees lock contention.
+    """
+
+    def __init__(self, max_batch=256, max_delay=0.0):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, sender, conversation_id, message_body, timeout=None):
+        """
+        Queue a send and wait for its commit. Returns the Message.
+        Membership is checked by the caller, as for services.send_message.
+        """
+        self.start()
+        future = Future()
+        item = {
+            "sender_id": sender.pk,
+            "conversation_id": conversation_id,
+            "message_body": message_body,
+        }
+        self.queue.put((item, future))
+        message = future.result(timeout)
+        message.sender = sender
+        return message
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="chats-group-commit", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self.queue.put(None)
+            thread.join()
+
+    def _collect(self):
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch and batch[-1] is not None:
+            try:
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    batch.append(self.queue.get(timeout=remaining))
+                else:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        try:
+            while True:
+                batch = self._collect()
+                stopping = batch[-1] is None
+                if stopping:
+                    batch.pop()
+                if batch:
+                    self._commit(batch)
+                    # As at the end of a request: drop broken or expired connections.
+                    close_old_connections()
+                if stopping:
+                    return
+        finally:
+            connection.close()
+
+    def _commit(self, batch):
+        try:
+            result = send_messages_bulk([item for item, _ in batch])
+        except Exception as exc:
+            for _, future in batch:
+                future.set_exception(exc)
+            return
+        for index, message in result.created:
+            batch[index][1].set_result(message)
+        for index, error in result.errors:
+            batch[index][1].set_exception(SendRejected(error))
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_group_commit_writer():
+    """
+    Return the process-wide writer, built from CHATS["GROUP_COMMIT_*"].
+    """
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter(
+                    max_batch=chats_setting("GROUP_COMMIT_MAX_BATCH"),
+                    max_delay=chats_setting("GROUP_COMMIT_MAX_DELAY"),
+                )
+    return _writer
+
+
+def reset_group_commit_writer():
+    """
+    Stop and forget the current writer (tests, settings changes).
+    """
+    global _writer
+    with _writer_lock:
+        writer, _writer = _writer, None
+    if writer is not None:
+        writer.stop()
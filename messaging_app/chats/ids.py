@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+import uuid
+
+from .conf import chats_setting
+
+
+# ------------------------------------
+# Primary key generation
+# ------------------------------------
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """
+    Time-ordered UUID (RFC 9562 version 7).
+
+    48-bit Unix millisecond timestamp, then a 12-bit counter that keeps IDs
+    from one process increasing within the same millisecond, then 62
+    random bits. New rows land at the right edge of the primary key
+    B-tree instead of on random pages.
+    """
+    global _last_ms, _counter
+    with _lock:
+        ms = time.time_ns() // 1_000_000
+        if ms > _last_ms:
+            _last_ms = ms
+            _counter = int.from_bytes(os.urandom(2), "big") & 0x3FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted: borrow the next millisecond.
+                _last_ms += 1
+                _counter = 0
+        ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id():
+    """
+    Default for UUID primary keys: uuid4, or uuid7 when
+    CHATS["ID_SCHEME"] is "uuid7".
+    """
+    if chats_setting("ID_SCHEME") == "uuid7":
+        return uuid7()
+    return uuid.uuid4()
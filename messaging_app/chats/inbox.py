@@ -0,0 +1,209 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import Conversation, InboxEntry, Message
+
+
+# ------------------------------------
+# Inbox read model maintenance
+# ------------------------------------
+def add_entries(conversation, user_ids, batch_size=None):
+    """
+    Create inbox entries for new participants. History from before they
+    joined counts as read.
+    """
+    InboxEntry.objects.bulk_create(
+        [
+            InboxEntry(
+                user_id=user_id,
+                conversation_id=conversation.pk,
+                last_read_seq=conversation.last_seq,
+                applied_seq=conversation.last_seq,
+                last_activity_at=conversation.last_message_at or conversation.created_at,
+            )
+            for user_id in user_ids
+        ],
+        batch_size=batch_size,
+        ignore_conflicts=True,
+    )
+
+
+def remove_entries(conversation_id, user_ids):
+    """
+    Drop the inbox entries of participants who left a conversation.
+    """
+    InboxEntry.objects.filter(conversation_id=conversation_id, user_id__in=user_ids).delete()
+
+
+def own_messages(per_sender):
+    """
+    Expression for the number of messages an entry's user sent, from a
+    Counter of sender ids.
+    """
+    return Case(
+        *[When(user_id=sender_id, then=Value(count)) for sender_id, count in per_sender.items()],
+        default=Value(0),
+        output_field=IntegerField(),
+    )
+
+
+def record_messages(conversation_id, messages):
+    """
+    Apply newly inserted messages of one conversation to its inbox entries.
+    Must run in the inserting transaction; after it has committed (with
+    CHATS["OUTBOX"]), use apply_messages() instead.
+
+    Everyone's unread counter grows by the number of messages they did not
+    send themselves; each sender's read pointer moves to their own latest
+    message, since writing implies having read what came before.
+    """
+    latest = max(message.sent_at for message in messages)
+    last_seq = max(message.seq for message in messages)
+    per_sender = Counter(message.sender_id for message in messages)
+
+    InboxEntry.objects.filter(conversation_id=conversation_id).update(
+        unread_count=F("unread_count") + len(messages) - own_messages(per_sender),
+        applied_seq=Greatest(F("applied_seq"), Value(last_seq)),
+        last_activity_at=Greatest(F("last_activity_at"), Value(latest)),
+    )
+
+    now = timezone.now()
+    for sender_id in per_sender:
+        read_seq = max(message.seq for message in messages if message.sender_id == sender_id)
+        unread = sum(
+            1
+            for message in messages
+            if message.seq > read_seq and message.sender_id != sender_id
+        )
+        InboxEntry.objects.filter(
+            conversation_id=conversation_id, user_id=sender_id
+        ).update(
+            last_read_seq=Greatest(F("last_read_seq"), Value(read_seq)),
+            last_read_at=now,
+            unread_count=unread,
+        )
+
+
+def apply_messages(conversation_id):
+    """
+    Bring the inbox entries of a conversation up to its latest message, for
+    callers running after the inserting transactions (the outbox handler).
+
+    Each entry's applied_seq is the last message its unread_count includes,
+    so only the messages after it are added: applying is idempotent, and
+    batches may be applied twice or out of order. Holds the conversation's
+    row lock, so no message commits in between.
+    """
+    last_seq = (
+        Conversation.objects.select_for_update()
+        .filter(pk=conversation_id)
+        .values_list("last_seq", flat=True)
+        .first()
+    )
+    entries = InboxEntry.objects.filter(
+        conversation_id=conversation_id, applied_seq__lt=last_seq or 0
+    )
+    marks = sorted(entries.order_by().values_list("applied_seq", flat=True).distinct())
+    if not marks:
+        return
+    messages = list(
+        Message.objects.filter(conversation_id=conversation_id, seq__gt=marks[0])
+        .order_by("seq")
+        .values_list("seq", "sender_id", "sent_at", named=True)
+    )
+
+    # Entries usually share one mark (the previous batch), so this is
+    # one UPDATE costing the same for any unread backlog.
+    for mark in marks:
+        new = [message for message in messages if message.seq > mark]
+        changes = {"applied_seq": last_seq}
+        if new:
+            per_sender = Counter(message.sender_id for message in new)
+            latest = max(message.sent_at for message in new)
+            changes["unread_count"] = F("unread_count") + len(new) - own_messages(per_sender)
+            changes["last_activity_at"] = Greatest(F("last_activity_at"), Value(latest))
+        entries.filter(applied_seq=mark).update(**changes)
+
+    # Writing implies having read what came before: move each sender's
+    # read pointer to their latest message and count what is after it.
+    now = timezone.now()
+    read_seqs = {message.sender_id: message.seq for message in messages}
+    for sender_id, read_seq in read_seqs.items():
+        unread = sum(
+            1 for message in messages if message.seq > read_seq and message.sender_id != sender_id
+        )
+        InboxEntry.objects.filter(
+            conversation_id=conversation_id, user_id=sender_id, last_read_seq__lt=read_seq
+        ).update(last_read_seq=read_seq, last_read_at=now, unread_count=unread)
+
+
+def recount_unread(entries):
+    """
+    Set unread_count of entries to the number of messages after their
+    read pointer, up to their applied_seq, sent by someone else. One UPDATE.
+    """
+    unread = (
+        Message.objects.filter(
+            conversation_id=OuterRef("conversation_id"),
+            seq__gt=OuterRef("last_read_seq"),
+            seq__lte=OuterRef("applied_seq"),
+        )
+        .exclude(sender_id=OuterRef("user_id"))
+        .order_by()
+        .values("conversation_id")
+        .annotate(count=Count("*"))
+        .values("count")
+    )
+    entries.update(unread_count=Coalesce(Subquery(unread), 0))
+
+
+def remove_message(message):
+    """
+    Take a deleted message out of the unread counts that included it.
+    """
+    recount_unread(
+        InboxEntry.objects.filter(
+            conversation_id=message.conversation_id,
+            last_read_seq__lt=message.seq,
+            applied_seq__gte=message.seq,
+        ).exclude(user_id=message.sender_id)
+    )
+
+
+def mark_read(conversation_id, user_id, seq=None):
+    """
+    Move a user's read pointer up to seq (default: the latest message) and
+    recount what is still unread. Raises InboxEntry.DoesNotExist if the
+    user is not in the conversation.
+    """
+    with transaction.atomic():
+        entry = InboxEntry.objects.select_for_update().get(
+            conversation_id=conversation_id, user_id=user_id
+        )
+        last_seq = Conversation.objects.filter(pk=conversation_id).values_list(
+            "last_seq", flat=True
+        ).get()
+        seq = last_seq if seq is None else min(seq, last_seq)
+
+        if seq > entry.last_read_seq:
+            # Messages up to seq are read whether or not they were applied.
+            entry.applied_seq = max(entry.applied_seq, seq)
+            entry.last_read_seq = seq
+            entry.last_read_at = timezone.now()
+            entry.unread_count = (
+                Message.objects.filter(
+                    conversation_id=conversation_id,
+                    seq__gt=seq,
+                    seq__lte=entry.applied_seq,
+                )
+                .exclude(sender_id=user_id)
+                .count()
+            )
+            entry.save(
+                update_fields=["last_read_seq", "last_read_at", "unread_count", "applied_seq"]
+            )
+    return entry
@@ -0,0 +1,39 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+
+from chats.archive import archive_messages
+from chats.conf import chats_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Move messages older than --older-than-days into the archive table. "
+        "Meant to run on a schedule (cron, systemd timer); safe to re-run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than-days",
+            type=int,
+            default=chats_setting("ARCHIVE_AFTER_DAYS"),
+            help="Archive messages sent more than this many days ago.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=chats_setting("ARCHIVE_BATCH_SIZE"),
+            help="Messages moved per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        result = archive_messages(
+            older_than=datetime.timedelta(days=options["older_than_days"]),
+            batch_size=options["batch_size"],
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {result.messages} messages "
+                f"from {result.conversations} conversations."
+            )
+        )
@@ -0,0 +1,31 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from chats.conf import chats_setting
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database into every SQLite read replica "
+        "(CHATS['READ_REPLICAS']). Stands in for replication when running "
+        "with local database files as replicas."
+    )
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES["default"]
+        if "sqlite" not in primary["ENGINE"]:
+            raise CommandError("The primary database is not SQLite.")
+
+        source = sqlite3.connect(primary["NAME"])
+        try:
+            for alias in chats_setting("READ_REPLICAS"):
+                target = sqlite3.connect(settings.DATABASES[alias]["NAME"])
+                try:
+                    source.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"Copied to {alias}.")
+        finally:
+            source.close()
@@ -0,0 +1,54 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+
+from chats.conf import chats_setting
+from chats.outbox import OutboxWorkerPool, drain
+
+
+class Command(BaseCommand):
+    help = (
+        "Process outbox events. With --once, drain what is due and exit "
+        "(cron, tests); otherwise run a worker pool until interrupted, for "
+        "deployments that keep CHATS['OUTBOX_WORKERS'] at 0 in web processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Drain due events and exit.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=chats_setting("OUTBOX_WORKERS") or 1,
+            help="Worker threads.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=chats_setting("OUTBOX_BATCH_SIZE"),
+            help="Events claimed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        if options["once"]:
+            result = drain(options["batch_size"])
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Processed {result.processed} events "
+                    f"({result.retried} to retry, {result.failed} failed)."
+                )
+            )
+            return
+
+        stopping = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *args: stopping.set())
+        pool = OutboxWorkerPool(workers=options["workers"], batch_size=options["batch_size"])
+        pool.start()
+        self.stdout.write(f"Draining the outbox with {pool.workers} workers.")
+        stopping.wait()
+        pool.stop()
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from chats.search import get_search_backend
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the message full-text search index from the messages table, "
+        "e.g. after restoring a database. Its triggers are reinstalled by "
+        "every migrate."
+    )
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt index ({type(backend).__name__})."))
@@ -0,0 +1,71 @@
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+from .conf import chats_setting
+from .models import Conversation
+
+
+# ------------------------------------
+# Participant membership cache
+# ------------------------------------
+# Each conversation has a generation token; membership answers are cached
+# under it. Invalidating a conversation just replaces the token, which
+# orphans every cached answer at once (they expire on their own).
+# Random tokens (not counters) keep an evicted generation from ever
+# coming back and resurrecting stale answers.
+def _cache():
+    return caches[chats_setting("MEMBERSHIP_CACHE")]
+
+
+def _generation_key(conversation_id):
+    return f"chats:members:{conversation_id}"
+
+
+def _member_key(conversation_id, generation, user_id):
+    return f"chats:members:{conversation_id}:{generation}:{user_id}"
+
+
+def _generation(cache, conversation_id):
+    return cache.get_or_set(
+        _generation_key(conversation_id),
+        uuid.uuid4().hex,
+        chats_setting("MEMBERSHIP_CACHE_TIMEOUT"),
+    )
+
+
+def is_participant(conversation_id, user_id):
+    """
+    Return True if user_id participates in conversation_id.
+    Answers come from the cache, or from a single EXISTS probe on the
+    participants table's (conversation_id, user_id) unique index.
+    """
+    cache = _cache()
+    timeout = chats_setting("MEMBERSHIP_CACHE_TIMEOUT")
+    key = _member_key(conversation_id, _generation(cache, conversation_id), user_id)
+
+    member = cache.get(key)
+    if member is None:
+        member = Conversation.participants.through.objects.filter(
+            conversation_id=conversation_id, user_id=user_id
+        ).exists()
+        cache.set(key, member, timeout)
+    return member
+
+
+def invalidate_participants(conversation_id):
+    """
+    Drop cached membership answers for a conversation.
+    Done right away and again on commit, so a lookup that ran while the
+    transaction was still open cannot leave a stale answer behind.
+    """
+    def invalidate():
+        _cache().set(
+            _generation_key(conversation_id),
+            uuid.uuid4().hex,
+            chats_setting("MEMBERSHIP_CACHE_TIMEOUT"),
+        )
+
+    invalidate()
+    transaction.on_commit(invalidate)
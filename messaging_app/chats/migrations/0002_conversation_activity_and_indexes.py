@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:44
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_last_message(apps, schema_editor):
+    """
+    Populate the denormalized activity columns for existing conversations.
+    """
+    Conversation = apps.get_model("chats", "Conversation")
+    Message = apps.get_model("chats", "Message")
+
+    messages = Message.objects.filter(conversation=OuterRef("pk"))
+    latest = messages.order_by("-sent_at", "-message_id")
+    counts = messages.order_by().values("conversation").annotate(n=Count("*")).values("n")
+
+    Conversation.objects.update(
+        last_message_at=Subquery(latest.values("sent_at")[:1]),
+        last_message_id=Subquery(latest.values("message_id")[:1]),
+        message_count=Coalesce(Subquery(counts), 0),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_message_id',
+            field=models.UUIDField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-created_at', '-conversation_id'], name='chats_conv_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['-last_message_at', '-conversation_id'], name='chats_conv_last_msg_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-sent_at', '-message_id'], name='chats_msg_conv_sent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['-sent_at', '-message_id'], name='chats_msg_sent_idx'),
+        ),
+        migrations.RunPython(backfill_last_message, migrations.RunPython.noop),
+    ]
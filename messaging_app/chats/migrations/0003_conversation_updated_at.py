@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:48
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def backfill_updated_at(apps, schema_editor):
+    Conversation = apps.get_model("chats", "Conversation")
+    Conversation.objects.update(updated_at=Coalesce("last_message_at", "created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0002_conversation_activity_and_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['updated_at', 'conversation_id'], name='chats_conv_updated_idx'),
+        ),
+        migrations.RunPython(backfill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:50
+
+import chats.ids
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def backfill_seq(apps, schema_editor):
+    """
+    Number existing messages 1..n per conversation in (sent_at, message_id)
+    order and record the highest number on the conversation.
+    """
+    Conversation = apps.get_model("chats", "Conversation")
+    Message = apps.get_model("chats", "Message")
+
+    batch = []
+    previous, seq = None, 0
+    ordered = Message.objects.only("message_id", "conversation_id").order_by(
+        "conversation_id", "sent_at", "message_id"
+    )
+    for message in ordered.iterator(chunk_size=2000):
+        if message.conversation_id != previous:
+            previous, seq = message.conversation_id, 0
+        seq += 1
+        message.seq = seq
+        batch.append(message)
+        if len(batch) >= 2000:
+            Message.objects.bulk_update(batch, ["seq"])
+            batch = []
+    Message.objects.bulk_update(batch, ["seq"])
+
+    for row in Message.objects.values("conversation_id").annotate(last=Max("seq")):
+        Conversation.objects.filter(pk=row["conversation_id"]).update(last_seq=row["last"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0003_conversation_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='last_seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+        # Only the Python-side default changes; skip the table rebuilds.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='conversation',
+                    name='conversation_id',
+                    field=models.UUIDField(db_index=True, default=chats.ids.new_id, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='message',
+                    name='message_id',
+                    field=models.UUIDField(db_index=True, default=chats.ids.new_id, editable=False, primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='user',
+                    name='user_id',
+                    field=models.UUIDField(db_index=True, default=chats.ids.new_id, editable=False, primary_key=True, serialize=False, unique=True),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('conversation', 'seq'), name='chats_msg_conv_seq_uniq'),
+        ),
+    ]
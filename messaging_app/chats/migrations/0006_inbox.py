@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:53
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_inbox(apps, schema_editor):
+    """
+    One entry per existing membership, with everything marked as read.
+    """
+    Conversation = apps.get_model("chats", "Conversation")
+    InboxEntry = apps.get_model("chats", "InboxEntry")
+    Through = Conversation.participants.through
+
+    memberships = Through.objects.values_list(
+        "user_id",
+        "conversation_id",
+        "conversation__last_seq",
+        "conversation__last_message_at",
+        "conversation__created_at",
+    )
+    batch = []
+    for user_id, conversation_id, last_seq, last_message_at, created_at in memberships.iterator():
+        batch.append(
+            InboxEntry(
+                user_id=user_id,
+                conversation_id=conversation_id,
+                last_read_seq=last_seq,
+                last_activity_at=last_message_at or created_at,
+            )
+        )
+        if len(batch) >= 2000:
+            InboxEntry.objects.bulk_create(batch)
+            batch = []
+    InboxEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0005_message_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InboxEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_read_seq', models.PositiveBigIntegerField(default=0)),
+                ('last_read_at', models.DateTimeField(blank=True, null=True)),
+                ('unread_count', models.PositiveIntegerField(default=0)),
+                ('last_activity_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to='chats.conversation')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inbox_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', '-last_activity_at', '-conversation'], name='chats_inbox_activity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'conversation'), name='chats_inbox_user_conv_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_inbox, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-18 04:59
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0006_inbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedMessage',
+            fields=[
+                ('message_id', models.UUIDField(editable=False, primary_key=True, serialize=False)),
+                ('message_body', models.TextField()),
+                ('sent_at', models.DateTimeField()),
+                ('seq', models.PositiveBigIntegerField(editable=False, null=True)),
+                ('archived_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to='chats.conversation')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_messages', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-sent_at', '-message_id'], name='chats_archmsg_sent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('conversation', 'seq'), name='chats_archmsg_conv_seq_uniq')],
+            },
+        ),
+    ]
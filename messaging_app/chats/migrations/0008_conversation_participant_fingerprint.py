@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:18
+
+from itertools import groupby
+
+from django.db import migrations, models
+
+
+def backfill_fingerprints(apps, schema_editor):
+    """
+    Fingerprint the participant set of every existing conversation.
+    """
+    from chats.models import participant_fingerprint
+
+    Conversation = apps.get_model("chats", "Conversation")
+    Through = Conversation.participants.through
+
+    memberships = Through.objects.order_by("conversation_id").values_list(
+        "conversation_id", "user_id"
+    )
+    batch = []
+    for conversation_id, rows in groupby(memberships.iterator(), key=lambda row: row[0]):
+        batch.append(
+            Conversation(
+                conversation_id=conversation_id,
+                participant_fingerprint=participant_fingerprint(user_id for _, user_id in rows),
+            )
+        )
+        if len(batch) >= 1000:
+            Conversation.objects.bulk_update(batch, ["participant_fingerprint"])
+            batch = []
+    Conversation.objects.bulk_update(batch, ["participant_fingerprint"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0007_archived_message'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='participant_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['participant_fingerprint', 'created_at'], name='chats_conv_fingerprint_idx'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_applied_seq(apps, schema_editor):
+    """
+    Existing unread counts include every message sent so far.
+    """
+    Conversation = apps.get_model("chats", "Conversation")
+    InboxEntry = apps.get_model("chats", "InboxEntry")
+    InboxEntry.objects.update(
+        applied_seq=Subquery(
+            Conversation.objects.filter(pk=OuterRef("conversation_id")).values("last_seq")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0009_outbox_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inboxentry',
+            name='applied_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_applied_seq, migrations.RunPython.noop),
+    ]
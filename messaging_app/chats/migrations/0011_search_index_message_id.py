@@ -0,0 +1,26 @@
+from django.db import migrations
+
+
+def rekey_search_index(apps, schema_editor):
+    """
+    Replace the index keyed on chats_message's rowid with one keyed on
+    message_id (see chats.search).
+    """
+    if schema_editor.connection.vendor != "sqlite":
+        return
+    from chats.search import install_fts, uninstall_fts
+
+    uninstall_fts(schema_editor.connection)
+    install_fts(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chats', '0010_inboxentry_applied_seq'),
+    ]
+
+    operations = [
+        # The new index also works with the older schema.
+        migrations.RunPython(rekey_search_index, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,12 @@
-import uuid
-from django.db import models
+import hashlib
+
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
+from .ids import new_id
+
 
 # -----------------------------
 # Custom User Model
@@ -12,7 +17,7 @@ class User(AbstractUser):
     Adds UUID user_id, phone_number, role, and timestamps.
     """
     user_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, unique=True, db_index=True
+        primary_key=True, default=new_id, editable=False, unique=True, db_index=True
     )
     email = models.EmailField(unique=True)
     phone_number = models.CharField(max_length=20, null=True, blank=True)
@@ -38,6 +43,30 @@ class User(AbstractUser):
 # -----------------------------
 # Conversation Model
 # -----------------------------
+class ConversationManager(models.Manager):
+    def reserve_seq(self, conversation_id, count=1):
+        """
+        Reserve `count` consecutive message sequence numbers and return the
+        first one. Must run inside the transaction that inserts the messages:
+        the row lock taken by the UPDATE only serializes senders of the same
+        conversation, and a rollback returns the numbers, so there are no gaps.
+        """
+        self.filter(pk=conversation_id).update(last_seq=F("last_seq") + count)
+        last_seq = self.filter(pk=conversation_id).values_list("last_seq", flat=True).get()
+        return last_seq - count + 1
+
+
+def participant_fingerprint(user_ids):
+    """
+    Canonical key of a participant set: sha256 of the sorted user ids,
+    or None for an empty set.
+    """
+    ids = sorted({str(user_id) for user_id in user_ids})
+    if not ids:
+        return None
+    return hashlib.sha256(",".join(ids).encode()).hexdigest()
+
+
 class Conversation(models.Model):
     """
     Stores a conversation between two or more users.
@@ -45,13 +74,55 @@ class Conversation(models.Model):
     """
 
     conversation_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+        primary_key=True, default=new_id, editable=False, db_index=True
     )
 
     participants = models.ManyToManyField(User, related_name="conversations")
 
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # Denormalized from the latest message, kept current by
+    # services.send_message() in the same transaction as the insert,
+    # and by services.delete_message().
+    last_message_at = models.DateTimeField(null=True, blank=True, editable=False)
+    last_message_id = models.UUIDField(null=True, blank=True, editable=False)
+    message_count = models.PositiveIntegerField(default=0, editable=False)
+
+    # Bumped on every new message or membership change; drives delta sync.
+    updated_at = models.DateTimeField(default=timezone.now, editable=False)
+
+    # Highest message sequence number handed out (see Message.seq)
+    last_seq = models.PositiveBigIntegerField(default=0, editable=False)
+
+    # participant_fingerprint() of the current participants, kept current
+    # by the membership services; finds a conversation by its exact
+    # participant set (e.g. an existing DM) with one index probe.
+    participant_fingerprint = models.CharField(
+        max_length=64, null=True, blank=True, editable=False
+    )
+
+    objects = ConversationManager()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["updated_at", "conversation_id"],
+                name="chats_conv_updated_idx",
+            ),
+            models.Index(
+                fields=["-created_at", "-conversation_id"],
+                name="chats_conv_created_idx",
+            ),
+            models.Index(
+                fields=["-last_message_at", "-conversation_id"],
+                name="chats_conv_last_msg_idx",
+            ),
+            models.Index(
+                fields=["participant_fingerprint", "created_at"],
+                name="chats_conv_fingerprint_idx",
+            ),
+        ]
+
     def __str__(self):
         return f"Conversation {self.conversation_id}"
 
@@ -66,7 +137,7 @@ class Message(models.Model):
     """
 
     message_id = models.UUIDField(
-        primary_key=True, default=uuid.uuid4, editable=False, db_index=True
+        primary_key=True, default=new_id, editable=False, db_index=True
     )
 
     sender = models.ForeignKey(
@@ -81,5 +152,167 @@ class Message(models.Model):
 
     sent_at = models.DateTimeField(auto_now_add=True)
 
+    # Gap-free position within the conversation (1, 2, 3, ...), assigned on insert
+    seq = models.PositiveBigIntegerField(null=True, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "seq"], name="chats_msg_conv_seq_uniq"
+            ),
+        ]
+        indexes = [
+            # Messages of one conversation in time order
+            models.Index(
+                fields=["conversation", "-sent_at", "-message_id"],
+                name="chats_msg_conv_sent_idx",
+            ),
+            # Global message list (keyset pagination)
+            models.Index(
+                fields=["-sent_at", "-message_id"],
+                name="chats_msg_sent_idx",
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.seq is None:
+            with transaction.atomic(using=kwargs.get("using")):
+                self.seq = Conversation.objects.reserve_seq(self.conversation_id)
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Message from {self.sender.email} in {self.conversation.conversation_id}"
+
+
+# -----------------------------
+# Archived Message Model
+# -----------------------------
+class ArchivedMessage(models.Model):
+    """
+    Cold storage for old messages, moved out of Message by
+    chats.archive so the hot table and its indexes stay small.
+
+    A conversation's archive always holds a prefix of its history
+    (every seq up to some point), so reads fall through to it once they
+    run past the oldest message left in Message.
+    """
+
+    message_id = models.UUIDField(primary_key=True, editable=False)
+
+    sender = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="archived_messages"
+    )
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="archived_messages"
+    )
+
+    message_body = models.TextField()
+
+    sent_at = models.DateTimeField()
+
+    seq = models.PositiveBigIntegerField(null=True, editable=False)
+
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["conversation", "seq"], name="chats_archmsg_conv_seq_uniq"
+            ),
+        ]
+        indexes = [
+            # Global message list falling through to the archive
+            models.Index(
+                fields=["-sent_at", "-message_id"],
+                name="chats_archmsg_sent_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Archived message {self.message_id} in {self.conversation_id}"
+
+
+# -----------------------------
+# Inbox Model
+# -----------------------------
+class InboxEntry(models.Model):
+    """
+    Per-user, per-conversation read model.
+    Holds the user's read receipt (last_read_seq) and a materialized
+    unread counter, updated incrementally as messages are sent, so a
+    user's inbox is a single indexed range scan.
+    """
+
+    user = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="inbox_entries"
+    )
+
+    conversation = models.ForeignKey(
+        Conversation, on_delete=models.CASCADE, related_name="inbox_entries"
+    )
+
+    last_read_seq = models.PositiveBigIntegerField(default=0)
+    last_read_at = models.DateTimeField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+
+    # Last message seq included in unread_count (see inbox.apply_messages)
+    applied_seq = models.PositiveBigIntegerField(default=0)
+
+    # Copy of the conversation's latest activity, for sorting the inbox
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "conversation"], name="chats_inbox_user_conv_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-last_activity_at", "-conversation"],
+                name="chats_inbox_activity_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Inbox of {self.user_id} for {self.conversation_id}"
+
+
+# -----------------------------
+# Outbox Model
+# -----------------------------
+class OutboxEvent(models.Model):
+    """
+    A side effect to run after a write, committed in the same transaction
+    as the write itself (transactional outbox). Workers in chats.outbox
+    claim due events in batches, run their topic's handler and delete them.
+
+    available_at is when the event may next be claimed: claiming pushes
+    it one lease ahead, so a crashed worker's events come back on their
+    own, and a failure pushes it back by the retry delay.
+    """
+
+    topic = models.CharField(max_length=64)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+    available_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Set once the attempts run out; failed events are kept for inspection
+    failed_at = models.DateTimeField(null=True, blank=True)
+    claim_token = models.CharField(max_length=32, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["available_at", "id"],
+                name="chats_outbox_due_idx",
+                condition=models.Q(failed_at__isnull=True),
+            ),
+        ]
+
+    def __str__(self):
+        return f"Outbox event {self.pk} ({self.topic})"
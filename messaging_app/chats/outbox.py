@@ -0,0 +1,254 @@
+import datetime
+import logging
+import threading
+import traceback
+import uuid
+from collections import namedtuple
+
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from .conf import chats_setting
+from .models import OutboxEvent
+
+logger = logging.getLogger(__name__)
+
+DrainResult = namedtuple("DrainResult", ["processed", "retried", "failed"])
+
+
+# ------------------------------------
+# Handlers
+# ------------------------------------
+_handlers = {}
+
+
+def handler(topic):
+    """
+    Register a handler for a topic. It is called with the payloads of a
+    batch of events, inside the transaction that deletes them, so its
+    database writes happen exactly once. Anything that must only happen
+    after they commit (e.g. publishing) belongs in transaction.on_commit().
+    """
+
+    def register(func):
+        _handlers[topic] = func
+        return func
+
+    return register
+
+
+# ------------------------------------
+# Enqueueing
+# ------------------------------------
+def enqueue(topic, payload):
+    """
+    Add an event to the outbox. Call inside the transaction of the write
+    it belongs to; workers are woken once it commits.
+    """
+    OutboxEvent.objects.create(topic=topic, payload=payload)
+    transaction.on_commit(notify_workers)
+
+
+# ------------------------------------
+# Draining
+# ------------------------------------
+def retry_delay(attempts):
+    """
+    Exponential backoff: CHATS["OUTBOX_RETRY_DELAY"] doubled per attempt.
+    """
+    return min(chats_setting("OUTBOX_RETRY_DELAY") * 2 ** (attempts - 1), 3600)
+
+
+def claim(batch_size):
+    """
+    Claim up to batch_size due events for this worker. The UPDATE
+    re-checks that each event is still due, so two workers never claim
+    the same event; the claim lasts CHATS["OUTBOX_LEASE_SECONDS"].
+    """
+    now = timezone.now()
+    due = OutboxEvent.objects.filter(failed_at__isnull=True, available_at__lte=now)
+    ids = list(due.order_by("available_at", "id").values_list("id", flat=True)[:batch_size])
+    if not ids:
+        return []
+    token = uuid.uuid4().hex
+    lease = datetime.timedelta(seconds=chats_setting("OUTBOX_LEASE_SECONDS"))
+    due.filter(id__in=ids).update(available_at=now + lease, claim_token=token)
+    return list(OutboxEvent.objects.filter(id__in=ids, claim_token=token).order_by("id"))
+
+
+def process(events):
+    """
+    Run the handlers of events and delete them, in one transaction.
+    Events whose lease ran out and that another worker claimed since are
+    left to that worker.
+    """
+    with transaction.atomic():
+        owned = set(
+            OutboxEvent.objects.select_for_update()
+            .filter(pk__in=[event.pk for event in events], claim_token=events[0].claim_token)
+            .values_list("pk", flat=True)
+        )
+        by_topic = {}
+        for event in events:
+            if event.pk in owned:
+                by_topic.setdefault(event.topic, []).append(event)
+        for topic, group in by_topic.items():
+            try:
+                func = _handlers[topic]
+            except KeyError:
+                raise LookupError(f"No outbox handler for topic {topic!r}.")
+            func([event.payload for event in group])
+        OutboxEvent.objects.filter(pk__in=owned).delete()
+
+
+def release(event, error):
+    """
+    Put a failed event back for a later retry, or mark it failed once
+    CHATS["OUTBOX_MAX_ATTEMPTS"] is reached.
+    """
+    attempts = event.attempts + 1
+    now = timezone.now()
+    changes = {"attempts": attempts, "last_error": error, "claim_token": ""}
+    if attempts >= chats_setting("OUTBOX_MAX_ATTEMPTS"):
+        changes["failed_at"] = now
+    else:
+        changes["available_at"] = now + datetime.timedelta(seconds=retry_delay(attempts))
+    OutboxEvent.objects.filter(pk=event.pk, claim_token=event.claim_token).update(**changes)
+    return "failed_at" in changes
+
+
+def drain_once(batch_size=None):
+    """
+    Claim and process one batch. A failing batch is retried event by
+    event, so one bad event does not hold back the others.
+    Returns a DrainResult of event counts.
+    """
+    events = claim(batch_size or chats_setting("OUTBOX_BATCH_SIZE"))
+    if not events:
+        return DrainResult(0, 0, 0)
+    try:
+        process(events)
+        return DrainResult(len(events), 0, 0)
+    except Exception:
+        if len(events) == 1:
+            failed = release(events[0], traceback.format_exc())
+            return DrainResult(0, int(not failed), int(failed))
+
+    processed = retried = failed = 0
+    for event in events:
+        try:
+            process([event])
+            processed += 1
+        except Exception:
+            if release(event, traceback.format_exc()):
+                failed += 1
+            else:
+                retried += 1
+    return DrainResult(processed, retried, failed)
+
+
+def drain(batch_size=None):
+    """
+    Process due events until none are left. Returns a DrainResult.
+    """
+    totals = DrainResult(0, 0, 0)
+    while True:
+        result = drain_once(batch_size)
+        if not any(result):
+            return totals
+        totals = DrainResult(*(a + b for a, b in zip(totals, result)))
+
+
+# ------------------------------------
+# Worker pool
+# ------------------------------------
+class OutboxWorkerPool:
+    """
+    Threads that drain the outbox in batches. They wake when an event is
+    committed in this process (notify()) and otherwise poll every
+    CHATS["OUTBOX_POLL_INTERVAL"] seconds, which picks up events from other
+    processes, retries and events left behind by a crash.
+    """
+
+    def __init__(self, workers=None, batch_size=None, poll_interval=None):
+        self.workers = workers if workers is not None else chats_setting("OUTBOX_WORKERS")
+        self.batch_size = batch_size or chats_setting("OUTBOX_BATCH_SIZE")
+        self.poll_interval = poll_interval or chats_setting("OUTBOX_POLL_INTERVAL")
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._threads:
+                return
+            self._stopping.clear()
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"chats-outbox-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self):
+        with self._lock:
+            threads, self._threads = self._threads, []
+        self._stopping.set()
+        self._wakeup.set()
+        for thread in threads:
+            thread.join()
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        try:
+            while not self._stopping.is_set():
+                try:
+                    result = drain_once(self.batch_size)
+                except Exception:
+                    # Database unavailable, locked, ...: back off until the next poll.
+                    logger.exception("Outbox worker failed to drain a batch.")
+                    result = DrainResult(0, 0, 0)
+                finally:
+                    # As at the end of a request: drop broken or expired connections.
+                    close_old_connections()
+                if not any(result):
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+        finally:
+            connection.close()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_outbox_pool():
+    """
+    Return the process-wide worker pool, started on first use.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = OutboxWorkerPool()
+                _pool.start()
+    return _pool
+
+
+def reset_outbox_pool():
+    """
+    Stop and forget the current pool (tests, settings changes).
+    """
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.stop()
+
+
+def notify_workers():
+    if chats_setting("OUTBOX_WORKERS"):
+        get_outbox_pool().notify()
@@ -0,0 +1,309 @@
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict, namedtuple
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+Cursor = namedtuple("Cursor", ["position", "reverse"])
+
+
+# ------------------------------------
+# Cursor encoding
+# ------------------------------------
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        # Keep full microsecond precision, the seek filter compares exactly.
+        return value.isoformat()
+    return str(value)
+
+
+def encode_cursor(position, reverse=False):
+    """
+    Encode an ordering position into an opaque, URL-safe cursor string.
+    """
+    payload = {"p": [_encode_value(value) for value in position]}
+    if reverse:
+        payload["r"] = 1
+    data = json.dumps(payload, separators=(",", ":")).encode("ascii")
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(encoded):
+    """
+    Decode a cursor produced by encode_cursor().
+    Raises ValueError on anything that is not a well-formed cursor.
+    """
+    try:
+        padded = encoded + "=" * (-len(encoded) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        position = payload["p"]
+        reverse = bool(payload.get("r", 0))
+    except (TypeError, KeyError, UnicodeError, binascii.Error, json.JSONDecodeError) as exc:
+        raise ValueError("Malformed cursor") from exc
+    # encode_cursor() writes every value as a string.
+    if not isinstance(position, list) or not all(isinstance(value, str) for value in position):
+        raise ValueError("Malformed cursor")
+    return Cursor(position=position, reverse=reverse)
+
+
+def seek_filter(ordering, position):
+    """
+    Build the row-value comparison "rows after position in ordering" as a
+    Q object expanded lexicographically, e.g. for ("-a", "-b"):
+    (a < x) OR (a = x AND b < y)
+    """
+    condition = Q()
+    equal = Q()
+    for field, value in zip(ordering, position):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        condition |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return condition
+
+
+# ------------------------------------
+# Keyset Pagination
+# ------------------------------------
+class KeysetPagination(BasePagination):
+    """
+    Seek pagination over a fixed, unique ordering.
+
+    Instead of OFFSET, each page is fetched with a
+    "(a, b) < (last_a, last_b)" predicate on the ordering columns,
+    so every page costs the same as the first one.
+    The last ordering field must be unique (usually the primary key).
+
+    If the view has get_archive_queryset(), pages continue into that
+    queryset once the main one runs out. Every archived row must sort
+    after every live row (older data), so the archive is only queried by
+    pages that reach past the oldest live row.
+    """
+
+    ordering = ()
+    page_size = 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        get_archive_queryset = getattr(view, "get_archive_queryset", None)
+        archive = get_archive_queryset() if get_archive_queryset else None
+        sources, ordering, position, limit = self.start(queryset, request, archive)
+        results = []
+        for source in sources:
+            results += self.fetch(source, ordering, position, limit - len(results))
+            if len(results) >= limit:
+                break
+        return self.finish(results)
+
+    async def apaginate_queryset(self, queryset, request, archive=None):
+        """
+        paginate_queryset() for async views, using async iteration.
+        """
+        sources, ordering, position, limit = self.start(queryset, request, archive)
+        results = []
+        for source in sources:
+            results += await self.afetch(source, ordering, position, limit - len(results))
+            if len(results) >= limit:
+                break
+        return self.finish(results)
+
+    def start(self, queryset, request, archive=None):
+        """
+        Read the request and return (sources, ordering, position, limit):
+        the querysets to read in turn and what to read from them.
+        """
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+
+        cursor = self.decode_cursor(request)
+        self.cursor = cursor
+        self.reverse = bool(cursor and cursor.reverse)
+
+        if archive is None:
+            sources = (queryset,)
+        elif self.reverse:
+            # Previous-page links walk forwards in time: archived rows first.
+            sources = (archive, queryset)
+        else:
+            sources = (queryset, archive)
+
+        # Fetch one extra row to learn whether there is another page.
+        ordering = self.get_ordering(reverse=self.reverse)
+        position = cursor.position if cursor is not None else None
+        return sources, ordering, position, self.page_size + 1
+
+    def finish(self, results):
+        has_more = len(results) > self.page_size
+        results = results[: self.page_size]
+
+        if self.reverse:
+            results.reverse()
+            self.has_previous = has_more
+            self.has_next = self.cursor is not None
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data):
+        return Response(
+            OrderedDict(
+                [
+                    ("next", self.get_next_link()),
+                    ("previous", self.get_previous_link()),
+                    ("results", data),
+                ]
+            )
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    # --------------------------------
+    # Ordering helpers
+    # --------------------------------
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return list(self.ordering)
+        return [
+            field[1:] if field.startswith("-") else "-" + field
+            for field in self.ordering
+        ]
+
+    def field_names(self):
+        return [field.lstrip("-") for field in self.ordering]
+
+    def seek_filter(self, ordering, position):
+        return seek_filter(ordering, position)
+
+    def seek(self, queryset, ordering, position, limit):
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.seek_filter(ordering, position))
+        return queryset[:limit]
+
+    def fetch(self, queryset, ordering, position, limit):
+        """
+        Up to limit rows of queryset after position in ordering.
+        """
+        return list(self.seek(queryset, ordering, position, limit))
+
+    async def afetch(self, queryset, ordering, position, limit):
+        return [row async for row in self.seek(queryset, ordering, position, limit)]
+
+    def get_position(self, item):
+        if isinstance(item, dict):
+            # .values() rows from the fast read path
+            return [item[name] for name in self.field_names()]
+        return [getattr(item, name) for name in self.field_names()]
+
+    # --------------------------------
+    # Cursor handling
+    # --------------------------------
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                size = int(request.query_params[self.page_size_query_param])
+            except (KeyError, ValueError):
+                return self.page_size
+            if size > 0:
+                return min(size, self.max_page_size)
+        return self.page_size
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+
+        names = self.field_names()
+        try:
+            cursor = decode_cursor(encoded)
+            if len(cursor.position) != len(names):
+                raise ValueError("Cursor does not match ordering")
+            position = [
+                self.model._meta.get_field(name).to_python(value)
+                for name, value in zip(names, cursor.position)
+            ]
+        except (TypeError, ValueError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return Cursor(position=position, reverse=cursor.reverse)
+
+    def build_link(self, position, reverse=False):
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            encode_cursor(position, reverse=reverse),
+        )
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if self.page:
+            position = self.get_position(self.page[-1])
+        else:
+            position = self.cursor.position
+        return self.build_link(position)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if self.page:
+            position = self.get_position(self.page[0])
+        else:
+            position = self.cursor.position
+        return self.build_link(position, reverse=True)
+
+
+class MessageCursorPagination(KeysetPagination):
+    """
+    Newest messages first, ties broken by message_id.
+    """
+
+    ordering = ("-sent_at", "-message_id")
+
+
+class ConversationMessageCursorPagination(KeysetPagination):
+    """
+    Messages of a single conversation, newest first by sequence number.
+    """
+
+    ordering = ("-seq",)
+
+
+class ConversationCursorPagination(KeysetPagination):
+    """
+    Newest conversations first, ties broken by conversation_id.
+    """
+
+    ordering = ("-created_at", "-conversation_id")
+
+
+class InboxCursorPagination(KeysetPagination):
+    """
+    A user's inbox, most recently active conversations first.
+    """
+
+    ordering = ("-last_activity_at", "-conversation_id")
@@ -0,0 +1,40 @@
+import json
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser
+
+
+class InvalidLine:
+    """
+    Placeholder for an NDJSON line that could not be decoded, so the
+    rest of the stream is still processed and the error is reported per item.
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+# ------------------------------------
+# NDJSON Parser
+# ------------------------------------
+class NDJSONParser(BaseParser):
+    """
+    Parses newline-delimited JSON into a list, one item per non-empty line.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+
+        items = []
+        for number, raw in enumerate(stream, start=1):
+            line = raw.decode(encoding).strip()
+            if not line:
+                continue
+            try:
+                items.append(json.loads(line))
+            except ValueError as exc:
+                items.append(InvalidLine(f"Line {number}: invalid JSON ({exc})."))
+        return items
@@ -0,0 +1,114 @@
+from functools import lru_cache
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework import serializers
+
+from .models import ArchivedMessage, Message
+
+
+# ------------------------------------
+# Serializer-driven query planning
+# ------------------------------------
+@lru_cache(maxsize=None)
+def build_plan(model, serializer_class):
+    """
+    Walk a serializer class and work out which relations it touches.
+
+    Returns (select_related, prefetches) where select_related is a tuple of
+    lookups and prefetches is a tuple of (lookup, related_model, child_plan).
+    Only plain descriptions are cached; Prefetch objects are built per call.
+    """
+    select_related = []
+    prefetches = []
+    _collect(model, serializer_class(), "", select_related, prefetches)
+    return tuple(select_related), tuple(prefetches)
+
+
+def _collect(model, serializer, prefix, select_related, prefetches):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == "*" or "." in field.source:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue
+        if not model_field.is_relation:
+            continue
+
+        lookup = prefix + field.source
+        related_model = model_field.related_model
+
+        if model_field.many_to_many or model_field.one_to_many:
+            child = getattr(field, "child", None) or getattr(field, "child_relation", None)
+            if isinstance(child, serializers.ModelSerializer):
+                child_plan = build_plan(related_model, type(child))
+            else:
+                child_plan = ((), ())
+            prefetches.append((lookup, related_model, child_plan))
+        elif isinstance(field, serializers.ModelSerializer):
+            # Forward FK / one-to-one rendered as a nested object: join it and
+            # keep walking the nested serializer under the joined prefix.
+            select_related.append(lookup)
+            _collect(related_model, field, lookup + "__", select_related, prefetches)
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            # Served from the local "<name>_id" column, no query needed.
+            continue
+        elif isinstance(field, serializers.RelatedField):
+            select_related.append(lookup)
+
+
+# Nested lists come in the same order as from chats.fast_serializers, so
+# payloads (and their ETags) do not change with CHATS["FAST_SERIALIZERS"].
+NESTED_ORDERING = {Message: ("seq",), ArchivedMessage: ("seq",)}
+
+
+def apply_plan(queryset, plan):
+    select_related, prefetches = plan
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    lookups = [
+        Prefetch(
+            lookup,
+            queryset=apply_plan(
+                related_model._default_manager.order_by(
+                    *NESTED_ORDERING.get(related_model, ("pk",))
+                ),
+                child_plan,
+            ),
+        )
+        for lookup, related_model, child_plan in prefetches
+    ]
+    if lookups:
+        queryset = queryset.prefetch_related(*lookups)
+    return queryset
+
+
+def plan_queryset(queryset, serializer_class):
+    """
+    Return queryset with the select_related/prefetch_related calls that
+    serializer_class needs, so rendering a page costs a fixed number of
+    queries instead of one per nested object.
+    """
+    return apply_plan(queryset, build_plan(queryset.model, serializer_class))
+
+
+class PlannedQuerysetMixin:
+    """
+    ViewSet mixin that plans get_queryset() from the serializer class.
+    """
+
+    def get_queryset(self):
+        return plan_queryset(super().get_queryset(), self.get_serializer_class())
+
+
+def recent_messages_prefetch(size, to_attr="recent_messages", archived=False):
+    """
+    Prefetch the latest size + 1 messages of every conversation in one
+    query (the slice is applied per conversation with a ROW_NUMBER()
+    window). The extra row only tells whether older messages exist.
+    With archived, the same is done for the archive table instead.
+    """
+    model, lookup = (ArchivedMessage, "archived_messages") if archived else (Message, "messages")
+    queryset = model.objects.select_related("sender").order_by("-seq")[: size + 1]
+    return Prefetch(lookup, queryset=queryset, to_attr=to_attr)
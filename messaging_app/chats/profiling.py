@@ -0,0 +1,375 @@
+import bisect
+import logging
+import random
+import threading
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+
+from .caching import get_response_cache
+from .conf import chats_setting
+
+logger = logging.getLogger(__name__)
+
+
+# ------------------------------------
+# Per-request profile
+# ------------------------------------
+# The profile of the request being handled, if it was sampled. It is a
+# ContextVar so queries run by async views (in sync_to_async threads,
+# which copy the context) are recorded against the right request.
+_current = ContextVar("chats_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Queries and timings of one sampled request.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.render_started = None
+        self.render_finished = None
+
+    def record_query(self, sql, seconds):
+        self.queries.append((sql, seconds))
+
+    def rendered(self, response):
+        self.render_finished = time.perf_counter()
+        return response
+
+    def summary(self, response):
+        """
+        Timings (ms), query count, payload size and the flagged queries.
+        """
+        finished = time.perf_counter()
+        total = finished - self.started
+        db = sum(seconds for _, seconds in self.queries)
+        render = 0.0
+        if self.render_started is not None and self.render_finished is not None:
+            render = self.render_finished - self.render_started
+
+        slow_ms = chats_setting("PROFILING_SLOW_QUERY_MS")
+        slow = [
+            {"sql": sql, "ms": round(seconds * 1000, 2)}
+            for sql, seconds in self.queries
+            if seconds * 1000 >= slow_ms
+        ]
+        # The same statement (params aside) run again and again in one
+        # request is the signature of a per-row lookup.
+        threshold = chats_setting("PROFILING_N_PLUS_ONE_THRESHOLD")
+        repeated = [
+            {"sql": sql, "count": count}
+            for sql, count in Counter(sql for sql, _ in self.queries).items()
+            if count >= threshold
+        ]
+        return {
+            "total_ms": total * 1000,
+            "db_ms": db * 1000,
+            # View and serializer code: everything but queries and rendering
+            "app_ms": max(total - db - render, 0.0) * 1000,
+            "render_ms": render * 1000,
+            "queries": len(self.queries),
+            "payload_bytes": payload_size(response),
+            "slow_queries": slow,
+            "n_plus_one": repeated,
+        }
+
+
+def payload_size(response):
+    if response.streaming:
+        return None
+    return len(response.content)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper timing every query of a sampled request.
+    """
+    profile = _current.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    began = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.record_query(sql, time.perf_counter() - began)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    connection_created handler: add record_query to the connection.
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+# ------------------------------------
+# Aggregated metrics
+# ------------------------------------
+DURATION_BUCKETS_MS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+PAYLOAD_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram: counts per upper bound, plus count and sum.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q):
+        """
+        Upper bound of the bucket holding the q-th quantile (None: overflow).
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def snapshot(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        buckets["+Inf"] = self.count
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 3),
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": buckets,
+        }
+
+
+class EndpointMetrics:
+    """
+    Request counters and histograms of one endpoint.
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.sampled = 0
+        self.n_plus_one = 0
+        self.slow_queries = 0
+        self.histograms = {
+            "total_ms": Histogram(DURATION_BUCKETS_MS),
+            "db_ms": Histogram(DURATION_BUCKETS_MS),
+            "app_ms": Histogram(DURATION_BUCKETS_MS),
+            "render_ms": Histogram(DURATION_BUCKETS_MS),
+            "queries": Histogram(QUERY_COUNT_BUCKETS),
+            "payload_bytes": Histogram(PAYLOAD_BUCKETS),
+        }
+
+    def snapshot(self):
+        return {
+            "requests": self.requests,
+            "sampled": self.sampled,
+            "n_plus_one": self.n_plus_one,
+            "slow_queries": self.slow_queries,
+            **{name: histogram.snapshot() for name, histogram in self.histograms.items()},
+        }
+
+
+class Metrics:
+    """
+    Process-wide aggregate of the sampled request profiles, per endpoint
+    ("<method> <url name>"), with the most recent flagged queries.
+    """
+
+    recent_size = 20
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+        self.recent_slow_queries = deque(maxlen=self.recent_size)
+        self.recent_n_plus_one = deque(maxlen=self.recent_size)
+
+    def _endpoint(self, endpoint):
+        try:
+            return self.endpoints[endpoint]
+        except KeyError:
+            return self.endpoints.setdefault(endpoint, EndpointMetrics())
+
+    def count(self, endpoint):
+        with self._lock:
+            self._endpoint(endpoint).requests += 1
+
+    def record(self, endpoint, summary):
+        with self._lock:
+            metrics = self._endpoint(endpoint)
+            metrics.requests += 1
+            metrics.sampled += 1
+            for name, histogram in metrics.histograms.items():
+                if summary[name] is not None:
+                    histogram.observe(summary[name])
+            if summary["n_plus_one"]:
+                metrics.n_plus_one += 1
+            metrics.slow_queries += len(summary["slow_queries"])
+            for query in summary["slow_queries"]:
+                self.recent_slow_queries.append({"endpoint": endpoint, **query})
+            for query in summary["n_plus_one"]:
+                self.recent_n_plus_one.append({"endpoint": endpoint, **query})
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "endpoints": {
+                    endpoint: metrics.snapshot()
+                    for endpoint, metrics in sorted(self.endpoints.items())
+                },
+                "recent_slow_queries": list(self.recent_slow_queries),
+                "recent_n_plus_one": list(self.recent_n_plus_one),
+            }
+
+
+_metrics = Metrics()
+
+
+def get_metrics():
+    return _metrics
+
+
+def reset_metrics():
+    global _metrics
+    _metrics = Metrics()
+
+
+# ------------------------------------
+# Middleware
+# ------------------------------------
+def endpoint_name(request):
+    match = getattr(request, "resolver_match", None)
+    name = match.view_name if match is not None else "unresolved"
+    return f"{request.method} {name}"
+
+
+def server_timing(summary):
+    entries = [
+        f'db;dur={summary["db_ms"]:.2f};desc="{summary["queries"]} queries"',
+        f'app;dur={summary["app_ms"]:.2f}',
+        f'render;dur={summary["render_ms"]:.2f}',
+        f'total;dur={summary["total_ms"]:.2f}',
+    ]
+    if summary["slow_queries"]:
+        entries.append(f'slow-queries;desc="{len(summary["slow_queries"])}"')
+    if summary["n_plus_one"]:
+        entries.append(f'n-plus-one;desc="{len(summary["n_plus_one"])}"')
+    return ", ".join(entries)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a CHATS["PROFILING_SAMPLE_RATE"] fraction of requests:
+    query count, database, view/serializer and render time, and payload
+    size go to a Server-Timing header and the per-endpoint histograms
+    served by metrics(). Repeated statements (N+1) and slow queries are
+    counted and logged to the "chats.profiling" logger.
+
+    Unsampled requests only bump a counter. Place it first in MIDDLEWARE
+    so the timings cover the whole stack.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        profile = self.start(request)
+        if profile is None:
+            response = self.get_response(request)
+            get_metrics().count(endpoint_name(request))
+            return response
+        token = _current.set(profile)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = self.start(request)
+        if profile is None:
+            response = await self.get_response(request)
+            get_metrics().count(endpoint_name(request))
+            return response
+        token = _current.set(profile)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def start(self, request):
+        if random.random() >= chats_setting("PROFILING_SAMPLE_RATE"):
+            return None
+        request.chats_profile = RequestProfile()
+        return request.chats_profile
+
+    def process_template_response(self, request, response):
+        # DRF responses render after the view returns; time the rendering.
+        profile = getattr(request, "chats_profile", None)
+        if profile is not None:
+            profile.render_started = time.perf_counter()
+            response.add_post_render_callback(profile.rendered)
+        return response
+
+    def finish(self, request, response, profile):
+        endpoint = endpoint_name(request)
+        summary = profile.summary(response)
+        get_metrics().record(endpoint, summary)
+        for query in summary["slow_queries"]:
+            logger.warning("Slow query (%.1f ms) in %s: %s", query["ms"], endpoint, query["sql"])
+        for query in summary["n_plus_one"]:
+            logger.warning(
+                "Possible N+1 in %s: statement ran %d times: %s",
+                endpoint,
+                query["count"],
+                query["sql"],
+            )
+        response["Server-Timing"] = server_timing(summary)
+        return response
+
+
+# ------------------------------------
+# Metrics endpoint
+# ------------------------------------
+@require_GET
+def metrics(request):
+    """
+    Aggregated request profiles and cache statistics of this process.
+    """
+    return JsonResponse(
+        {
+            "sample_rate": chats_setting("PROFILING_SAMPLE_RATE"),
+            **get_metrics().snapshot(),
+            "caches": {"response": get_response_cache().stats()},
+        }
+    )
@@ -0,0 +1,163 @@
+import asyncio
+import threading
+from collections import defaultdict
+
+from django.utils.module_loading import import_string
+
+from .conf import chats_setting
+
+
+# ------------------------------------
+# Brokers
+# ------------------------------------
+class BaseBroker:
+    """
+    Transport between publishers and the hub.
+
+    A shared backend (Redis, Postgres LISTEN/NOTIFY, ...) publishes to its
+    server and calls `dispatch(channel, message)` for everything it receives,
+    so subscribers in every process get every message.
+    """
+
+    def start(self, dispatch):
+        self.dispatch = dispatch
+
+    def publish(self, channel, message):
+        raise NotImplementedError
+
+
+class LocalBroker(BaseBroker):
+    """
+    In-process broker: publishing dispatches straight to local subscribers.
+    Default backend, and the stand-in for a shared one in tests.
+    """
+
+    def publish(self, channel, message):
+        self.dispatch(channel, message)
+
+
+# ------------------------------------
+# Subscriptions
+# ------------------------------------
+class Subscription:
+    """
+    A bounded queue of messages for one consumer, bound to its event loop.
+
+    Publishers never wait on a slow consumer: when the queue is full the
+    oldest message is dropped and counted, and the consumer is told how
+    many it missed so it can catch up through the message list.
+    """
+
+    def __init__(self, hub, channel, maxsize):
+        self.hub = hub
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.dropped = 0
+
+    def deliver(self, message):
+        """
+        Called from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # Loop already closed, the consumer is gone.
+            self.hub.unsubscribe(self)
+
+    def _put(self, message):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout=None):
+        """
+        Wait for the next message. Returns (message, dropped_since_last_get);
+        message is None on timeout.
+        """
+        try:
+            message = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            message = None
+        dropped, self.dropped = self.dropped, 0
+        return message, dropped
+
+    def close(self):
+        self.hub.unsubscribe(self)
+
+
+# ------------------------------------
+# Hub
+# ------------------------------------
+class Hub:
+    """
+    Fans published messages out to the subscribers of a channel.
+    """
+
+    def __init__(self, broker, queue_size=100):
+        self.broker = broker
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+        broker.start(self.dispatch)
+
+    def subscribe(self, channel):
+        """
+        Subscribe the current event loop to channel.
+        """
+        subscription = Subscription(self, channel, self.queue_size)
+        with self._lock:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.channel]
+
+    def publish(self, channel, message):
+        self.broker.publish(channel, message)
+
+    def dispatch(self, channel, message):
+        with self._lock:
+            subscribers = list(self._subscribers.get(channel, ()))
+        for subscription in subscribers:
+            subscription.deliver(message)
+
+    def subscriber_count(self, channel):
+        with self._lock:
+            return len(self._subscribers.get(channel, ()))
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    """
+    Return the process-wide hub, built from CHATS["PUBSUB_BROKER"].
+    """
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                broker = import_string(chats_setting("PUBSUB_BROKER"))()
+                _hub = Hub(broker, queue_size=chats_setting("PUBSUB_QUEUE_SIZE"))
+    return _hub
+
+
+def reset_hub():
+    """
+    Forget the current hub (tests, settings changes).
+    """
+    global _hub
+    with _hub_lock:
+        _hub = None
+
+
+def conversation_channel(conversation_id):
+    return f"conversation:{conversation_id}"
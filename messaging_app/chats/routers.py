@@ -0,0 +1,124 @@
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .conf import chats_setting
+
+
+# ------------------------------------
+# Primary / replica routing
+# ------------------------------------
+# Reads may go to a replica only where replica_reads() allows it: the
+# middleware below enables it for safe (GET/HEAD/OPTIONS) requests from
+# clients that have not written recently. Everything else - writes,
+# unsafe requests, management commands, reads inside a transaction on
+# the primary - uses the primary.
+_replica_reads = ContextVar("chats_replica_reads", default=False)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Allow (or forbid) replica reads for chats models in this context.
+    """
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def read_replicas():
+    return chats_setting("READ_REPLICAS")
+
+
+class PrimaryReplicaRouter:
+    """
+    Sends chats reads to a random replica in CHATS["READ_REPLICAS"] when
+    replica_reads() allows it, and all writes to the primary.
+    """
+
+    app_label = "chats"
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or not _replica_reads.get():
+            return None
+        replicas = read_replicas()
+        if not replicas or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label == self.app_label:
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *read_replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in read_replicas():
+            return False
+        return None
+
+
+# ------------------------------------
+# Read-your-writes stickiness
+# ------------------------------------
+class ReadYourWritesMiddleware:
+    """
+    Enables replica reads for safe requests. After a successful write
+    request the client gets a cookie pinning its reads to the primary
+    for CHATS["REPLICA_PIN_SECONDS"], longer than the replicas lag, so
+    it always sees its own messages.
+    """
+
+    sync_capable = True
+    async_capable = True
+    safe_methods = ("GET", "HEAD", "OPTIONS")
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.use_replicas(request)):
+            response = self.get_response(request)
+        return self.process_response(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replicas(request)):
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def use_replicas(self, request):
+        if request.method not in self.safe_methods:
+            return False
+        try:
+            pinned_until = float(request.COOKIES.get(chats_setting("REPLICA_PIN_COOKIE"), 0))
+        except ValueError:
+            pinned_until = 0
+        return pinned_until < time.time()
+
+    def process_response(self, request, response):
+        if request.method not in self.safe_methods and response.status_code < 400:
+            seconds = chats_setting("REPLICA_PIN_SECONDS")
+            response.set_cookie(
+                chats_setting("REPLICA_PIN_COOKIE"),
+                str(time.time() + seconds),
+                max_age=seconds,
+                httponly=True,
+                samesite="Lax",
+            )
+        return response
@@ -0,0 +1,179 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.utils.module_loading import import_string
+
+from .conf import chats_setting
+from .models import Conversation, Message
+
+
+# ------------------------------------
+# Search backends
+# ------------------------------------
+class BaseSearchBackend:
+    """
+    Full-text search over Message.message_body.
+
+    search() returns message ids, best match first, restricted to
+    conversations the user participates in.
+    """
+
+    def search(self, user_id, query, limit, offset=0):
+        raise NotImplementedError
+
+    def rebuild(self):
+        """
+        Recreate the index from the messages table (no-op by default).
+        """
+
+
+class LikeSearchBackend(BaseSearchBackend):
+    """
+    Portable fallback: case-insensitive substring match, newest first.
+    Unindexed, only meant for databases without a dedicated backend.
+    """
+
+    def search(self, user_id, query, limit, offset=0):
+        queryset = (
+            Message.objects.filter(
+                conversation__participants=user_id, message_body__icontains=query
+            )
+            .order_by("-sent_at", "-message_id")
+            .values_list("message_id", flat=True)
+        )
+        return list(queryset[offset : offset + limit])
+
+
+FTS_TABLE = "chats_message_fts"
+
+
+def _fts_statements():
+    table = Message._meta.db_table
+    # Rows are keyed on message_id, stored (and tokenized) in the index
+    # itself: chats_message's implicit rowid can change on VACUUM or when a
+    # migration remakes the table, message_id cannot. Triggers find a row
+    # with a MATCH on that column, an index lookup.
+    row = f"{FTS_TABLE}.message_id MATCH '\"' || old.message_id || '\"'"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(message_id, message_body)",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(message_id, message_body) "
+        f"VALUES (new.message_id, new.message_body); "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+        f"DELETE FROM {FTS_TABLE} WHERE {row}; "
+        f"END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF message_body ON {table} BEGIN "
+        f"UPDATE {FTS_TABLE} SET message_body = new.message_body WHERE {row}; "
+        f"END",
+    ]
+
+
+def install_fts(connection, rebuild=True):
+    """
+    Create the FTS5 table and the triggers that keep it in sync (if
+    missing) and, with rebuild, re-index every message. Safe to re-run:
+    the post_migrate hook does so without rebuild, since a migration that
+    remakes chats_message drops its triggers (but keeps the message ids).
+    """
+    table = Message._meta.db_table
+    with connection.cursor() as cursor:
+        for statement in _fts_statements():
+            cursor.execute(statement)
+        if rebuild:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE}(message_id, message_body) "
+                f"SELECT message_id, message_body FROM {table}"
+            )
+
+
+def uninstall_fts(connection):
+    with connection.cursor() as cursor:
+        for suffix in ("ai", "ad", "au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def install_fts_triggers(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    post_migrate receiver: put back the index triggers on SQLite databases
+    once migrations are applied.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    if Message._meta.db_table in connection.introspection.table_names():
+        install_fts(connection, rebuild=False)
+
+
+def fts_query(text):
+    """
+    Turn free text into an FTS5 query on message_body: every word must
+    match, and FTS5 operators in user input are treated as plain text.
+    """
+    terms = text.split()
+    if not terms:
+        return ""
+    phrases = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+    return f"message_body : ({phrases})"
+
+
+class SQLiteFTS5Backend(BaseSearchBackend):
+    """
+    SQLite FTS5 index maintained by triggers on chats_message, so every
+    insert path (ORM, bulk_create, raw SQL) and delete is covered.
+    Results are ranked by bm25.
+    """
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def search(self, user_id, query, limit, offset=0):
+        match = fts_query(query)
+        if not match:
+            return []
+
+        connection = connections[self.using]
+        pk = Message._meta.pk
+        participants = Conversation.participants.through._meta.db_table
+        sql = (
+            f"SELECT m.message_id FROM {FTS_TABLE} f "
+            f"JOIN {Message._meta.db_table} m ON m.message_id = f.message_id "
+            f"WHERE {FTS_TABLE} MATCH %s AND m.conversation_id IN ("
+            f"SELECT conversation_id FROM {participants} WHERE user_id = %s) "
+            f"ORDER BY f.rank LIMIT %s OFFSET %s"
+        )
+        params = [
+            match,
+            pk.get_db_prep_value(user_id, connection),
+            limit,
+            offset,
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+        return [pk.to_python(row[0]) for row in rows]
+
+    def rebuild(self):
+        install_fts(connections[self.using])
+
+
+def get_search_backend():
+    """
+    Backend from CHATS["SEARCH_BACKEND"], or the best one for the
+    default database's vendor.
+    """
+    path = chats_setting("SEARCH_BACKEND")
+    if path:
+        return import_string(path)()
+    if connections[DEFAULT_DB_ALIAS].vendor == "sqlite":
+        return SQLiteFTS5Backend()
+    return LikeSearchBackend()
+
+
+def search_messages(user_id, query, limit, offset=0):
+    """
+    Ranked page of Message objects (senders joined) matching query.
+    """
+    ids = get_search_backend().search(user_id, query, limit, offset)
+    messages = Message.objects.select_related("sender").in_bulk(ids)
+    return [messages[message_id] for message_id in ids if message_id in messages]
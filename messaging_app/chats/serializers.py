@@ -1,5 +1,10 @@
+from urllib.parse import urlencode
+
 from rest_framework import serializers
+from rest_framework.reverse import reverse
+
 from .models import User, Conversation, Message
+from .pagination import ConversationMessageCursorPagination, encode_cursor
 
 
 # ------------------------------------
@@ -42,10 +47,12 @@ class MessageSerializer(serializers.ModelSerializer):
             "message_id",
             "sender",
             "conversation",
+            "seq",
             "message_body",
             "sent_at",
         ]
-        read_only_fields = ["message_id", "sent_at"]
+        # Messages stay in their conversation (its seq and counters depend on it).
+        read_only_fields = ["message_id", "conversation", "seq", "sent_at"]
 
 
 # ------------------------------------
@@ -62,12 +69,95 @@ class ConversationSerializer(serializers.ModelSerializer):
     # Nested messages within a conversation
     messages = MessageSerializer(many=True, read_only=True)
 
+    # Folded into "messages" (see chats.archive)
+    archived_messages = MessageSerializer(many=True, read_only=True)
+
     class Meta:
         model = Conversation
         fields = [
             "conversation_id",
             "participants",
             "messages",
+            "archived_messages",
+            "created_at",
+            "updated_at",
+            "last_message_at",
+            "last_message_id",
+            "message_count",
+        ]
+        read_only_fields = [
+            "conversation_id",
             "created_at",
+            "updated_at",
+            "last_message_at",
+            "last_message_id",
+            "message_count",
         ]
-        read_only_fields = ["conversation_id", "created_at"]
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        archived = data.pop("archived_messages", None)
+        if archived:
+            # Archived history is older than anything still in Message.
+            data["messages"] = archived + data["messages"]
+        return data
+
+
+# ------------------------------------
+# Conversation Serializer (latest N messages)
+# ------------------------------------
+class ConversationWindowSerializer(ConversationSerializer):
+    """
+    Conversation with only its latest messages embedded, newest first.
+    The window size comes from context["message_window"]; the view prefetches
+    the window for the whole page (see prefetch.recent_messages_prefetch).
+    messages_cursor points into the paginated message list for older ones.
+    """
+
+    messages = serializers.SerializerMethodField()
+    messages_cursor = serializers.SerializerMethodField()
+
+    class Meta(ConversationSerializer.Meta):
+        fields = [
+            name for name in ConversationSerializer.Meta.fields
+            if name != "archived_messages"
+        ] + ["messages_cursor"]
+
+    @staticmethod
+    def latest(messages, count):
+        return list(messages.select_related("sender").order_by("-seq")[:count])
+
+    def get_window(self, conversation):
+        """
+        Latest messages, falling through to the archive when the live
+        ones do not fill the window (see prefetch.recent_messages_prefetch).
+        """
+        size = self.context["message_window"]
+        recent = getattr(conversation, "recent_messages", None)
+        archived = getattr(conversation, "recent_archived_messages", None)
+        if recent is None:
+            recent = self.latest(conversation.messages, size + 1)
+            if archived is None and len(recent) <= size:
+                archived = self.latest(conversation.archived_messages, size + 1 - len(recent))
+        if archived:
+            recent = (recent + archived)[: size + 1]
+        return recent[:size], len(recent) > size
+
+    def get_messages(self, conversation):
+        window, _ = self.get_window(conversation)
+        return MessageSerializer(window, many=True, context=self.context).data
+
+    def get_messages_cursor(self, conversation):
+        window, has_more = self.get_window(conversation)
+        if not has_more:
+            return {"has_more": False, "next": None}
+
+        position = ConversationMessageCursorPagination().get_position(window[-1])
+        url = reverse("message-list", request=self.context.get("request"))
+        query = urlencode(
+            {
+                "conversation": str(conversation.conversation_id),
+                "cursor": encode_cursor(position),
+            }
+        )
+        return {"has_more": True, "next": f"{url}?{query}"}
@@ -0,0 +1,390 @@
+import json
+import uuid
+from collections import Counter, namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from . import inbox, outbox
+from .caching import invalidate_conversation
+from .conf import chats_setting
+from .membership import invalidate_participants
+from .models import ArchivedMessage, Conversation, Message, User, participant_fingerprint
+from .pubsub import conversation_channel, get_hub
+from .serializers import MessageSerializer
+
+
+BulkResult = namedtuple("BulkResult", ["created", "errors"])
+ParticipantDelta = namedtuple("ParticipantDelta", ["added", "removed", "unchanged", "unknown"])
+
+
+# ------------------------------------
+# Conversations and participants
+# ------------------------------------
+def create_conversation(user_ids):
+    """
+    Create a conversation with the given participants (existing user ids).
+    """
+    with transaction.atomic():
+        conversation = Conversation.objects.create(
+            participant_fingerprint=participant_fingerprint(user_ids)
+        )
+        insert_participants(conversation, user_ids)
+        invalidate_participants(conversation.pk)
+    return conversation
+
+
+def find_conversation(user_ids):
+    """
+    The oldest conversation whose participants are exactly user_ids, or
+    None. One probe of the participant fingerprint index.
+    """
+    return (
+        Conversation.objects.filter(participant_fingerprint=participant_fingerprint(user_ids))
+        .order_by("created_at")
+        .first()
+    )
+
+
+def get_or_create_conversation(user_ids):
+    """
+    Return (conversation, created): the existing conversation with exactly
+    these participants (e.g. a DM), or a new one.
+
+    Concurrent calls for the same participants are serialized by locking
+    their user rows (in primary key order, so overlapping sets cannot
+    deadlock) and probing again under the lock; only the first creates.
+    On SQLite, which has no row locks, the write lock taken when the
+    transaction begins (settings.SQLITE_TUNED) serializes them instead.
+    """
+    conversation = find_conversation(user_ids)
+    if conversation is not None:
+        return conversation, False
+    with transaction.atomic():
+        list(
+            User.objects.select_for_update()
+            .filter(pk__in=user_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        conversation = find_conversation(user_ids)
+        if conversation is not None:
+            return conversation, False
+        return create_conversation(user_ids), True
+
+
+def lock_conversation(conversation_id):
+    """
+    Serialize membership changes of a conversation (row lock until commit).
+    """
+    list(Conversation.objects.select_for_update().filter(pk=conversation_id).values_list("pk"))
+
+
+def insert_participants(conversation, user_ids, chunk_size=None):
+    """
+    Bulk-insert participant rows and their inbox entries, chunk_size rows
+    per INSERT. Existing memberships are left alone.
+    """
+    chunk_size = chunk_size or chats_setting("PARTICIPANTS_CHUNK_SIZE")
+    Through = Conversation.participants.through
+    Through.objects.bulk_create(
+        [Through(conversation_id=conversation.pk, user_id=user_id) for user_id in user_ids],
+        batch_size=chunk_size,
+        ignore_conflicts=True,
+    )
+    inbox.add_entries(conversation, user_ids, batch_size=chunk_size)
+
+
+def diff_participants(conversation_id, user_ids):
+    """
+    Split user_ids into (members, non_members, unknown) with one query.
+    """
+    rows = dict(
+        User.objects.filter(user_id__in=user_ids)
+        .annotate(
+            member=Exists(
+                Conversation.participants.through.objects.filter(
+                    conversation_id=conversation_id, user_id=OuterRef("pk")
+                )
+            )
+        )
+        .values_list("user_id", "member")
+    )
+    members = [user_id for user_id in user_ids if rows.get(user_id) is True]
+    non_members = [user_id for user_id in user_ids if rows.get(user_id) is False]
+    unknown = [user_id for user_id in user_ids if user_id not in rows]
+    return members, non_members, unknown
+
+
+def participants_changed(conversation_id):
+    """
+    Record a membership change: refingerprint the participant set, bump
+    updated_at for delta sync, drop the membership and response caches.
+    Runs under lock_conversation(), so concurrent changes cannot each
+    fingerprint a stale participant set.
+    """
+    user_ids = Conversation.participants.through.objects.filter(
+        conversation_id=conversation_id
+    ).values_list("user_id", flat=True)
+    Conversation.objects.filter(pk=conversation_id).update(
+        participant_fingerprint=participant_fingerprint(user_ids),
+        updated_at=timezone.now(),
+    )
+    invalidate_participants(conversation_id)
+    invalidate_conversation(conversation_id)
+
+
+def add_participants(conversation, user_ids):
+    """
+    Add users to a conversation. Users already in it are skipped and
+    unknown ids reported. Returns a ParticipantDelta.
+    """
+    with transaction.atomic():
+        lock_conversation(conversation.pk)
+        members, added, unknown = diff_participants(conversation.pk, user_ids)
+        if added:
+            # New entries start read up to the latest message, as of the lock.
+            conversation.refresh_from_db(fields=["last_seq", "last_message_at"])
+            insert_participants(conversation, added)
+            participants_changed(conversation.pk)
+    return ParticipantDelta(added=added, removed=[], unchanged=members, unknown=unknown)
+
+
+def remove_participants(conversation, user_ids):
+    """
+    Remove users from a conversation, with their inbox entries. Ids that
+    are not participants are reported as unchanged and unknown ids as
+    unknown. Returns a ParticipantDelta.
+    """
+    with transaction.atomic():
+        lock_conversation(conversation.pk)
+        removed, non_members, unknown = diff_participants(conversation.pk, user_ids)
+        if removed:
+            Conversation.participants.through.objects.filter(
+                conversation_id=conversation.pk, user_id__in=removed
+            ).delete()
+            inbox.remove_entries(conversation.pk, removed)
+            participants_changed(conversation.pk)
+    return ParticipantDelta(added=[], removed=removed, unchanged=non_members, unknown=unknown)
+
+
+# ------------------------------------
+# Message sending
+# ------------------------------------
+def record_last_message(conversation_id, message, count=1):
+    """
+    Bump the conversation's denormalized activity columns for message.
+    Must run in the transaction that inserted the message(s).
+    The latest-message columns only move forward, so concurrent senders
+    committing out of order cannot roll them back.
+    """
+    is_newer = Q(last_message_at__isnull=True) | Q(last_message_at__lte=message.sent_at)
+    Conversation.objects.filter(pk=conversation_id).update(
+        updated_at=timezone.now(),
+        message_count=F("message_count") + count,
+        last_message_at=Case(
+            When(is_newer, then=Value(message.sent_at)),
+            default=F("last_message_at"),
+            output_field=models.DateTimeField(),
+        ),
+        last_message_id=Case(
+            When(is_newer, then=Value(message.message_id)),
+            default=F("last_message_id"),
+            output_field=models.UUIDField(),
+        ),
+    )
+
+
+def publish_messages(messages):
+    """
+    Push messages to real-time subscribers once the transaction commits.
+    """
+    def publish():
+        hub = get_hub()
+        for data in MessageSerializer(messages, many=True).data:
+            hub.publish(
+                conversation_channel(data["conversation"]),
+                json.dumps(data, cls=DjangoJSONEncoder),
+            )
+
+    transaction.on_commit(publish)
+
+
+def send_message(sender, conversation_id, message_body):
+    """
+    Create a message and update the conversation's activity columns atomically.
+    Membership is checked by the caller (see membership.is_participant).
+    With CHATS["OUTBOX"], inbox updates and publishing are left to the
+    outbox workers (see messages_sent).
+    """
+    with transaction.atomic():
+        message = Message.objects.create(
+            sender=sender,
+            conversation_id=conversation_id,
+            message_body=message_body,
+        )
+        record_last_message(conversation_id, message)
+        invalidate_conversation(conversation_id)
+        if chats_setting("OUTBOX"):
+            outbox.enqueue(MESSAGES_SENT, {"message_ids": [str(message.pk)]})
+        else:
+            inbox.record_messages(conversation_id, [message])
+            publish_messages([message])
+    return message
+
+
+def delete_message(message):
+    """
+    Delete a message and keep its conversation's activity columns and
+    unread counts in step: message_count drops by one and, if it was the
+    latest message, the latest-message columns move to the one before it.
+    """
+    conversation_id, message_id = message.conversation_id, message.pk
+    with transaction.atomic():
+        lock_conversation(conversation_id)
+        message.delete()
+        changes = {"message_count": Greatest(F("message_count") - 1, 0)}
+        if Conversation.objects.filter(pk=conversation_id, last_message_id=message_id).exists():
+            latest = None
+            for model in (Message, ArchivedMessage):
+                latest = (
+                    model.objects.filter(conversation_id=conversation_id)
+                    .order_by("-seq")
+                    .values_list("sent_at", "message_id")
+                    .first()
+                )
+                if latest is not None:
+                    break
+            changes["last_message_at"], changes["last_message_id"] = latest or (None, None)
+        Conversation.objects.filter(pk=conversation_id).update(**changes)
+        inbox.remove_message(message)
+        invalidate_conversation(conversation_id)
+
+
+MESSAGES_SENT = "message.sent"
+
+
+@outbox.handler(MESSAGES_SENT)
+def messages_sent(payloads):
+    """
+    Outbox handler for sent messages: bring the inbox entries up to date
+    (see inbox.apply_messages) and publish the messages of a batch of sends.
+    """
+    message_ids = [message_id for payload in payloads for message_id in payload["message_ids"]]
+    messages = Message.objects.select_related("sender").filter(pk__in=message_ids).order_by("seq")
+    by_conversation = {}
+    for message in messages:
+        by_conversation.setdefault(message.conversation_id, []).append(message)
+    # Sorted, so concurrent workers take the conversation locks in one order.
+    for conversation_id in sorted(by_conversation):
+        inbox.apply_messages(conversation_id)
+    publish_messages([message for group in by_conversation.values() for message in group])
+
+
+def _parse_bulk_item(item):
+    """
+    Validate one bulk item. Returns ((sender_id, conversation_id, body), None)
+    or (None, error message).
+    """
+    if not isinstance(item, dict):
+        return None, getattr(item, "error", "Each item must be a JSON object.")
+
+    sender_id = item.get("sender_id")
+    conversation_id = item.get("conversation_id")
+    message_body = item.get("message_body")
+    if not sender_id or not conversation_id or not message_body:
+        return None, "sender_id, conversation_id, and message_body are required."
+    if not isinstance(message_body, str):
+        return None, "message_body must be a string."
+    try:
+        return (uuid.UUID(str(sender_id)), uuid.UUID(str(conversation_id)), message_body), None
+    except ValueError:
+        return None, "sender_id and conversation_id must be valid UUIDs."
+
+
+def send_messages_bulk(items, chunk_size=None):
+    """
+    Insert many messages at once.
+
+    Every sender/conversation pair is checked against the participants
+    table with a single query, valid messages are inserted with
+    bulk_create() in chunks inside one transaction, and each
+    conversation's activity columns are bumped once.
+    Invalid items are skipped and reported instead of failing the batch.
+
+    Returns BulkResult(created=[(index, message)], errors=[(index, error)]).
+    """
+    chunk_size = chunk_size or chats_setting("BULK_CHUNK_SIZE")
+    errors = []
+    parsed = []
+    for index, item in enumerate(items):
+        values, error = _parse_bulk_item(item)
+        if error:
+            errors.append((index, error))
+        else:
+            parsed.append((index, values))
+
+    sender_ids = {sender_id for _, (sender_id, _, _) in parsed}
+    conversation_ids = {conversation_id for _, (_, conversation_id, _) in parsed}
+    allowed = set()
+    if parsed:
+        allowed = set(
+            Conversation.participants.through.objects.filter(
+                conversation_id__in=conversation_ids, user_id__in=sender_ids
+            ).values_list("user_id", "conversation_id")
+        )
+
+    created = []
+    for index, (sender_id, conversation_id, message_body) in parsed:
+        if (sender_id, conversation_id) not in allowed:
+            errors.append((index, "Sender is not a participant in this conversation."))
+            continue
+        created.append(
+            (
+                index,
+                Message(
+                    sender_id=sender_id,
+                    conversation_id=conversation_id,
+                    message_body=message_body,
+                ),
+            )
+        )
+
+    if created:
+        with transaction.atomic():
+            messages = [message for _, message in created]
+            counts = Counter(message.conversation_id for message in messages)
+
+            # One sequence range per conversation, numbered in request order.
+            next_seq = {
+                conversation_id: Conversation.objects.reserve_seq(conversation_id, count)
+                for conversation_id, count in counts.items()
+            }
+            for message in messages:
+                message.seq = next_seq[message.conversation_id]
+                next_seq[message.conversation_id] += 1
+
+            for start in range(0, len(messages), chunk_size):
+                Message.objects.bulk_create(messages[start : start + chunk_size])
+
+            by_conversation = {}
+            for message in messages:
+                by_conversation.setdefault(message.conversation_id, []).append(message)
+            for conversation_id, group in by_conversation.items():
+                latest = max(group, key=lambda message: (message.sent_at, message.message_id))
+                record_last_message(conversation_id, latest, count=len(group))
+                invalidate_conversation(conversation_id)
+            if chats_setting("OUTBOX"):
+                outbox.enqueue(
+                    MESSAGES_SENT, {"message_ids": [str(message.pk) for message in messages]}
+                )
+            else:
+                for conversation_id, group in by_conversation.items():
+                    inbox.record_messages(conversation_id, group)
+                publish_messages(messages)
+
+    errors.sort()
+    return BulkResult(created=created, errors=errors)
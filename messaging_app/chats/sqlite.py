@@ -0,0 +1,23 @@
+from .conf import chats_setting
+
+
+# ------------------------------------
+# SQLite tuning
+# ------------------------------------
+# Applied to every new SQLite connection (connection_created, see
+# apps.ChatsConfig). The project settings enable WAL journaling, so
+# readers no longer block the writer, synchronous=NORMAL (safe with WAL,
+# fsync at checkpoints only), memory-mapped reads and a busy timeout, so
+# writers queue for the lock instead of failing with "database is locked".
+def configure_connection(sender, connection, **kwargs):
+    """
+    Run CHATS["SQLITE_PRAGMAS"] on a new SQLite connection.
+    """
+    if connection.vendor != "sqlite":
+        return
+    pragmas = chats_setting("SQLITE_PRAGMAS")
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,72 @@
+import json
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from .conf import chats_setting
+from .membership import is_participant
+from .models import Conversation
+from .pubsub import conversation_channel, get_hub
+
+
+# ------------------------------------
+# Server-Sent Events
+# ------------------------------------
+async def _event_stream(subscription):
+    keepalive = chats_setting("PUBSUB_KEEPALIVE")
+    try:
+        yield ": connected\n\n"
+        while True:
+            message, dropped = await subscription.get(timeout=keepalive)
+            if dropped:
+                # Slow consumer: tell it to resync older messages over REST.
+                yield f"event: lagged\ndata: {json.dumps({'dropped': dropped})}\n\n"
+            if message is None:
+                yield ": keepalive\n\n"
+            else:
+                yield f"event: message\ndata: {message}\n\n"
+    finally:
+        subscription.close()
+
+
+async def _request_user_id(request):
+    """
+    The authenticated user's id, or ?user_id= for anonymous requests;
+    None if neither is valid.
+    """
+    user = await request.auser()
+    if user.is_authenticated:
+        return user.pk
+    try:
+        return uuid.UUID(request.GET.get("user_id", ""))
+    except ValueError:
+        return None
+
+
+@require_GET
+async def conversation_events(request, conversation_id):
+    """
+    Stream new messages of a conversation to one of its participants as
+    Server-Sent Events (?user_id=<uuid> for anonymous requests).
+    Each event carries the same JSON as the message API.
+    """
+    user_id = await _request_user_id(request)
+    if user_id is None:
+        return JsonResponse({"error": "A valid user_id is required."}, status=400)
+    exists = await Conversation.objects.filter(conversation_id=conversation_id).aexists()
+    if not exists:
+        raise Http404("Conversation not found.")
+    if not await sync_to_async(is_participant)(conversation_id, user_id):
+        return JsonResponse(
+            {"error": "User is not a participant in this conversation."}, status=403
+        )
+
+    subscription = get_hub().subscribe(conversation_channel(conversation_id))
+    response = StreamingHttpResponse(
+        _event_stream(subscription), content_type="text/event-stream"
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
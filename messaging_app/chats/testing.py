@@ -0,0 +1,43 @@
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+
+# ------------------------------------
+# Query count helpers for tests
+# ------------------------------------
+def count_queries(func, *args, using=DEFAULT_DB_ALIAS, **kwargs):
+    """
+    Call func and return (number_of_queries, result).
+    """
+    with CaptureQueriesContext(connections[using]) as context:
+        result = func(*args, **kwargs)
+    return len(context.captured_queries), result
+
+
+class QueryCountAssertionsMixin:
+    """
+    TestCase mixin for catching N+1 regressions.
+
+    Usage:
+        self.assertFixedQueryCount(
+            3, lambda size: self.client.get(f"/api/chats/conversations/?page_size={size}")
+        )
+    """
+
+    query_count_page_sizes = (1, 10, 50)
+
+    def assertFixedQueryCount(self, expected, request_page, page_sizes=None, using=DEFAULT_DB_ALIAS):
+        """
+        Assert request_page(size) runs exactly `expected` queries for every size.
+        """
+        for size in page_sizes or self.query_count_page_sizes:
+            with self.subTest(page_size=size):
+                with CaptureQueriesContext(connections[using]) as context:
+                    request_page(size)
+                queries = "\n".join(query["sql"] for query in context.captured_queries)
+                self.assertEqual(
+                    len(context.captured_queries),
+                    expected,
+                    f"{len(context.captured_queries)} queries executed for page size "
+                    f"{size}, {expected} expected.\nCaptured queries were:\n{queries}",
+                )
@@ -0,0 +1,1039 @@
+import asyncio
+import base64
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import uuid
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from chats import archive, exports, inbox, outbox, search, services
+from chats.caching import LRUCache, check_shared_caches, reset_response_cache
+from chats.models import (
+    ArchivedMessage,
+    Conversation,
+    InboxEntry,
+    Message,
+    OutboxEvent,
+    User,
+)
+from chats.pagination import KeysetPagination, encode_cursor
+from chats.profiling import get_metrics, reset_metrics
+from chats.pubsub import reset_hub
+from chats.routers import replica_reads
+from chats.services import add_participants, create_conversation, messages_sent, send_message
+from chats.testing import QueryCountAssertionsMixin
+from chats.throttling import CacheStore, LocalStore, reset_throttle_store
+
+
+def make_users(count, prefix="user"):
+    return [
+        User.objects.create(username=f"{prefix}{index}", email=f"{prefix}{index}@example.com")
+        for index in range(count)
+    ]
+
+
+class ChatsTestMixin:
+    """
+    Fresh response cache per test, rate limits off.
+    """
+
+    def setUp(self):
+        reset_response_cache()
+        self.addCleanup(reset_response_cache)
+        throttles_off = override_settings(
+            REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": {}}
+        )
+        throttles_off.enable()
+        self.addCleanup(throttles_off.disable)
+        self.client = APIClient()
+
+    def unread(self, conversation, user):
+        return InboxEntry.objects.get(conversation=conversation, user=user).unread_count
+
+
+class ChatsTestCase(ChatsTestMixin, TestCase):
+    pass
+
+
+# ------------------------------------
+# Query counts
+# ------------------------------------
+class ListQueryCountTests(QueryCountAssertionsMixin, ChatsTestCase):
+    """
+    List pages cost a fixed number of queries whatever their size.
+    """
+
+    def setUp(self):
+        super().setUp()
+        users = make_users(4)
+        for index in range(60):
+            conversation = create_conversation([user.pk for user in users[: 2 + index % 3]])
+            send_message(users[0], conversation.pk, f"hello {index}")
+            send_message(users[1], conversation.pk, f"hi {index}")
+        self.conversation = conversation
+
+    def test_conversation_list(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), self.settings(
+                CHATS={"FAST_SERIALIZERS": fast, "MESSAGE_WINDOW": 20}
+            ):
+                self.assertFixedQueryCount(
+                    4,
+                    lambda size: self.client.get(f"/api/chats/conversations/?page_size={size}"),
+                )
+
+    def test_message_list(self):
+        for fast in (False, True):
+            with self.subTest(fast=fast), self.settings(CHATS={"FAST_SERIALIZERS": fast}):
+                self.assertFixedQueryCount(
+                    1,
+                    lambda size: self.client.get(f"/api/chats/messages/?page_size={size}"),
+                )
+
+
+# ------------------------------------
+# Keyset pagination
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class PaginationTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        for index in range(7):
+            send_message(self.alice, self.conversation.pk, f"message {index}")
+        self.expected = [
+            str(pk)
+            for pk in Message.objects.order_by("-sent_at", "-message_id").values_list(
+                "pk", flat=True
+            )
+        ]
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            data = self.client.get(url).json()
+            pages.append([item["message_id"] for item in data["results"]])
+            url = data[link]
+        return pages
+
+    def test_next_and_previous_links_round_trip(self):
+        pages = self.walk("/api/chats/messages/?page_size=3", "next")
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        last = self.client.get("/api/chats/messages/?page_size=3").json()
+        last = self.client.get(self.client.get(last["next"]).json()["next"]).json()
+        backwards = self.walk(last["previous"], "previous")
+        self.assertEqual(backwards, [pages[1], pages[0]])
+
+    def test_pages_fall_through_to_the_archive(self):
+        # Two live messages, so the first page already straddles the boundary.
+        archive.archive_conversation(self.conversation.pk, through_seq=5)
+        self.assertEqual(ArchivedMessage.objects.count(), 5)
+        urls = (
+            "/api/chats/messages/?page_size=3",
+            f"/api/chats/messages/?conversation={self.conversation.pk}&page_size=3",
+        )
+        for fast in (False, True):
+            for url in urls:
+                with self.subTest(fast=fast, url=url), self.settings(
+                    CHATS={"OUTBOX": False, "FAST_SERIALIZERS": fast}
+                ):
+                    pages = self.walk(url, "next")
+                    self.assertEqual([len(page) for page in pages], [3, 3, 1])
+                    self.assertEqual(sum(pages, []), self.expected)
+
+                    last = self.client.get(url).json()
+                    last = self.client.get(self.client.get(last["next"]).json()["next"]).json()
+                    self.assertEqual(last["results"][0]["message_id"], pages[2][0])
+                    backwards = self.walk(last["previous"], "previous")
+                    self.assertEqual(backwards, [pages[1], pages[0]])
+
+    def test_page_size_is_capped_and_defaulted(self):
+        limits = mock.patch.multiple(KeysetPagination, page_size=3, max_page_size=5)
+        with limits:
+            for page_size, expected in (("2", 2), ("100", 5), ("0", 3), ("many", 3)):
+                with self.subTest(page_size=page_size):
+                    response = self.client.get(f"/api/chats/messages/?page_size={page_size}")
+                    self.assertEqual(len(response.json()["results"]), expected)
+
+    def test_invalid_cursors_are_not_found(self):
+        def raw_cursor(position):
+            payload = json.dumps({"p": position}).encode()
+            return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+        cursors = [
+            "garbage",
+            encode_cursor(["2026-01-01T00:00:00Z"]),
+            encode_cursor(["not a date", str(uuid.uuid4())]),
+            encode_cursor(["2026-01-01T00:00:00Z", "not a uuid"]),
+            raw_cursor([1, str(uuid.uuid4())]),
+            raw_cursor([{"a": 1}, str(uuid.uuid4())]),
+            raw_cursor([None, None]),
+        ]
+        for url in ("/api/chats/messages/", "/api/chats/conversations/"):
+            for cursor in cursors:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {"cursor": cursor})
+                    self.assertEqual(response.status_code, 404)
+
+
+# ------------------------------------
+# Inbox read model
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class InboxTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+
+    def test_unread_counts_follow_sends_and_reads(self):
+        for body in ("one", "two", "three"):
+            send_message(self.alice, self.conversation.pk, body)
+        self.assertEqual(self.unread(self.conversation, self.bob), 3)
+        self.assertEqual(self.unread(self.conversation, self.alice), 0)
+
+        entry = inbox.mark_read(self.conversation.pk, self.bob.pk, seq=2)
+        self.assertEqual((entry.last_read_seq, entry.unread_count), (2, 1))
+        send_message(self.bob, self.conversation.pk, "reply")
+        entry.refresh_from_db()
+        # Replying reads everything before the reply.
+        self.assertEqual((entry.last_read_seq, entry.unread_count), (4, 0))
+        self.assertEqual(self.unread(self.conversation, self.alice), 1)
+
+    def test_history_before_joining_counts_as_read(self):
+        send_message(self.alice, self.conversation.pk, "before")
+        add_participants(self.conversation, [self.carol.pk])
+        self.assertEqual(self.unread(self.conversation, self.carol), 0)
+        send_message(self.alice, self.conversation.pk, "after")
+        self.assertEqual(self.unread(self.conversation, self.carol), 1)
+
+    def test_inbox_is_ordered_by_activity(self):
+        other = create_conversation([self.alice.pk, self.bob.pk, self.carol.pk])
+        send_message(self.alice, other.pk, "first")
+        send_message(self.alice, self.conversation.pk, "second")
+        response = self.client.get(f"/api/chats/conversations/mine/?user_id={self.bob.pk}")
+        results = response.json()["results"]
+        self.assertEqual(
+            [item["conversation_id"] for item in results],
+            [str(self.conversation.pk), str(other.pk)],
+        )
+        self.assertEqual(
+            [(item["unread_count"], item["last_read_seq"], item["last_seq"]) for item in results],
+            [(1, 0, 1), (1, 0, 1)],
+        )
+
+
+# ------------------------------------
+# Outbox
+# ------------------------------------
+@override_settings(
+    CHATS={"OUTBOX": True, "OUTBOX_WORKERS": 0, "OUTBOX_MAX_ATTEMPTS": 2, "OUTBOX_RETRY_DELAY": 0}
+)
+class OutboxTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+
+    def send(self, sender, count=1):
+        return [send_message(sender, self.conversation.pk, "hello") for _ in range(count)]
+
+    def entry(self, user):
+        entry = InboxEntry.objects.get(conversation=self.conversation, user=user)
+        return entry.last_read_seq, entry.unread_count
+
+    def test_send_leaves_inbox_to_the_workers(self):
+        self.send(self.alice, 3)
+        self.assertEqual(OutboxEvent.objects.count(), 3)
+        self.assertEqual(self.entry(self.bob), (0, 0))
+        self.assertEqual(outbox.drain(), (3, 0, 0))
+        self.assertFalse(OutboxEvent.objects.exists())
+        self.assertEqual(self.entry(self.bob), (0, 3))
+
+    def test_read_before_drain(self):
+        self.send(self.alice, 3)
+        inbox.mark_read(self.conversation.pk, self.bob.pk)
+        outbox.drain()
+        self.assertEqual(self.entry(self.bob), (3, 0))
+
+    def test_read_after_drain(self):
+        self.send(self.alice, 3)
+        outbox.drain()
+        inbox.mark_read(self.conversation.pk, self.bob.pk, seq=1)
+        self.assertEqual(self.entry(self.bob), (1, 2))
+
+    def test_join_before_drain(self):
+        self.send(self.alice, 2)
+        add_participants(self.conversation, [self.carol.pk])
+        outbox.drain()
+        self.assertEqual(self.entry(self.carol), (2, 0))
+
+    def test_batches_out_of_order_and_redelivered(self):
+        first = self.send(self.alice)
+        second = self.send(self.bob)
+        third = self.send(self.alice)
+        OutboxEvent.objects.all().delete()
+        for batch in (third, first, second, first):
+            messages_sent([{"message_ids": [str(message.pk) for message in batch]}])
+        self.assertEqual(self.entry(self.alice), (3, 0))
+        self.assertEqual(self.entry(self.bob), (2, 1))
+
+    def test_delete_before_drain(self):
+        first, second = self.send(self.alice, 2)
+        services.delete_message(first)
+        outbox.drain()
+        self.assertEqual(self.entry(self.bob), (0, 1))
+
+    def test_drain_adds_new_messages_without_recounting(self):
+        self.send(self.alice, 20)
+        outbox.drain()
+        self.send(self.alice)
+        with CaptureQueriesContext(connection) as context:
+            outbox.drain()
+        self.assertEqual(self.entry(self.bob), (0, 21))
+        self.assertFalse(
+            [query["sql"] for query in context.captured_queries if "COUNT(" in query["sql"]]
+        )
+
+    def test_failing_events_are_retried_then_marked_failed(self):
+        calls = []
+
+        def failing(payloads):
+            calls.append(payloads)
+            raise ValueError("boom")
+
+        self.addCleanup(outbox._handlers.pop, "test.failing")
+        outbox.handler("test.failing")(failing)
+        outbox.enqueue("test.failing", {})
+        self.send(self.alice)
+
+        self.assertEqual(outbox.drain_once(), (1, 1, 0))
+        event = OutboxEvent.objects.get()
+        self.assertEqual(event.attempts, 1)
+        self.assertIn("ValueError", event.last_error)
+        self.assertEqual(outbox.drain(), (0, 0, 1))
+        event.refresh_from_db()
+        self.assertIsNotNone(event.failed_at)
+        self.assertEqual(len(calls), 3)
+
+
+# ------------------------------------
+# Response cache
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class ResponseCacheTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.message = send_message(self.alice, self.conversation.pk, "hello")
+
+    def test_message_update_invalidates_lists(self):
+        url = f"/api/chats/messages/?conversation={self.conversation.pk}"
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        response = self.client.patch(
+            f"/api/chats/messages/{self.message.pk}/", {"message_body": "edited"}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.json()["results"][0]["message_body"], "edited")
+
+    def test_conversation_delete_invalidates_detail(self):
+        url = f"/api/chats/conversations/{self.conversation.pk}/"
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_local_tier_entries_expire(self):
+        cache = LRUCache(10, ttl=60)
+        with mock.patch("chats.caching.time.monotonic", return_value=1000.0):
+            cache.set("key", {"cached": True})
+            self.assertEqual(cache.get("key"), {"cached": True})
+        with mock.patch("chats.caching.time.monotonic", return_value=1060.0):
+            self.assertIsNone(cache.get("key"))
+        self.assertEqual(len(cache), 0)
+
+    def test_process_local_cache_is_flagged(self):
+        locmem = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+        with self.settings(CACHES=locmem):
+            self.assertEqual(
+                {warning.id for warning in check_shared_caches(None)}, {"chats.W001"}
+            )
+        redis = {
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": "redis://localhost:6379",
+            }
+        }
+        with self.settings(CACHES=redis):
+            self.assertEqual(check_shared_caches(None), [])
+
+
+# ------------------------------------
+# Rate limits
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class BulkThrottleTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_throttle_store()
+        self.addCleanup(reset_throttle_store)
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+
+    def test_bulk_items_are_charged_per_item(self):
+        rates = {"chats.sender": "1/min:3", "chats.conversation": "1/min:4"}
+        item = {"conversation_id": str(self.conversation.pk), "message_body": "hi"}
+        items = [dict(item, sender_id=str(self.alice.pk))] * 5
+        items += [dict(item, sender_id=str(self.bob.pk))] * 2
+        with self.settings(REST_FRAMEWORK={"DEFAULT_THROTTLE_RATES": rates}):
+            response = self.client.post("/api/chats/messages/bulk/", items, format="json")
+            self.assertEqual(response.status_code, 207)
+            body = response.json()
+            # Alice's first 3, then Bob's first one fills the conversation's 4.
+            self.assertEqual([item["index"] for item in body["created"]], [0, 1, 2, 5])
+            self.assertEqual([item["index"] for item in body["errors"]], [3, 4, 6])
+
+            single = dict(item, sender_id=str(self.bob.pk))
+            response = self.client.post("/api/chats/messages/", single, format="json")
+            self.assertEqual(response.status_code, 429)
+
+    def test_take_grants_what_is_left(self):
+        for store in (LocalStore(), CacheStore()):
+            with self.subTest(store=type(store).__name__):
+                key = f"test:{uuid.uuid4()}"
+                self.assertEqual(store.take(key, 60, 5, 3), 3)
+                self.assertEqual(store.take(key, 60, 5, 3), 2)
+                self.assertEqual(store.take(key, 60, 5, 1), 0)
+                self.assertGreater(store.consume(key, 60, 5), 0)
+
+
+# ------------------------------------
+# Delta sync
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class SyncTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.url = f"/api/chats/conversations/sync/?user_id={self.bob.pk}"
+
+    def sync(self, **params):
+        query = "".join(f"&{name}={value}" for name, value in params.items())
+        response = self.client.get(self.url + query)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_send_committed_behind_the_token_is_delivered(self):
+        send_message(self.alice, self.conversation.pk, "one")
+        first = self.sync()
+        # A send that took its timestamps before the sync but committed after it.
+        late = send_message(self.alice, self.conversation.pk, "two")
+        earlier = Conversation.objects.get(pk=self.conversation.pk).created_at
+        Conversation.objects.filter(pk=self.conversation.pk).update(updated_at=earlier)
+        Message.objects.filter(pk=late.pk).update(sent_at=earlier)
+
+        body = self.sync(since=first["since"], seen=f"{self.conversation.pk}:1")
+        self.assertEqual(
+            [message["message_id"] for message in body["conversations"][0]["messages"]],
+            [str(late.pk)],
+        )
+        self.assertEqual(body["since"], first["since"])
+
+        body = self.sync(since=first["since"], seen=f"{self.conversation.pk}:2")
+        self.assertEqual(body["conversations"], [])
+
+    def test_seen_rejects_garbage(self):
+        response = self.client.get(self.url + "&seen=nope")
+        self.assertEqual(response.status_code, 400)
+
+    def test_since_rejects_garbage(self):
+        tokens = [
+            "nope",
+            encode_cursor(["2026-01-01T00:00:00Z"]),
+            encode_cursor(["not a date", str(uuid.uuid4())]),
+            base64.urlsafe_b64encode(b'{"p": [1, 2]}').decode(),
+        ]
+        for token in tokens:
+            with self.subTest(token=token):
+                response = self.client.get(f"{self.url}&since={token}")
+                self.assertEqual(response.status_code, 400)
+
+
+# ------------------------------------
+# Conversations
+# ------------------------------------
+class GetOrCreateTests(ChatsTestCase):
+    def test_probes_again_under_the_lock(self):
+        alice, bob = make_users(2)
+        existing = create_conversation([alice.pk, bob.pk])
+        # The unlocked probe misses, as it would while another request creates.
+        with mock.patch(
+            "chats.services.find_conversation",
+            side_effect=[None, services.find_conversation([bob.pk, alice.pk])],
+        ):
+            conversation, created = services.get_or_create_conversation([bob.pk, alice.pk])
+        self.assertEqual((conversation, created), (existing, False))
+        self.assertEqual(Conversation.objects.count(), 1)
+
+    def test_created_and_existing_payloads_match(self):
+        alice, bob = make_users(2)
+        body = {"participants": [str(alice.pk), str(bob.pk)], "get_or_create": True}
+        for window in (None, 3):
+            with self.subTest(window=window), self.settings(CHATS={"MESSAGE_WINDOW": window}):
+                Conversation.objects.all().delete()
+                created = self.client.post("/api/chats/conversations/", body, format="json")
+                existing = self.client.post("/api/chats/conversations/", body, format="json")
+                self.assertEqual((created.status_code, existing.status_code), (201, 200))
+                self.assertEqual(created.json(), existing.json())
+                conversation_id = created.json()["conversation_id"]
+                detail = self.client.get(f"/api/chats/conversations/{conversation_id}/")
+                self.assertEqual(created.json(), detail.json())
+
+
+@override_settings(CHATS={"OUTBOX": False})
+class MembershipTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol, self.dave = make_users(4)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.url = f"/api/chats/conversations/{self.conversation.pk}"
+
+    def members(self):
+        return set(self.conversation.participants.values_list("pk", flat=True))
+
+    def test_add_participant_responds_with_the_new_members(self):
+        response = self.client.post(
+            f"{self.url}/add_participant/", {"user_id": str(self.carol.pk)}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {participant["user_id"] for participant in response.json()["participants"]},
+            {str(self.alice.pk), str(self.bob.pk), str(self.carol.pk)},
+        )
+
+    def test_add_participants_reports_a_delta(self):
+        unknown = uuid.uuid4()
+        response = self.client.post(
+            f"{self.url}/add_participants/",
+            {"user_ids": [str(self.bob.pk), str(self.carol.pk), str(unknown)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "conversation_id": str(self.conversation.pk),
+                "added": [str(self.carol.pk)],
+                "removed": [],
+                "unchanged": [str(self.bob.pk)],
+                "unknown": [str(unknown)],
+            },
+        )
+        self.assertEqual(self.members(), {self.alice.pk, self.bob.pk, self.carol.pk})
+        self.assertTrue(InboxEntry.objects.filter(user=self.carol).exists())
+
+    def test_remove_participants_reports_a_delta(self):
+        unknown = uuid.uuid4()
+        response = self.client.post(
+            f"{self.url}/remove_participants/",
+            {"user_ids": [str(self.bob.pk), str(self.dave.pk), str(unknown)]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json(),
+            {
+                "conversation_id": str(self.conversation.pk),
+                "added": [],
+                "removed": [str(self.bob.pk)],
+                "unchanged": [str(self.dave.pk)],
+                "unknown": [str(unknown)],
+            },
+        )
+        self.assertEqual(self.members(), {self.alice.pk})
+        self.assertFalse(InboxEntry.objects.filter(user=self.bob).exists())
+
+    def test_invalid_user_ids_are_rejected(self):
+        response = self.client.post(
+            f"{self.url}/remove_participants/", {"user_ids": ["nope"]}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+# ------------------------------------
+# Fast serializers
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class FastSerializerParityTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        users = make_users(6)
+        self.user = users[0]
+        for size in (2, 4, 6):
+            conversation = create_conversation([user.pk for user in reversed(users[:size])])
+            for user in users[:size]:
+                send_message(user, conversation.pk, f"from {user.username}")
+        self.conversation = conversation
+
+    def test_payloads_do_not_depend_on_the_flag(self):
+        urls = [
+            "/api/chats/conversations/",
+            f"/api/chats/conversations/{self.conversation.pk}/",
+            f"/api/chats/conversations/mine/?user_id={self.user.pk}",
+        ]
+        for window in (None, 3):
+            for url in urls:
+                with self.subTest(url=url, window=window):
+                    payloads = []
+                    for fast in (False, True):
+                        reset_response_cache()
+                        with self.settings(CHATS={"FAST_SERIALIZERS": fast, "MESSAGE_WINDOW": window}):
+                            payloads.append(self.client.get(url).json())
+                    self.assertEqual(payloads[0], payloads[1])
+
+
+@override_settings(CHATS={"OUTBOX": False, "FAST_SERIALIZERS": True})
+class AsyncViewParityTests(ChatsTestCase):
+    """
+    The async endpoints answer with the same payloads as the sync ones,
+    apart from their own URLs in links.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        create_conversation([self.alice.pk, self.carol.pk])
+        create_conversation([self.bob.pk, self.carol.pk])
+        for index in range(5):
+            send_message(self.alice, self.conversation.pk, f"message {index}")
+        archive.archive_conversation(self.conversation.pk, through_seq=2)
+
+    def sync_get(self, url):
+        reset_response_cache()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def async_get(self, url):
+        url = url.replace("/api/chats/", "/api/chats/async/")
+        response = async_to_sync(self.async_client.get)(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content.decode().replace("/api/chats/async/", "/api/chats/"))
+
+    def test_reads_match(self):
+        urls = [
+            "/api/chats/conversations/?page_size=2",
+            "/api/chats/conversations/?page_size=2&message_window=2",
+            f"/api/chats/conversations/{self.conversation.pk}/",
+            "/api/chats/messages/?page_size=2",
+            f"/api/chats/messages/?conversation={self.conversation.pk}&page_size=2",
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                expected = self.sync_get(url)
+                self.assertEqual(self.async_get(url), expected)
+                # The next page too, through the cursor in the link
+                next_url = expected.get("next")
+                if next_url:
+                    self.assertEqual(self.async_get(next_url), self.sync_get(next_url))
+
+    def test_send_matches(self):
+        body = {
+            "conversation_id": str(self.conversation.pk),
+            "sender_id": str(self.bob.pk),
+            "message_body": "hello",
+        }
+        sent = [self.client.post("/api/chats/messages/", body, format="json")]
+        sent.append(
+            async_to_sync(self.async_client.post)(
+                "/api/chats/async/messages/", json.dumps(body), content_type="application/json"
+            )
+        )
+        for response in sent:
+            self.assertEqual(response.status_code, 201)
+            data = response.json()
+            self.assertEqual(data, self.sync_get(f"/api/chats/messages/{data['message_id']}/"))
+        self.assertEqual([response.json()["seq"] for response in sent], [6, 7])
+
+
+# ------------------------------------
+# Search
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class SearchTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.other = create_conversation([self.alice.pk, self.carol.pk])
+
+    def search(self, user, query):
+        response = self.client.get(
+            "/api/chats/messages/search/", {"user_id": str(user.pk), "q": query}
+        )
+        self.assertEqual(response.status_code, 200)
+        return [item["message_id"] for item in response.json()["results"]]
+
+    def test_results_are_scoped_to_the_users_conversations(self):
+        mine = send_message(self.alice, self.conversation.pk, "lunch at noon")
+        theirs = send_message(self.alice, self.other.pk, "lunch at one")
+        self.assertEqual(set(self.search(self.alice, "lunch")), {str(mine.pk), str(theirs.pk)})
+        self.assertEqual(self.search(self.bob, "lunch"), [str(mine.pk)])
+        self.assertEqual(self.search(self.carol, "lunch noon"), [])
+
+    def test_query_syntax_is_plain_text(self):
+        message = send_message(self.alice, self.conversation.pk, 'she said "hi" OR NEAR(bye)')
+        for query in ('"hi"', "said OR", "NEAR(bye)", "hi*", 'said "'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(self.bob, query), [str(message.pk)])
+        self.assertEqual(self.search(self.bob, "hi OR nothing"), [])
+        # Only message bodies are searched, not the stored message ids.
+        self.assertEqual(self.search(self.bob, message.pk.hex), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        message = send_message(self.alice, self.conversation.pk, "first draft")
+        url = f"/api/chats/messages/{message.pk}/"
+        self.client.patch(url, {"message_body": "final version"}, format="json")
+        self.assertEqual(self.search(self.bob, "draft"), [])
+        self.assertEqual(self.search(self.bob, "final"), [str(message.pk)])
+        self.client.delete(url)
+        self.assertEqual(self.search(self.bob, "final"), [])
+
+    def test_post_migrate_puts_back_dropped_triggers(self):
+        with connection.cursor() as cursor:
+            for suffix in ("ai", "ad", "au"):
+                cursor.execute(f"DROP TRIGGER {search.FTS_TABLE}_{suffix}")
+        search.install_fts_triggers(sender=None)
+        message = send_message(self.alice, self.conversation.pk, "still indexed")
+        self.assertEqual(self.search(self.bob, "indexed"), [str(message.pk)])
+
+
+# ------------------------------------
+# Message edits and deletes
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False})
+class MessageDeleteTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.messages = [
+            send_message(self.alice, self.conversation.pk, body) for body in ("a", "b", "c")
+        ]
+
+    def delete(self, message):
+        response = self.client.delete(f"/api/chats/messages/{message.pk}/")
+        self.assertEqual(response.status_code, 204)
+        return Conversation.objects.get(pk=self.conversation.pk)
+
+    def test_delete_keeps_activity_columns_and_unread_counts(self):
+        conversation = self.delete(self.messages[2])
+        self.assertEqual(conversation.message_count, 2)
+        self.assertEqual(conversation.last_message_id, self.messages[1].pk)
+        self.assertEqual(conversation.last_message_at, self.messages[1].sent_at)
+        self.assertEqual(self.unread(conversation, self.bob), 2)
+
+        conversation = self.delete(self.messages[0])
+        self.assertEqual(conversation.message_count, 1)
+        self.assertEqual(conversation.last_message_id, self.messages[1].pk)
+        self.assertEqual(self.unread(conversation, self.bob), 1)
+
+        conversation = self.delete(self.messages[1])
+        self.assertEqual(
+            (conversation.message_count, conversation.last_message_id, conversation.last_message_at),
+            (0, None, None),
+        )
+        self.assertEqual(self.unread(conversation, self.bob), 0)
+
+    def test_edit_cannot_move_a_message(self):
+        other = create_conversation([self.alice.pk, self.bob.pk])
+        response = self.client.patch(
+            f"/api/chats/messages/{self.messages[0].pk}/",
+            {"conversation": str(other.pk), "message_body": "edited"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.messages[0].refresh_from_db()
+        self.assertEqual(
+            (self.messages[0].conversation_id, self.messages[0].message_body),
+            (self.conversation.pk, "edited"),
+        )
+
+
+# ------------------------------------
+# Server-Sent Events
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False, "PUBSUB_KEEPALIVE": 0.2})
+class ConversationEventsTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_hub()
+        self.addCleanup(reset_hub)
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.other = create_conversation([self.alice.pk, self.carol.pk])
+
+    def events_url(self, conversation, user):
+        return f"/api/chats/conversations/{conversation.pk}/events/?user_id={user.pk}"
+
+    def send(self, body):
+        # Messages are published once the sending transaction commits.
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                "/api/chats/messages/",
+                {
+                    "conversation_id": str(self.conversation.pk),
+                    "sender_id": str(self.alice.pk),
+                    "message_body": body,
+                },
+                format="json",
+            )
+        self.assertEqual(response.status_code, 201)
+        return response.json()
+
+    async def open_stream(self, url):
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await self.next_event(stream), ": connected\n\n")
+        return stream
+
+    async def next_event(self, stream):
+        return (await asyncio.wait_for(anext(stream), 5)).decode()
+
+    def test_messages_reach_participants_only(self):
+        async def scenario():
+            refused = await self.async_client.get(self.events_url(self.conversation, self.carol))
+            self.assertEqual(refused.status_code, 403)
+
+            bob = await self.open_stream(self.events_url(self.conversation, self.bob))
+            carol = await self.open_stream(self.events_url(self.other, self.carol))
+            try:
+                sent = await sync_to_async(self.send)("hello")
+                event = await self.next_event(bob)
+                self.assertTrue(event.startswith("event: message\ndata: "))
+                self.assertEqual(json.loads(event.split("data: ", 1)[1]), sent)
+                self.assertEqual(await self.next_event(carol), ": keepalive\n\n")
+            finally:
+                await bob.aclose()
+                await carol.aclose()
+
+        async_to_sync(scenario)()
+
+
+# ------------------------------------
+# Streaming exports
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False, "EXPORT_CHUNK_SIZE": 2})
+class ExportTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice, self.bob, self.carol = make_users(3)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.other = create_conversation([self.alice.pk, self.carol.pk])
+        for index in range(5):
+            send_message(self.alice, self.conversation.pk, f"message {index}")
+        send_message(self.carol, self.other.pk, "elsewhere")
+        # Exports start from the archived part of the history.
+        archive.archive_conversation(self.conversation.pk, through_seq=2)
+        self.conversation_url = (
+            f"/api/chats/conversations/{self.conversation.pk}/export/?user_id={self.bob.pk}"
+        )
+
+    def export(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        content = self.export(self.conversation_url)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["seq"] for row in rows], [1, 2, 3, 4, 5])
+        self.assertEqual(list(rows[0]), list(exports.HEADER))
+        self.assertEqual(rows[0]["message_body"], "message 0")
+        self.assertEqual(rows[0]["sender_username"], self.alice.username)
+
+    def test_csv(self):
+        content = self.export(f"{self.conversation_url}&export_format=csv")
+        rows = list(csv.reader(io.StringIO(content)))
+        self.assertEqual(rows[0], list(exports.HEADER))
+        self.assertEqual([row[2] for row in rows[1:]], ["1", "2", "3", "4", "5"])
+
+        response = self.client.get(f"{self.conversation_url}&export_format=xml")
+        self.assertEqual(response.status_code, 400)
+
+    def test_only_participants_export_a_conversation(self):
+        url = f"/api/chats/conversations/{self.conversation.pk}/export/?user_id={self.carol.pk}"
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_export_covers_only_their_conversations(self):
+        content = self.export(f"/api/chats/messages/export/?user_id={self.bob.pk}")
+        conversations = {json.loads(line)["conversation_id"] for line in content.splitlines()}
+        self.assertEqual(conversations, {str(self.conversation.pk)})
+
+    def test_query_count_does_not_grow_with_history(self):
+        urls = (self.conversation_url, f"/api/chats/messages/export/?user_id={self.bob.pk}")
+        # The conversation or user, then the archived and live messages,
+        # each read in chunks of EXPORT_CHUNK_SIZE from one query.
+        self.export(self.conversation_url)  # fills the membership cache
+        for extra in (0, 20):
+            for index in range(extra):
+                send_message(self.alice, self.conversation.pk, f"more {index}")
+            for url in urls:
+                with self.subTest(extra=extra, url=url):
+                    with CaptureQueriesContext(connection) as context:
+                        self.export(url)
+                    self.assertEqual(len(context.captured_queries), 3)
+
+
+# ------------------------------------
+# Request profiling
+# ------------------------------------
+@override_settings(CHATS={"OUTBOX": False, "PROFILING_SAMPLE_RATE": 0.5})
+class ProfilingTests(ChatsTestCase):
+    def setUp(self):
+        super().setUp()
+        reset_metrics()
+        self.addCleanup(reset_metrics)
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        send_message(self.alice, self.conversation.pk, "hello")
+
+    def endpoint(self, name):
+        return get_metrics().snapshot()["endpoints"][name]
+
+    def test_sample_rate_is_honored(self):
+        draws = [0.1, 0.7, 0.49, 0.5, 0.9]
+        with mock.patch("chats.profiling.random.random", side_effect=draws):
+            sampled = [
+                "Server-Timing" in self.client.get("/api/chats/messages/") for _ in draws
+            ]
+        self.assertEqual(sampled, [True, False, True, False, False])
+        metrics = self.endpoint("GET message-list")
+        self.assertEqual((metrics["requests"], metrics["sampled"]), (5, 2))
+        self.assertEqual(metrics["queries"]["count"], 2)
+
+        with self.settings(CHATS={"PROFILING_SAMPLE_RATE": 0.0}):
+            response = self.client.get("/api/chats/messages/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertEqual(self.endpoint("GET message-list")["requests"], 6)
+
+    def test_sampled_requests_are_recorded(self):
+        settings = {"PROFILING_SAMPLE_RATE": 1.0, "PROFILING_SLOW_QUERY_MS": 0}
+        with self.settings(CHATS=settings), self.assertLogs("chats.profiling", "WARNING"):
+            with CaptureQueriesContext(connection) as context:
+                response = self.client.get(f"/api/chats/conversations/{self.conversation.pk}/")
+        self.assertEqual(response.status_code, 200)
+        queries = len(context.captured_queries)
+        self.assertIn(f'desc="{queries} queries"', response["Server-Timing"])
+
+        metrics = self.endpoint("GET conversation-detail")
+        self.assertEqual(metrics["sampled"], 1)
+        self.assertEqual(metrics["queries"]["sum"], queries)
+        self.assertEqual(metrics["payload_bytes"]["sum"], len(response.content))
+        self.assertEqual(metrics["slow_queries"], queries)
+        self.assertEqual(metrics["total_ms"]["count"], 1)
+
+        body = self.client.get("/api/chats/metrics/").json()
+        self.assertEqual(body["sample_rate"], 0.5)
+        self.assertEqual(body["endpoints"]["GET conversation-detail"]["sampled"], 1)
+        self.assertEqual(len(body["recent_slow_queries"]), queries)
+
+
+# ------------------------------------
+# Primary / replica routing
+# ------------------------------------
+REPLICA = "chats_test_replica"
+
+
+@override_settings(CHATS={"OUTBOX": False, "READ_REPLICAS": [REPLICA]})
+class ReplicaRoutingTests(ChatsTestMixin, TransactionTestCase):
+    """
+    The replica is a second SQLite file, copied from the primary at the
+    start of each test, so it misses everything the test writes.
+    TestCase would hold the primary inside a transaction, and the
+    router never reads from a replica there. The alias is registered
+    after the test runner has set up its databases, so the runner does
+    not try to create a test database for it.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.replica_dir = tempfile.mkdtemp()
+        connections.settings[REPLICA] = dict(
+            connections["default"].settings_dict,
+            NAME=os.path.join(cls.replica_dir, "replica.sqlite3"),
+        )
+        cls.databases = cls.databases | {REPLICA}
+
+    @classmethod
+    def tearDownClass(cls):
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        shutil.rmtree(cls.replica_dir)
+        super().tearDownClass()
+
+    def setUp(self):
+        super().setUp()
+        for alias in ("default", REPLICA):
+            connections[alias].ensure_connection()
+        connections["default"].connection.backup(connections[REPLICA].connection)
+        self.alice, self.bob = make_users(2)
+        self.conversation = create_conversation([self.alice.pk, self.bob.pk])
+        self.url = f"/api/chats/conversations/?user_id={self.alice.pk}"
+
+    def listed(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return [item["conversation_id"] for item in response.json()["results"]]
+
+    def test_safe_requests_read_from_a_replica(self):
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.listed(), [])
+        self.assertTrue(replica_queries.captured_queries)
+
+    def test_writes_pin_reads_to_the_primary(self):
+        response = self.client.post(
+            "/api/chats/messages/",
+            {
+                "conversation_id": str(self.conversation.pk),
+                "sender_id": str(self.alice.pk),
+                "message_body": "hi",
+            },
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn("chats_pin", response.cookies)
+
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            self.assertEqual(self.listed(), [str(self.conversation.pk)])
+        self.assertEqual(replica_queries.captured_queries, [])
+
+    def test_atomic_blocks_read_from_the_primary(self):
+        with replica_reads():
+            self.assertFalse(Conversation.objects.exists())
+            with transaction.atomic():
+                self.assertTrue(Conversation.objects.exists())
@@ -0,0 +1,278 @@
+import functools
+import math
+import threading
+import time
+
+from django.core.cache import caches
+from django.utils.module_loading import import_string
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .conf import chats_setting
+
+
+# ------------------------------------
+# Token bucket stores
+# ------------------------------------
+# Buckets are kept as GCRA "theoretical arrival times": one float per
+# key, the time at which the bucket will be full again. A request is
+# admitted while that time is less than (capacity - 1) intervals ahead,
+# and pushes it one interval further. This is a token bucket of
+# `capacity` tokens refilled every `interval` seconds, without a
+# separate refill step.
+class BaseStore:
+    """
+    consume(key, interval, capacity) takes one token from the bucket
+    `key` and returns 0, or returns the seconds until one is available.
+    take(key, interval, capacity, count) takes up to count tokens at once
+    and returns how many it got.
+    """
+
+    def consume(self, key, interval, capacity):
+        raise NotImplementedError
+
+    def take(self, key, interval, capacity, count):
+        raise NotImplementedError
+
+
+def _granted(tat, now, interval, capacity, count):
+    # The k-th token is admitted while tat + (k - 1) intervals stays
+    # within (capacity - 1) intervals of now.
+    available = int(capacity - (tat - now) / interval + 1e-9)
+    return max(0, min(count, available))
+
+
+class LocalStore(BaseStore):
+    """
+    Buckets in a dict of this process. Counts per worker process: with N
+    workers a client can get up to N times the configured rate.
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or chats_setting("THROTTLE_MAX_KEYS")
+        self._tat = {}
+        self._lock = threading.Lock()
+
+    def consume(self, key, interval, capacity):
+        now = time.monotonic()
+        with self._lock:
+            tat = self._tat.get(key, now)
+            if tat < now:
+                tat = now
+            allowed_at = tat - (capacity - 1) * interval
+            if allowed_at > now:
+                return allowed_at - now
+            self._tat[key] = tat + interval
+            if len(self._tat) > self.max_keys:
+                # Full buckets carry no state; drop them.
+                self._tat = {key: tat for key, tat in self._tat.items() if tat > now}
+        return 0
+
+    def take(self, key, interval, capacity, count):
+        now = time.monotonic()
+        with self._lock:
+            tat = max(self._tat.get(key, now), now)
+            granted = _granted(tat, now, interval, capacity, count)
+            if granted:
+                self._tat[key] = tat + granted * interval
+        return granted
+
+    def clear(self):
+        with self._lock:
+            self._tat.clear()
+
+
+class CacheStore(BaseStore):
+    """
+    Buckets in the shared Django cache CHATS["THROTTLE_CACHE"] (e.g.
+    Redis), so the limits hold across processes. Each check is one get
+    and one set; concurrent requests for the same key can race between
+    them and admit a few extra. A store with an atomic update (e.g. a
+    Redis script) can replace it through CHATS["THROTTLE_STORE"].
+    """
+
+    key_prefix = "chats:throttle:"
+
+    def __init__(self, alias=None):
+        self.cache = caches[alias or chats_setting("THROTTLE_CACHE")]
+
+    def consume(self, key, interval, capacity):
+        now = time.time()
+        cache_key = self.key_prefix + key
+        tat = max(self.cache.get(cache_key, now), now)
+        allowed_at = tat - (capacity - 1) * interval
+        if allowed_at > now:
+            return allowed_at - now
+        tat += interval
+        self.cache.set(cache_key, tat, math.ceil(tat - now) + 1)
+        return 0
+
+    def take(self, key, interval, capacity, count):
+        now = time.time()
+        cache_key = self.key_prefix + key
+        tat = max(self.cache.get(cache_key, now), now)
+        granted = _granted(tat, now, interval, capacity, count)
+        if granted:
+            tat += granted * interval
+            self.cache.set(cache_key, tat, math.ceil(tat - now) + 1)
+        return granted
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_throttle_store():
+    """
+    Return the process-wide store, built from CHATS["THROTTLE_STORE"].
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(chats_setting("THROTTLE_STORE"))()
+    return _store
+
+
+def reset_throttle_store():
+    """
+    Forget the current store (tests, settings changes).
+    """
+    global _store
+    with _store_lock:
+        _store = None
+
+
+# ------------------------------------
+# DRF throttles
+# ------------------------------------
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@functools.lru_cache(maxsize=None)
+def parse_rate(rate):
+    """
+    "<requests>/<period>[:<burst>]" -> (interval, capacity), e.g. "10/s"
+    or "100/min:20" (100 a minute, at most 20 at once). The period is
+    read from its first letter, as DRF does. None means no limit.
+    """
+    if rate is None:
+        return None
+    rate, _, burst = rate.partition(":")
+    num, period = rate.split("/")
+    num = int(num)
+    return PERIODS[period[0]] / num, int(burst) if burst else num
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket per get_key(), rate from
+    REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"][scope]. Scopes without a
+    rate, and requests without a key, are not limited.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.rate = parse_rate(api_settings.DEFAULT_THROTTLE_RATES.get(self.scope))
+        self.delay = None
+
+    def get_key(self, request, view):
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_key(request, view)
+        if not key:
+            return True
+        self.delay = get_throttle_store().consume(f"{self.scope}:{key}", *self.rate)
+        return not self.delay
+
+    def wait(self):
+        return self.delay
+
+    def take(self, key, count):
+        """
+        Take up to count tokens from the bucket of key at once and return
+        how many were granted (all of them when the scope has no rate).
+        """
+        if self.rate is None:
+            return count
+        return get_throttle_store().take(f"{self.scope}:{key}", *self.rate, count)
+
+
+def _body_value(request, name):
+    data = request.data
+    value = data.get(name) if isinstance(data, dict) else None
+    return str(value) if value else None
+
+
+class SenderRateThrottle(TokenBucketThrottle):
+    """
+    Messages per sender (sender_id of the request body).
+    """
+
+    scope = "chats.sender"
+    field = "sender_id"
+
+    def get_key(self, request, view):
+        return _body_value(request, self.field)
+
+
+class ConversationRateThrottle(TokenBucketThrottle):
+    """
+    Messages per conversation (conversation_id of the request body).
+    """
+
+    scope = "chats.conversation"
+    field = "conversation_id"
+
+    def get_key(self, request, view):
+        return _body_value(request, self.field)
+
+
+class MembershipRateThrottle(TokenBucketThrottle):
+    """
+    Participant changes per conversation (the conversation in the URL).
+    """
+
+    scope = "chats.membership"
+
+    def get_key(self, request, view):
+        return str(view.kwargs.get(view.lookup_field, "")) or None
+
+
+# ------------------------------------
+# Bulk sends
+# ------------------------------------
+class ThrottledItem:
+    """
+    Stands in for a bulk item over a rate limit, so it is reported per
+    item like an invalid one (see services.send_messages_bulk).
+    """
+
+    def __init__(self, error):
+        self.error = error
+
+
+def throttle_items(items):
+    """
+    Charge bulk message items to the same sender and conversation buckets
+    as single sends, one token per item. Returns items with those over
+    either limit, after the first ones in request order, replaced by
+    ThrottledItem.
+    """
+    items = list(items)
+    for throttle in (SenderRateThrottle(), ConversationRateThrottle()):
+        if throttle.rate is None:
+            continue
+        indexes = {}
+        for index, item in enumerate(items):
+            if isinstance(item, dict) and item.get(throttle.field):
+                indexes.setdefault(str(item[throttle.field]), []).append(index)
+        for key, positions in indexes.items():
+            granted = throttle.take(key, len(positions))
+            for index in positions[granted:]:
+                items[index] = ThrottledItem(f"Rate limit exceeded for this {throttle.field}.")
+    return items
@@ -2,6 +2,9 @@
 
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from . import async_views
+from .profiling import metrics
+from .streams import conversation_events
 from .views import ConversationViewSet, MessageViewSet
 
 router = DefaultRouter()
@@ -9,5 +12,28 @@ router.register(r'conversations', ConversationViewSet, basename='conversation')
 router.register(r'messages', MessageViewSet, basename='message')
 
 urlpatterns = [
+    path(
+        'conversations/<uuid:conversation_id>/events/',
+        conversation_events,
+        name='conversation-events',
+    ),
+    # Async endpoints (serve with messaging_app.asgi)
+    path(
+        'async/conversations/',
+        async_views.conversation_list,
+        name='async-conversation-list',
+    ),
+    path(
+        'async/conversations/<uuid:conversation_id>/',
+        async_views.conversation_detail,
+        name='async-conversation-detail',
+    ),
+    path(
+        'async/messages/',
+        async_views.message_list,
+        name='async-message-list',
+    ),
+    # Request profiles and cache statistics (chats.profiling)
+    path('metrics/', metrics, name='metrics'),
     path('', include(router.urls)),
 ]
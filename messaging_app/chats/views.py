@@ -1,35 +1,280 @@
-from rest_framework import viewsets, status
+import uuid
+
+from rest_framework import serializers, viewsets, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.decorators import action
+from django.db.models import F
+from django.http import Http404
 from django.shortcuts import get_object_or_404
 
-from .models import User, Conversation, Message
+from . import exports, inbox
+from .caching import cached_response, invalidate_conversation
+from .conf import chats_setting
+from .fast_serializers import FastConversationSerializer, FastMessageSerializer
+from .groupcommit import SendRejected, get_group_commit_writer
+from .membership import invalidate_participants, is_participant
+from .models import ArchivedMessage, User, Conversation, Message, InboxEntry
+from .pagination import (
+    ConversationCursorPagination,
+    ConversationMessageCursorPagination,
+    InboxCursorPagination,
+    MessageCursorPagination,
+)
+from .parsers import NDJSONParser
+from .prefetch import PlannedQuerysetMixin, plan_queryset, recent_messages_prefetch
+from .search import search_messages
 from .serializers import (
     ConversationSerializer,
+    ConversationWindowSerializer,
     MessageSerializer,
     UserSerializer,
 )
+from .services import (
+    add_participants,
+    create_conversation,
+    delete_message,
+    get_or_create_conversation,
+    remove_participants,
+    send_message,
+    send_messages_bulk,
+)
+from .sync import changed_conversations, decode_seen, decode_since
+from .throttling import (
+    ConversationRateThrottle,
+    MembershipRateThrottle,
+    SenderRateThrottle,
+    throttle_items,
+)
+
+
+def get_message_window(query_params, param="message_window"):
+    """
+    Window size for embedded messages from ?message_window= (or
+    CHATS["MESSAGE_WINDOW"]), or None to embed all of them.
+    """
+    window = chats_setting("MESSAGE_WINDOW")
+    value = query_params.get(param)
+    if value:
+        try:
+            window = int(value)
+        except ValueError:
+            raise ValidationError({param: "Must be an integer."})
+        if window < 1:
+            raise ValidationError({param: "Must be at least 1."})
+    if window is not None:
+        window = min(window, chats_setting("MAX_MESSAGE_WINDOW"))
+    return window
+
+
+def get_export_format(request):
+    # "format" is taken by DRF's content negotiation.
+    export_format = request.query_params.get("export_format", "ndjson")
+    if export_format not in exports.FORMATS:
+        raise ValidationError(
+            {"export_format": f"Must be one of: {', '.join(exports.FORMATS)}."}
+        )
+    return export_format
+
+
+def get_request_user_id(request):
+    """
+    The authenticated user's id, or ?user_id= for anonymous requests.
+    """
+    if request.user.is_authenticated:
+        return request.user.pk
+    try:
+        return uuid.UUID(request.query_params.get("user_id", ""))
+    except ValueError:
+        raise ValidationError({"user_id": "A valid user_id is required."})
+
+
+def get_user_ids(data, field="user_ids"):
+    """
+    De-duplicated user UUIDs from a list in the request body.
+    """
+    values = data.get(field) if isinstance(data, dict) else None
+    if not isinstance(values, list) or not values:
+        raise ValidationError({field: "Must be a non-empty list of user ids."})
+    max_items = chats_setting("PARTICIPANTS_MAX_BATCH")
+    if len(values) > max_items:
+        raise ValidationError({field: f"At most {max_items} user ids per request."})
+    try:
+        return list(dict.fromkeys(uuid.UUID(str(value)) for value in values))
+    except ValueError:
+        raise ValidationError({field: "Must contain valid UUIDs."})
 
 
 # ----------------------------------------------------
 # Conversation ViewSet
 # ----------------------------------------------------
-class ConversationViewSet(viewsets.ModelViewSet):
+class ConversationViewSet(PlannedQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for listing, creating, retrieving conversations.
     Allows creating a conversation and adding participants.
+    Lists are keyset-paginated on (created_at, conversation_id), and
+    nested participants/messages are prefetched in a fixed number of queries.
+
+    With ?message_window=N (or CHATS["MESSAGE_WINDOW"]) only the latest N
+    messages of each conversation are embedded.
     """
 
     queryset = Conversation.objects.all().order_by("-created_at")
     serializer_class = ConversationSerializer
+    pagination_class = ConversationCursorPagination
+    message_window_query_param = "message_window"
+
+    def get_message_window(self):
+        """
+        Window size for embedded messages, or None to embed all of them.
+        """
+        if not hasattr(self, "_message_window"):
+            self._message_window = get_message_window(
+                self.request.query_params, self.message_window_query_param
+            )
+        return self._message_window
+
+    # Per-user inbox columns added to every conversation by mine()
+    inbox_columns = (
+        "conversation_id",
+        "last_activity_at",
+        "unread_count",
+        "last_read_seq",
+        "last_read_at",
+    )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.action == "mine":
+                self._paginator = InboxCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def get_serializer_class(self):
+        if self.get_message_window() is not None:
+            return ConversationWindowSerializer
+        return super().get_serializer_class()
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["message_window"] = self.get_message_window()
+        return context
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        window = self.get_message_window()
+        if window is not None:
+            queryset = queryset.prefetch_related(
+                recent_messages_prefetch(window),
+                recent_messages_prefetch(
+                    window, to_attr="recent_archived_messages", archived=True
+                ),
+            )
+        return queryset
+
+    def fast_serializer(self):
+        return FastConversationSerializer(
+            message_window=self.get_message_window(), request=self.request
+        )
+
+    def list(self, request, *args, **kwargs):
+        if not chats_setting("FAST_SERIALIZERS"):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(Conversation.objects.all())
+        page = self.paginate_queryset(
+            queryset.values(*FastConversationSerializer.columns)
+        )
+        return self.get_paginated_response(self.fast_serializer().serialize(page))
+
+    @action(detail=False, methods=["get"])
+    def mine(self, request):
+        """
+        The requesting user's conversations, most recently active first,
+        each with the user's unread_count, read receipt (last_read_seq,
+        last_read_at), last_activity_at and the conversation's last_seq.
+        GET /conversations/mine/ (?user_id=<uuid> for anonymous requests)
+        Pages are a keyset range scan of the user's inbox entries, so the
+        query count is the same for 10 or 100,000 conversations.
+        """
+        entries = InboxEntry.objects.filter(user_id=get_request_user_id(request))
+        last_seq = F("conversation__last_seq")
+        if chats_setting("FAST_SERIALIZERS"):
+            conversation_columns = {
+                name: F(f"conversation__{name}")
+                for name in FastConversationSerializer.columns
+                if name != "conversation_id"
+            }
+            page = self.paginate_queryset(
+                entries.values(*self.inbox_columns, last_seq=last_seq, **conversation_columns)
+            )
+            data = self.fast_serializer().serialize(page)
+        else:
+            page = self.paginate_queryset(entries.values(*self.inbox_columns, last_seq=last_seq))
+            conversations = self.get_queryset().in_bulk(
+                [row["conversation_id"] for row in page]
+            )
+            data = self.get_serializer(
+                [conversations[row["conversation_id"]] for row in page], many=True
+            ).data
+
+        datetime_field = serializers.DateTimeField()
+        for item, row in zip(data, page):
+            item["unread_count"] = row["unread_count"]
+            item["last_read_seq"] = row["last_read_seq"]
+            item["last_read_at"] = datetime_field.to_representation(row["last_read_at"])
+            item["last_activity_at"] = datetime_field.to_representation(row["last_activity_at"])
+            item["last_seq"] = row["last_seq"]
+        return self.get_paginated_response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Conversation detail, served from the response cache with ETag support.
+        """
+        try:
+            conversation_id = uuid.UUID(str(kwargs[self.lookup_field]))
+        except ValueError:
+            return super().retrieve(request, *args, **kwargs)
+        return cached_response(
+            request,
+            conversation_id,
+            lambda: self.retrieve_uncached(request, conversation_id, *args, **kwargs),
+        )
+
+    def retrieve_uncached(self, request, conversation_id, *args, **kwargs):
+        if not chats_setting("FAST_SERIALIZERS"):
+            return super().retrieve(request, *args, **kwargs)
+        rows = Conversation.objects.filter(conversation_id=conversation_id).values(
+            *FastConversationSerializer.columns
+        )
+        data = self.fast_serializer().serialize(rows)
+        if not data:
+            raise Http404("No Conversation matches the given query.")
+        return Response(data[0])
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_conversation(serializer.instance.pk)
+
+    def perform_destroy(self, instance):
+        conversation_id = instance.pk
+        super().perform_destroy(instance)
+        invalidate_conversation(conversation_id)
+        invalidate_participants(conversation_id)
 
     def create(self, request, *args, **kwargs):
         """
         Create a new conversation with multiple participants.
         Expected payload:
         {
-            "participants": ["uuid1", "uuid2"]
+            "participants": ["uuid1", "uuid2"],
+            "get_or_create": false
         }
+        With "get_or_create": true, an existing conversation with exactly
+        these participants (e.g. a DM) is returned with 200 instead.
         """
         participant_ids = request.data.get("participants", [])
 
@@ -39,27 +284,45 @@ class ConversationViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Fetch users
-        users = User.objects.filter(user_id__in=participant_ids)
+        max_items = chats_setting("PARTICIPANTS_MAX_BATCH")
+        if not isinstance(participant_ids, list) or len(participant_ids) > max_items:
+            return Response(
+                {"error": f"Participants must be a list of at most {max_items} user ids."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        if len(users) != len(participant_ids):
+        # Count the matching users instead of fetching every row
+        try:
+            participant_ids = list(dict.fromkeys(uuid.UUID(str(pid)) for pid in participant_ids))
+        except ValueError:
+            participant_ids = None
+        if (
+            participant_ids is None
+            or User.objects.filter(user_id__in=participant_ids).count() != len(participant_ids)
+        ):
             return Response(
                 {"error": "One or more participant IDs are invalid."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        # Create conversation
-        conversation = Conversation.objects.create()
-        conversation.participants.set(users)
-        conversation.save()
+        if request.data.get("get_or_create") is True:
+            conversation, created = get_or_create_conversation(participant_ids)
+        else:
+            # Create conversation
+            conversation, created = create_conversation(participant_ids), True
 
-        serializer = ConversationSerializer(conversation)
-        return Response(serializer.data, status=status.HTTP_201_CREATED)
+        # Same payload either way, as served by retrieve.
+        serializer = self.get_serializer(self.get_queryset().get(pk=conversation.pk))
+        return Response(
+            serializer.data, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
 
-    @action(detail=True, methods=["post"])
+    @action(detail=True, methods=["post"], throttle_classes=[MembershipRateThrottle])
     def add_participant(self, request, pk=None):
         """
         Add a participant to an existing conversation.
+        Responds with the whole conversation; use add_participants for
+        large batches and a compact delta.
         """
         conversation = self.get_object()
         user_id = request.data.get("user_id")
@@ -71,24 +334,306 @@ class ConversationViewSet(viewsets.ModelViewSet):
             )
 
         user = get_object_or_404(User, user_id=user_id)
-        conversation.participants.add(user)
+        add_participants(conversation, [user.pk])
 
-        serializer = ConversationSerializer(conversation)
+        # get_object() prefetched the participants from before the add.
+        serializer = self.get_serializer(self.get_queryset().get(pk=conversation.pk))
         return Response(serializer.data, status=status.HTTP_200_OK)
 
+    @action(detail=True, methods=["post"], throttle_classes=[MembershipRateThrottle])
+    def add_participants(self, request, pk=None):
+        """
+        Add many participants at once.
+        Expected payload: {"user_ids": ["uuid1", "uuid2", ...]}
+        Responds with the membership delta only.
+        """
+        conversation = self.get_conversation()
+        delta = add_participants(conversation, get_user_ids(request.data))
+        return self.participant_delta(conversation, delta)
+
+    @action(detail=True, methods=["post"], throttle_classes=[MembershipRateThrottle])
+    def remove_participants(self, request, pk=None):
+        """
+        Remove many participants at once.
+        Expected payload: {"user_ids": ["uuid1", "uuid2", ...]}
+        Responds with the membership delta only.
+        """
+        conversation = self.get_conversation()
+        delta = remove_participants(conversation, get_user_ids(request.data))
+        return self.participant_delta(conversation, delta)
+
+    def get_conversation(self):
+        """
+        The conversation row alone, without the nested prefetches.
+        """
+        try:
+            conversation_id = uuid.UUID(str(self.kwargs[self.lookup_field]))
+        except ValueError:
+            raise Http404("No Conversation matches the given query.")
+        return get_object_or_404(Conversation, conversation_id=conversation_id)
+
+    def participant_delta(self, conversation, delta):
+        return Response(
+            {
+                "conversation_id": conversation.pk,
+                "added": delta.added,
+                "removed": delta.removed,
+                "unchanged": delta.unchanged,
+                "unknown": delta.unknown,
+            },
+            status=status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=["post"])
+    def read(self, request, pk=None):
+        """
+        Mark a conversation as read for a user.
+        Expected payload:
+        {
+            "user_id": "uuid",
+            "seq": 42          # optional, defaults to the latest message
+        }
+        """
+        user_id = request.data.get("user_id")
+        seq = request.data.get("seq")
+        try:
+            user_id = uuid.UUID(str(user_id))
+            conversation_id = uuid.UUID(str(pk))
+            seq = None if seq is None else int(seq)
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "A valid user_id (and integer seq, if given) is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        try:
+            entry = inbox.mark_read(conversation_id, user_id, seq)
+        except InboxEntry.DoesNotExist:
+            return Response(
+                {"error": "User is not a participant in this conversation."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+        return Response(
+            {
+                "conversation": entry.conversation_id,
+                "last_read_seq": entry.last_read_seq,
+                "unread_count": entry.unread_count,
+            }
+        )
+
+    @action(detail=True, methods=["get"])
+    def export(self, request, pk=None):
+        """
+        Stream a conversation's full history, oldest first, to one of
+        its participants.
+        GET /conversations/<id>/export/?export_format=ndjson|csv
+        (&user_id=<uuid> for anonymous requests)
+        """
+        export_format = get_export_format(request)
+        user_id = get_request_user_id(request)
+        try:
+            conversation_id = uuid.UUID(str(pk))
+        except ValueError:
+            raise Http404("No Conversation matches the given query.")
+        conversation = get_object_or_404(Conversation, conversation_id=conversation_id)
+        if not is_participant(conversation.pk, user_id):
+            return Response(
+                {"error": "User is not a participant in this conversation."},
+                status=status.HTTP_403_FORBIDDEN,
+            )
+        return exports.streaming_export(
+            exports.conversation_messages(conversation.pk),
+            export_format,
+            f"conversation-{conversation.pk}",
+        )
+
+    @action(detail=False, methods=["get"])
+    def sync(self, request):
+        """
+        Delta sync for reconnecting clients.
+        GET /conversations/sync/?user_id=<uuid>&since=<token>
+
+        Returns the user's conversations changed since the token (oldest
+        change first), each with its latest messages, and the token to send
+        next time. Omit since for a full initial sync.
+        Keep calling while has_more is true.
+
+        Send &seen=<conversation_id>:<seq>,... with the highest message seq
+        held per conversation: those conversations then only carry newer
+        messages, and come back whenever they have any, including sends
+        that committed after an earlier token was handed out.
+        """
+        try:
+            user_id = uuid.UUID(request.query_params.get("user_id", ""))
+        except ValueError:
+            return Response(
+                {"error": "A valid user_id is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        since = request.query_params.get("since")
+        if since:
+            try:
+                since = decode_since(since)
+            except ValueError:
+                return Response(
+                    {"error": "Invalid since token."},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            since = None
+
+        limit = chats_setting("SYNC_MAX_CONVERSATIONS")
+        try:
+            seen = decode_seen(request.query_params.get("seen", ""), limit)
+        except ValueError:
+            return Response(
+                {"error": f"seen must list at most {limit} <conversation_id>:<seq> pairs."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        window = chats_setting("SYNC_MESSAGE_WINDOW")
+        result = changed_conversations(
+            user_id,
+            since,
+            ConversationWindowSerializer,
+            limit=limit,
+            message_window=window,
+            seen=seen,
+        )
+        context = self.get_serializer_context()
+        context["message_window"] = window
+        serializer = ConversationWindowSerializer(
+            result.conversations, many=True, context=context
+        )
+        return Response(
+            {
+                "since": result.since,
+                "has_more": result.has_more,
+                "conversations": serializer.data,
+            }
+        )
+
 
 # ----------------------------------------------------
 # Message ViewSet
 # ----------------------------------------------------
-class MessageViewSet(viewsets.ModelViewSet):
+class MessageViewSet(PlannedQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for listing, retrieving, and creating messages.
     To send a message, user provides sender_id, message_body,
     and conversation_id.
+    Lists are keyset-paginated on (sent_at, message_id), or on seq when
+    narrowed to one conversation; senders are joined.
     """
 
     queryset = Message.objects.all().order_by("-sent_at")
     serializer_class = MessageSerializer
+    pagination_class = MessageCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, "_paginator"):
+            if self.request.query_params.get("conversation"):
+                self._paginator = ConversationMessageCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        """
+        Message pages of a single conversation are served from the
+        response cache with ETag support.
+        """
+        conversation_id = request.query_params.get("conversation")
+        if not conversation_id:
+            return self.list_uncached(request, *args, **kwargs)
+        try:
+            conversation_id = uuid.UUID(conversation_id)
+        except ValueError:
+            raise ValidationError({"conversation": "Must be a valid UUID."})
+        return cached_response(
+            request,
+            conversation_id,
+            lambda: self.list_uncached(request, *args, **kwargs),
+        )
+
+    def list_uncached(self, request, *args, **kwargs):
+        if not chats_setting("FAST_SERIALIZERS"):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset.values(*FastMessageSerializer.columns))
+        return self.get_paginated_response(FastMessageSerializer.serialize(page))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not chats_setting("FAST_SERIALIZERS"):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            message_id = uuid.UUID(str(kwargs[self.lookup_field]))
+        except ValueError:
+            raise Http404("No Message matches the given query.")
+        for model in (Message, ArchivedMessage):
+            rows = model.objects.filter(message_id=message_id).values(
+                *FastMessageSerializer.columns
+            )
+            data = FastMessageSerializer.serialize(rows)
+            if data:
+                return Response(data[0])
+        raise Http404("No Message matches the given query.")
+
+    def get_object(self):
+        """
+        Message detail falls through to the archive.
+        """
+        try:
+            return super().get_object()
+        except Http404:
+            if self.action != "retrieve":
+                raise
+        queryset = plan_queryset(ArchivedMessage.objects.all(), self.get_serializer_class())
+        return get_object_or_404(queryset, message_id=self.kwargs[self.lookup_field])
+
+    def get_archive_queryset(self):
+        """
+        Archived messages under the same list filters; pages fall
+        through to them once the live messages run out.
+        """
+        if self.action != "list":
+            return None
+        queryset = ArchivedMessage.objects.all()
+        conversation_id = self.request.query_params.get("conversation")
+        if conversation_id:
+            queryset = queryset.filter(conversation_id=conversation_id)
+        if chats_setting("FAST_SERIALIZERS"):
+            return queryset.values(*FastMessageSerializer.columns)
+        return plan_queryset(queryset, self.get_serializer_class())
+
+    def get_queryset(self):
+        """
+        Lists can be narrowed to one conversation with ?conversation=<uuid>.
+        """
+        queryset = super().get_queryset()
+        conversation_id = self.request.query_params.get("conversation")
+        if conversation_id and self.action == "list":
+            try:
+                conversation_id = uuid.UUID(conversation_id)
+            except ValueError:
+                raise ValidationError({"conversation": "Must be a valid UUID."})
+            queryset = queryset.filter(conversation_id=conversation_id)
+        return queryset
+
+    def perform_update(self, serializer):
+        super().perform_update(serializer)
+        invalidate_conversation(serializer.instance.conversation_id)
+
+    def perform_destroy(self, instance):
+        delete_message(instance)
+
+    def get_throttles(self):
+        if self.action == "create":
+            # Per sender and per conversation (REST_FRAMEWORK rates)
+            return [SenderRateThrottle(), ConversationRateThrottle()]
+        return super().get_throttles()
 
     def create(self, request, *args, **kwargs):
         """
@@ -110,22 +655,140 @@ class MessageViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
+        try:
+            sender_id = uuid.UUID(str(sender_id))
+            conversation_id = uuid.UUID(str(conversation_id))
+        except ValueError:
+            return Response(
+                {"error": "sender_id and conversation_id must be valid UUIDs."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
         sender = get_object_or_404(User, user_id=sender_id)
-        conversation = get_object_or_404(Conversation, conversation_id=conversation_id)
 
-        # Validate sender belongs to conversation
-        if sender not in conversation.participants.all():
+        # Validate sender belongs to conversation (cached indexed probe)
+        if not is_participant(conversation_id, sender_id):
+            get_object_or_404(Conversation, conversation_id=conversation_id)
             return Response(
                 {"error": "Sender is not a participant in this conversation."},
                 status=status.HTTP_403_FORBIDDEN,
             )
 
-        # Create message
-        message = Message.objects.create(
-            sender=sender,
-            conversation=conversation,
-            message_body=message_body,
-        )
+        # Create message and update the conversation's activity columns
+        if chats_setting("GROUP_COMMIT"):
+            try:
+                message = get_group_commit_writer().submit(
+                    sender, conversation_id, message_body
+                )
+            except SendRejected as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_403_FORBIDDEN)
+        else:
+            message = send_message(sender, conversation_id, message_body)
 
         serializer = MessageSerializer(message)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(detail=False, methods=["post"], parser_classes=[JSONParser, NDJSONParser])
+    def bulk(self, request):
+        """
+        Send many messages in one request.
+        Accepts a JSON array (or {"messages": [...]}) or an
+        application/x-ndjson body with one message object per line:
+        {"sender_id": "uuid", "conversation_id": "uuid", "message_body": "Hello!"}
+
+        Invalid items, and items over the per-sender or per-conversation
+        rate limits, are reported by index without aborting the batch;
+        the response is 201 if everything was created, 207 otherwise.
+        """
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get("messages")
+        if not isinstance(items, list) or not items:
+            return Response(
+                {"error": "A non-empty list of messages is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        max_items = chats_setting("BULK_MAX_ITEMS")
+        if len(items) > max_items:
+            return Response(
+                {"error": f"At most {max_items} messages per request."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # Every item counts against its sender's and conversation's rate limits.
+        result = send_messages_bulk(throttle_items(items))
+        return Response(
+            {
+                "created": [
+                    {"index": index, "message_id": message.message_id}
+                    for index, message in result.created
+                ],
+                "errors": [
+                    {"index": index, "error": error} for index, error in result.errors
+                ],
+            },
+            status=status.HTTP_207_MULTI_STATUS if result.errors else status.HTTP_201_CREATED,
+        )
+
+    @action(detail=False, methods=["get"])
+    def export(self, request):
+        """
+        Stream the full history of every conversation a user belongs to.
+        GET /messages/export/?user_id=<uuid>&export_format=ndjson|csv
+        """
+        try:
+            user_id = uuid.UUID(request.query_params.get("user_id", ""))
+        except ValueError:
+            return Response(
+                {"error": "A valid user_id is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        export_format = get_export_format(request)
+        user = get_object_or_404(User, user_id=user_id)
+        return exports.streaming_export(
+            exports.user_messages(user.pk), export_format, f"user-{user.pk}"
+        )
+
+    @action(detail=False, methods=["get"])
+    def search(self, request):
+        """
+        Full-text search in the conversations a user belongs to.
+        GET /messages/search/?user_id=<uuid>&q=<text>[&limit=20&offset=0]
+        Results are ranked best match first.
+        """
+        query = request.query_params.get("q", "").strip()
+        try:
+            user_id = uuid.UUID(request.query_params.get("user_id", ""))
+        except ValueError:
+            return Response(
+                {"error": "A valid user_id is required."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not query:
+            return Response(
+                {"error": "q is required."}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get("limit", chats_setting("SEARCH_PAGE_SIZE")))
+            offset = int(request.query_params.get("offset", 0))
+        except ValueError:
+            return Response(
+                {"error": "limit and offset must be integers."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        limit = max(1, min(limit, chats_setting("MAX_SEARCH_PAGE_SIZE")))
+        offset = max(0, offset)
+
+        # One extra row tells whether there is a next page.
+        messages = search_messages(user_id, query, limit + 1, offset)
+        next_url = None
+        if len(messages) > limit:
+            messages = messages[:limit]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), "offset", offset + limit
+            )
+
+        serializer = self.get_serializer(messages, many=True)
+        return Response({"next": next_url, "results": serializer.data})
@@ -3,6 +3,7 @@ Django settings for messaging_app project.
 Generated with best practices for modular API development.
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project
@@ -33,9 +34,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Sampled per-request profiling (Server-Timing, /api/chats/metrics/)
+    'chats.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    # Replica reads for safe requests, primary after a client writes
+    'chats.routers.ReadYourWritesMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -62,13 +67,78 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'messaging_app.wsgi.application'
 
-# Database - default SQLite
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+# Async entry point, required for the real-time event streams
+ASGI_APPLICATION = 'messaging_app.asgi.application'
+
+# Database - configured from the environment, SQLite by default
+#   DB_ENGINE               e.g. django.db.backends.postgresql
+#   DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT
+#   DB_CONN_MAX_AGE         seconds to keep connections open between requests
+#                           (use 0 under ASGI, where connections are per-thread)
+#   DB_CONN_HEALTH_CHECKS   check a persistent connection before reusing it
+#   DB_POOL                 use the driver's connection pool instead (PostgreSQL)
+#   DB_REPLICAS             comma-separated read replicas: host[:port], or
+#                           database files for SQLite
+def env_bool(name, default=False):
+    return os.environ.get(name, str(default)).lower() in ('1', 'true', 'yes', 'on')
+
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'django.db.backends.sqlite3')
+DB_PRIMARY = {
+    'ENGINE': DB_ENGINE,
+    'NAME': os.environ.get('DB_NAME', str(BASE_DIR / 'db.sqlite3')),
+    'USER': os.environ.get('DB_USER', ''),
+    'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+    'HOST': os.environ.get('DB_HOST', ''),
+    'PORT': os.environ.get('DB_PORT', ''),
+    'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 60)),
+    'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
 }
+if env_bool('DB_POOL'):
+    # Pooled connections replace persistent ones.
+    DB_PRIMARY.update(OPTIONS={'pool': True}, CONN_MAX_AGE=0)
+
+# Tuned SQLite for concurrent writers (DB_SQLITE_TUNED=0 to disable).
+# Transactions take the write lock when they begin, so concurrent writers
+# wait up to the timeout instead of failing on a lock upgrade; the PRAGMAs
+# in CHATS['SQLITE_PRAGMAS'] are applied on connect (chats/sqlite.py).
+SQLITE_TUNED = 'sqlite' in DB_ENGINE and env_bool('DB_SQLITE_TUNED', True)
+if SQLITE_TUNED:
+    DB_PRIMARY['OPTIONS'] = {'transaction_mode': 'IMMEDIATE', 'timeout': 20}
+
+DATABASES = {'default': DB_PRIMARY}
+for index, replica in enumerate(filter(None, os.environ.get('DB_REPLICAS', '').split(',')), 1):
+    config = dict(DB_PRIMARY, TEST={'MIRROR': 'default'})
+    if 'sqlite' in DB_ENGINE:
+        config['NAME'] = replica.strip()
+    else:
+        host, _, port = replica.strip().partition(':')
+        config.update(HOST=host, PORT=port or DB_PRIMARY['PORT'])
+    DATABASES[f'replica_{index}'] = config
+
+# Chats reads go to the replicas, writes to the primary (chats/routers.py)
+DATABASE_ROUTERS = ['chats.routers.PrimaryReplicaRouter']
+
+# Caches shared by every worker process: the chats response cache versions,
+# membership answers and CacheStore throttles must agree across them.
+# Redis when REDIS_URL is set; the local-memory fallback only suits a
+# single process (see the chats.W001 check).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Custom user model from the chats app (UUID primary key, email login)
+AUTH_USER_MODEL = 'chats.User'
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -101,5 +171,34 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',
-    ]
+    ],
+    # Token buckets of chats.throttling: "<requests>/<period>[:<burst>]"
+    'DEFAULT_THROTTLE_RATES': {
+        # Messages per sender and per conversation
+        'chats.sender': '5/s:20',
+        'chats.conversation': '50/s:200',
+        # Participant changes per conversation
+        'chats.membership': '60/min:10',
+    },
+}
+
+# Chats app settings (see chats/conf.py for the full list and defaults)
+CHATS = {
+    # Embed only the latest N messages per conversation; older ones are
+    # reachable through the paginated message list.
+    'MESSAGE_WINDOW': 20,
+    # Read paths serialize .values() rows instead of model instances.
+    'FAST_SERIALIZERS': True,
+    'READ_REPLICAS': [alias for alias in DATABASES if alias != 'default'],
+    'SQLITE_PRAGMAS': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'mmap_size': 256 * 1024 * 1024,
+        'busy_timeout': 20000,
+    } if SQLITE_TUNED else {},
+    # Profile 5% of requests; cheap enough to leave on.
+    'PROFILING_SAMPLE_RATE': 0.05,
+    # Sends return once the message and its outbox event commit; inbox
+    # updates and real-time publishing follow from the worker pool.
+    'OUTBOX': True,
 }